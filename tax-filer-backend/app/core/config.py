@@ -1,4 +1,7 @@
+from functools import lru_cache
+import math
 import os.path
+from typing import Dict, List, Optional, Set, Tuple
 
 from dotenv import load_dotenv
 from pydantic import ConfigDict, field_validator
@@ -9,11 +12,6 @@ from app.core.logging_config import app_logger
 dotenv_main_path = os.path.join(
     os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".env"
 )
-if os.path.exists(dotenv_main_path):
-    load_dotenv(dotenv_path=dotenv_main_path, override=True)
-else:
-    app_logger.info(".env file not present, reading secrets from environment")
-    load_dotenv(override=True)
 
 
 class Settings(BaseSettings):
@@ -25,19 +23,212 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     OPENAI_API_KEY: str
     LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_MAX_SIZE: int = 10000  # Records buffered for the background log writer
+    LOG_QUEUE_FULL_POLICY: str = "drop"  # "drop" (counted) or "block" when full
+    LOG_FORMAT: str = "text"  # "text" or "json" (one JSON object per line)
+    # Comma-separated `<log_key or logger name>=<rate>` pairs for INFO/DEBUG sampling,
+    # e.g. "access_granted=0.01,app_info=0.01". WARNING and above are always kept.
+    LOG_SAMPLE_RATES: str = ""
     DEFAULT_OPENAI_MODEL: str = "gpt-4-turbo"
-    OPENAI_MODEL_NAME: str = os.getenv("OPENAI_MODEL_NAME", DEFAULT_OPENAI_MODEL)
+    OPENAI_MODEL_NAME: str = DEFAULT_OPENAI_MODEL
 
-    JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY").strip()
+    JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(
-        os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
-    )  # Token valid for 30 minutes (default)
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # Token valid for 30 minutes (default)
+    # Verified tokens kept in memory until they expire, 0 disables the cache
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+    # Revocation: a shared SQLite file lets all workers on a host see revocations
+    JWT_REVOCATION_SQLITE_PATH: Optional[str] = None
+    JWT_REVOCATION_SYNC_INTERVAL_SECONDS: float = 2  # Max delay across workers
+    ADMIN_API_KEY: Optional[str] = None  # Enables the admin endpoints (X-Admin-Key)
+
+    # Request handling
+    SERVER_TIMING_ENABLED: bool = False  # Adds a Server-Timing header to responses
+    # Gzip responses of at least this size for clients accepting it, 0 disables
+    RESPONSE_GZIP_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 6  # 1 (fastest) to 9 (smallest)
+
+    # Metrics
+    METRICS_ENABLED: bool = True  # Serves GET /metrics
+    # With several workers (PROMETHEUS_MULTIPROC_DIR set), how often each one
+    # copies the services' own counters into its metric files
+    METRICS_REFRESH_INTERVAL_SECONDS: float = 5
+
+    # OpenAI HTTP transport
+    OPENAI_BASE_URL: Optional[str] = (
+        None  # e.g. a local stub server for tests/benchmarks
+    )
+    OPENAI_TIMEOUT_SECONDS: float = 60
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = 5
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY_SECONDS: float = 60
+    OPENAI_HTTP2: bool = False  # Requires the 'h2' package (httpx[http2])
+    OPENAI_WARMUP_CONNECTIONS: int = 2  # Connections opened at startup, 0 disables
+    OPENAI_WARMUP_TIMEOUT_SECONDS: float = 5
+
+    # Fallback models, comma-separated and tried after OPENAI_MODEL_NAME
+    OPENAI_MODEL_CANDIDATES: str = ""
+    OPENAI_LATENCY_SLO_SECONDS: float = 10.0
+    OPENAI_MODEL_ERROR_RATE_THRESHOLD: float = 0.5
+    OPENAI_MODEL_COOLDOWN_SECONDS: float = 60
+
+    # Multi-worker deployments (see gunicorn.conf.py)
+    WEB_CONCURRENCY: int = 1  # Worker processes on this host, set by the launcher
+    # Directory for state shared by the workers: advice cache, OpenAI rate
+    # budget and session quotas. Unset keeps that state per process.
+    SHARED_STATE_DIR: Optional[str] = None
+
+    # AI advice response cache
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MAX_ENTRIES: int = 1024
+    AI_CACHE_TTL_SECONDS: int = 3600
+    AI_CACHE_EVICTION_POLICY: str = "lru"  # "lru" or "fifo"
+    AI_CACHE_SQLITE_PATH: Optional[str] = None  # Shared tier for multi-worker setups
+    AI_CACHE_SQLITE_MAX_ENTRIES: int = 10000
+    # "exact" caches per canonical input; "banded" shares advice between inputs
+    # whose amounts fall into the same log-scale bands (see IncomeBands)
+    AI_CACHE_MODE: str = "exact"
+    AI_CACHE_BAND_BASE: float = 1.25  # Each band is this many times wider
+    AI_CACHE_BAND_FLOOR: float = 1000.0  # Amounts below this share one band
+    # Share one upstream call between concurrent identical advice requests
+    AI_COALESCE_REQUESTS: bool = True
+
+    # Prompt building, defaults to app/data/prompt_templates.json
+    AI_PROMPT_TEMPLATES_PATH: Optional[str] = None
+    # max_completion_tokens is chosen per request between these two, from the
+    # input's complexity and the completion pace needed for the latency target
+    AI_COMPLETION_TOKENS_MIN: int = 150
+    AI_COMPLETION_TOKENS_MAX: int = 350
+    AI_COMPLETION_LATENCY_TARGET_SECONDS: float = 8.0  # 0 disables the cap
+
+    # Usage ledger: one row per advice request, written in batches off the event loop
+    USAGE_LEDGER_ENABLED: bool = True
+    USAGE_LEDGER_SQLITE_PATH: Optional[str] = None  # Defaults to logs/usage-ledger.db
+    USAGE_LEDGER_BATCH_SIZE: int = 200  # Written as soon as this many are buffered
+    USAGE_LEDGER_FLUSH_INTERVAL_SECONDS: float = 5
+    USAGE_LEDGER_MAX_BUFFERED: int = 10000  # Further records are dropped (counted)
+    USAGE_LEDGER_RETENTION_DAYS: int = 90  # 0 keeps every row
+    # Comma-separated `<model>=<input>/<output>[/<cached input>]` prices in USD per
+    # million tokens, for the cost column of usage reports
+    AI_MODEL_PRICES: str = (
+        "gpt-4-turbo=10/30,gpt-4o=2.5/10/1.25,gpt-4o-mini=0.15/0.6/0.075,"
+        "gpt-3.5-turbo=0.5/1.5"
+    )
+
+    # Batch advice endpoint
+    AI_BATCH_MAX_ITEMS: int = 500
+    AI_BATCH_CONCURRENCY: int = 8  # Concurrent AI calls per batch request
+
+    # Local tax estimates, defaults to app/data/tax_brackets.json
+    TAX_BRACKETS_PATH: Optional[str] = None
+
+    # Idempotency-Key support on /submit-advice
+    IDEMPOTENCY_WINDOW_SECONDS: int = 3600  # How long a key's response is kept
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+
+    # Per-session (JWT jti) quotas, 0 disables a limit
+    SESSION_QUOTA_REQUESTS: int = 30  # Advice requests per window
+    SESSION_QUOTA_WINDOW_SECONDS: float = 60
+    SESSION_QUOTA_TOKENS_PER_DAY: int = 100000  # OpenAI tokens per UTC day
+    # Batch items are charged to their own budget instead of the request quota
+    SESSION_QUOTA_BATCH_ITEMS: int = 2000  # Batch items per batch window
+    SESSION_QUOTA_BATCH_WINDOW_SECONDS: float = 3600
+
+    # Admission control in front of OpenAI (0 disables the RPM/TPM buckets)
+    OPENAI_MAX_CONCURRENT_REQUESTS: int = 16
+    OPENAI_MAX_CONCURRENT_REQUESTS_PER_SESSION: int = 2
+    OPENAI_RPM_LIMIT: int = 500
+    OPENAI_TPM_LIMIT: int = 30000
+    OPENAI_ADMISSION_MAX_WAIT_SECONDS: float = 2.0  # 0 fails fast when saturated
+
+    # Templated fallback advice instead of an error when the AI path is down or
+    # overloaded, for the comma-separated AIServiceError codes below
+    AI_FALLBACK_ENABLED: bool = True
+    AI_FALLBACK_ON_ERRORS: str = (
+        "CONFIG_ERROR,API_CONN_ERROR,API_LIMIT_EXCEEDED,TIMEOUT"
+    )
+    # Serve the fallback once admission would take longer than this (0 waits the
+    # full OPENAI_ADMISSION_MAX_WAIT_SECONDS)
+    AI_FALLBACK_MAX_QUEUE_WAIT_MS: float = 500
+    # Defaults to app/data/advice_templates.json
+    AI_FALLBACK_TEMPLATES_PATH: Optional[str] = None
+
+    # Retries, hedging and circuit breaking around the completion call
+    OPENAI_RETRY_MAX_ATTEMPTS: int = 3  # Total attempts, including the first one
+    OPENAI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    OPENAI_RETRY_MAX_DELAY_SECONDS: float = 8.0
+    OPENAI_HEDGE_ENABLED: bool = False
+    OPENAI_HEDGE_PERCENTILE: float = 95
+    OPENAI_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    OPENAI_CIRCUIT_FAILURE_THRESHOLD: int = 5  # 0 disables the circuit breaker
+    OPENAI_CIRCUIT_RECOVERY_SECONDS: float = 30
+
+    # Asynchronous advice jobs
+    ADVICE_JOBS_MAX_QUEUE_DEPTH: int = 1000
+    ADVICE_JOBS_WORKERS: int = 4
+    ADVICE_JOBS_TIMEOUT_SECONDS: float = 60
+    ADVICE_JOBS_RESULT_TTL_SECONDS: int = 900
+    # Persist jobs across restarts; defaults to SHARED_STATE_DIR/advice-jobs.db
+    ADVICE_JOBS_SQLITE_PATH: Optional[str] = None
+    # A worker that stops renewing its jobs for this long leaves them to others
+    ADVICE_JOBS_LEASE_SECONDS: float = 30
 
     model_config = ConfigDict(
         extra="allow", env_file=".env", env_file_encoding="utf-8", case_sensitive=True
     )
 
+    @property
+    def openai_model_candidates(self) -> List[str]:
+        models = [self.OPENAI_MODEL_NAME]
+        for model in self.OPENAI_MODEL_CANDIDATES.split(","):
+            model = model.strip()
+            if model and model not in models:
+                models.append(model)
+        return models
+
+    @property
+    def openai_max_concurrency_per_worker(self) -> int:
+        """
+        OPENAI_MAX_CONCURRENT_REQUESTS is for the whole host; each worker gets its share.
+        """
+        return math.ceil(
+            self.OPENAI_MAX_CONCURRENT_REQUESTS / max(1, self.WEB_CONCURRENCY)
+        )
+
+    @property
+    def ai_fallback_errors(self) -> Set[str]:
+        return {
+            code.strip().upper()
+            for code in self.AI_FALLBACK_ON_ERRORS.split(",")
+            if code.strip()
+        }
+
+    @property
+    def ai_model_prices(self) -> Dict[str, Tuple[float, float, float]]:
+        """
+        `{model: (input, output, cached input)}`; the cached input price
+        defaults to the input price.
+        """
+        prices = {}
+        for pair in self.AI_MODEL_PRICES.split(","):
+            model, _, values = pair.partition("=")
+            if model.strip() and values.strip():
+                numbers = [float(value) for value in values.split("/")]
+                input_price, output_price = numbers[0], numbers[1]
+                cached_price = numbers[2] if len(numbers) > 2 else input_price
+                prices[model.strip()] = (input_price, output_price, cached_price)
+        return prices
+
+    @property
+    def log_sample_rates(self) -> Dict[str, float]:
+        rates = {}
+        for pair in self.LOG_SAMPLE_RATES.split(","):
+            key, _, rate = pair.partition("=")
+            if key.strip() and rate.strip():
+                rates[key.strip()] = min(1.0, max(0.0, float(rate)))
+        return rates
+
     @field_validator("OPENAI_API_KEY")
     @classmethod
     def validate_openai_api_key(cls, v: str) -> str:
@@ -52,10 +243,70 @@ class Settings(BaseSettings):
     def validate_jwt_secret(cls, v: str) -> str:
         if not v or len(v.strip()) == 0:
             raise ValueError("JWT_SECRET_KEY is empty.")
+        return v.strip()
+
+    @field_validator("AI_CACHE_EVICTION_POLICY")
+    @classmethod
+    def validate_cache_eviction_policy(cls, v: str) -> str:
+        if v.lower() not in ("lru", "fifo"):
+            raise ValueError("AI_CACHE_EVICTION_POLICY must be either 'lru' or 'fifo'.")
+        return v.lower()
+
+    @field_validator("AI_CACHE_MODE")
+    @classmethod
+    def validate_cache_mode(cls, v: str) -> str:
+        if v.lower() not in ("exact", "banded"):
+            raise ValueError("AI_CACHE_MODE must be either 'exact' or 'banded'.")
+        return v.lower()
+
+    @field_validator("AI_CACHE_BAND_BASE")
+    @classmethod
+    def validate_cache_band_base(cls, v: float) -> float:
+        if v <= 1:
+            raise ValueError("AI_CACHE_BAND_BASE must be greater than 1.")
         return v
 
+    @field_validator("RESPONSE_GZIP_LEVEL")
+    @classmethod
+    def validate_response_gzip_level(cls, v: int) -> int:
+        if not 1 <= v <= 9:
+            raise ValueError("RESPONSE_GZIP_LEVEL must be between 1 and 9.")
+        return v
+
+    @field_validator("LOG_FORMAT")
+    @classmethod
+    def validate_log_format(cls, v: str) -> str:
+        if v.lower() not in ("text", "json"):
+            raise ValueError("LOG_FORMAT must be either 'text' or 'json'.")
+        return v.lower()
+
+    @field_validator("LOG_QUEUE_FULL_POLICY")
+    @classmethod
+    def validate_log_queue_full_policy(cls, v: str) -> str:
+        if v.lower() not in ("drop", "block"):
+            raise ValueError("LOG_QUEUE_FULL_POLICY must be either 'drop' or 'block'.")
+        return v.lower()
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Loads the .env file and the settings on first use rather than on import,
+    so importing this module alone (e.g. for `Settings`) has no side effects.
+    Importing the app still builds them: the service singletons (OpenAI
+    admission, job queue, usage ledger, auth caches) read them at import.
+    """
+    if os.path.exists(dotenv_main_path):
+        load_dotenv(dotenv_path=dotenv_main_path, override=True)
+    else:
+        app_logger.info(".env file not present, reading secrets from environment")
+        load_dotenv(override=True)
+    return Settings()
+
 
-settings = Settings()
-print(
-    f"Loaded settings: OpenAI Key Present: {'Yes' if settings.OPENAI_API_KEY else 'No'} (Model: {settings.OPENAI_MODEL_NAME})"
-)  # For debugging
+def __getattr__(name: str):
+    # `from app.core.config import settings` builds them on first import
+    if name == "settings":
+        globals()["settings"] = get_settings()
+        return globals()["settings"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
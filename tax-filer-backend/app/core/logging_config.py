@@ -1,16 +1,56 @@
 # tax-filer-backend/app/core/logging_config.py
+import atexit
+import copy
+from datetime import datetime, timezone
+import json
 import logging
 import logging.handlers
+import os
 from pathlib import Path
+import queue
+import random
+import threading
+import time
+from typing import Dict, Optional
 
-from app.middleware.request_id_middleware import get_request_id
+from app.middleware.request_id_middleware import (
+    get_request_id,
+    jti_var,
+    request_started_var,
+    route_var,
+)
 
-# Define the log directory relative to the backend app's root
-LOG_DIR = Path(__file__).resolve().parent.parent.parent / "logs"
-LOG_DIR.mkdir(parents=True, exist_ok=True)  # Create logs directory if it doesn't exist
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
 
+# Define the log directory relative to the backend app's root, created on the
+# first record written (see LazyRotatingFileHandler)
+LOG_DIR = Path(__file__).resolve().parent.parent.parent / "logs"
 LOG_FILE = LOG_DIR / "tax_app_backend.log"
 
+LOG_QUEUE_DEFAULT_SIZE = 10000
+LOG_QUEUE_FULL_POLICIES = ("drop", "block")
+LOG_FORMATS = ("text", "json")
+
+
+def capture_log_context(record: logging.LogRecord) -> None:
+    """
+    Copies the per-request context (ContextVars) onto the record. Must run on
+    the thread that emitted the record.
+    """
+    request_id = get_request_id()
+    record.request_id = request_id if request_id else "N/A"
+    record.jti = jti_var.get()
+    record.route = route_var.get()
+    started_at = request_started_var.get()
+    record.elapsed_ms = (
+        round((time.perf_counter() - started_at) * 1000, 2)
+        if started_at is not None
+        else None
+    )
+
 
 # Custom formatter
 class CustomFormatter(logging.Formatter):
@@ -34,22 +74,257 @@ class CustomFormatter(logging.Formatter):
     ):
         self.use_colors = use_colors  # Not used for file logging here
         super().__init__(datefmt=datefmt)
+        # Built once; creating a Formatter per record is measurable at high QPS
+        self._formatters = {
+            level: logging.Formatter(log_fmt, datefmt=datefmt)
+            for level, log_fmt in self.FORMATS_FILE.items()
+        }
 
     def format(self, record):
-        request_id = get_request_id()  # Get request_id from ContextVar
-        record.request_id = request_id if request_id else "N/A"
-        log_fmt = self.FORMATS_FILE.get(record.levelno)
-        formatter = logging.Formatter(log_fmt, datefmt=self.datefmt)
+        if not hasattr(record, "request_id"):  # Not captured by QueueLogHandler
+            capture_log_context(record)
+        formatter = self._formatters.get(record.levelno, self._formatters[logging.INFO])
         return formatter.format(record)
 
 
+class JSONLogFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log shippers that should not need regexes.
+    Besides the message it carries the request context (`request_id`, `jti`,
+    `route`, `elapsed_ms` since the request started) and, when the call site
+    passes them via `extra`, `latency_ms`, `error_type`, `log_key` and the
+    token counts of a completion. Empty fields are omitted.
+    """
+
+    EXTRA_FIELDS = (
+        "latency_ms",
+        "error_type",
+        "log_key",
+        "sample_rate",
+        "prompt_tokens",
+        "cached_prompt_tokens",
+        "completion_tokens",
+        "max_completion_tokens",
+    )
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            capture_log_context(record)
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+            "request_id": record.request_id,
+            "jti": record.jti,
+            "route": record.route,
+            "elapsed_ms": record.elapsed_ms,
+        }
+        for field in self.EXTRA_FIELDS:
+            entry[field] = getattr(record, field, None)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(
+            {key: value for key, value in entry.items() if value is not None},
+            default=str,
+        )
+
+
+class LogSampler(logging.Filter):
+    """
+    Keeps only a share of high-volume records below WARNING. Rates are looked up
+    by the record's `log_key` (passed via `extra`) first, then by logger name;
+    records without a configured rate are always kept, as is WARNING and above.
+    Kept records carry `sample_rate` so counts can be scaled back up.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates: Dict[str, float] = dict(rates or {})
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(getattr(record, "log_key", None))
+        if rate is None:
+            rate = self.rates.get(record.name)
+        if rate is None or rate >= 1:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class LogPipeline:
+    """
+    Moves log I/O off the event loop: records are put on a bounded in-memory
+    queue and written by a `QueueListener` thread. When the queue is full,
+    records are either dropped (and counted) or the caller blocks until there
+    is room, depending on `full_policy`. While the listener is not running
+    (before startup, after shutdown) records are written synchronously.
+    """
+
+    def __init__(
+        self,
+        target: logging.Handler,
+        max_size: int = LOG_QUEUE_DEFAULT_SIZE,
+        full_policy: str = "drop",
+    ):
+        self.target = target
+        self.queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.full_policy = full_policy
+        self.dropped = 0
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None
+
+    def configure(self, max_size: int, full_policy: str) -> None:
+        if full_policy not in LOG_QUEUE_FULL_POLICIES:
+            raise ValueError(
+                f"Log queue full policy must be one of {LOG_QUEUE_FULL_POLICIES}"
+            )
+        self.queue.maxsize = max_size  # Checked on every put(), safe to change live
+        self.full_policy = full_policy
+
+    def start(self) -> None:
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = logging.handlers.QueueListener(
+                self.queue, self.target, respect_handler_level=True
+            )
+            self._listener.start()
+
+    def stop(self) -> None:
+        """
+        Writes out every queued record, then stops the listener thread.
+        """
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+        self.target.flush()
+
+    def after_fork(self) -> None:
+        """
+        A forked worker has no listener thread, and the queue's locks may have
+        been copied mid-use: start over with an empty queue, written
+        synchronously until `start()` runs in the worker.
+        """
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "max_size": self.queue.maxsize,
+            "dropped": self.dropped,
+        }
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """
+    Captures the per-request context on the calling thread (the listener thread
+    cannot see the request ID ContextVar) and hands the record to a LogPipeline.
+    """
+
+    def __init__(self, pipeline: LogPipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, keep exc_info so the listener-side formatter
+        # renders tracebacks exactly as before; the queue is never pickled.
+        record = copy.copy(record)
+        capture_log_context(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if not self.pipeline.running:
+            self.pipeline.target.handle(record)
+        elif self.pipeline.full_policy == "block":
+            self.pipeline.queue.put(record)
+        else:
+            try:
+                self.pipeline.queue.put_nowait(record)
+            except queue.Full:
+                self.pipeline.dropped += 1
+
+
+class LazyRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Opens the log file, and creates its directory, when the first record is
+    written rather than when the handler is created, so importing the app does
+    not touch the file system.
+
+    Safe for several worker processes appending to the same file: a rollover
+    runs under an exclusive lock on `<file>.lock`, and a worker finding the
+    file already rotated for the period by another one just reopens it
+    instead of rotating (and overwriting) it a second time.
+    """
+
+    def __init__(self, filename: Path, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+    def doRollover(self):
+        if fcntl is None:
+            super().doRollover()
+            return
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.baseFilename}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self._rotated_filename()):
+                    super().doRollover()
+                    return
+                if self.stream:  # Rotated by another worker: follow the new file
+                    self.stream.close()
+                    self.stream = None
+                now = int(time.time())
+                self.rolloverAt = self.computeRollover(now)
+                while self.rolloverAt <= now:
+                    self.rolloverAt += self.interval
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rotated_filename(self) -> str:
+        start = self.rolloverAt - self.interval
+        time_tuple = time.gmtime(start) if self.utc else time.localtime(start)
+        return self.rotation_filename(
+            f"{self.baseFilename}.{time.strftime(self.suffix, time_tuple)}"
+        )
+
+
+log_pipeline: Optional[LogPipeline] = None
+log_sampler = LogSampler()
+
+
 def setup_app_logger(name="tax_app_backend_logger", log_level=logging.INFO):
+    global log_pipeline
     logger = logging.getLogger(name)
     logger.setLevel(log_level)
     logger.propagate = False
 
     if not logger.handlers:  # Rotates daily, keeps 7 backup logs
-        trfh = logging.handlers.TimedRotatingFileHandler(
+        trfh = LazyRotatingFileHandler(
             LOG_FILE,
             when="midnight",  # Rotate at midnight
             interval=1,  # Daily
@@ -57,10 +332,63 @@ def setup_app_logger(name="tax_app_backend_logger", log_level=logging.INFO):
             encoding="utf-8",
         )
         trfh.setFormatter(CustomFormatter(use_colors=False))
-        logger.addHandler(trfh)
+        # Started by the application lifespan; written synchronously until then
+        log_pipeline = LogPipeline(trfh)
+        atexit.register(log_pipeline.stop)  # Don't lose queued records on exit
+        queue_handler = QueueLogHandler(log_pipeline)
+        queue_handler.addFilter(log_sampler)  # Sampled out before any formatting
+        logger.addHandler(queue_handler)
 
     return logger
 
 
+def configure_log_pipeline(max_size: int, full_policy: str) -> None:
+    if log_pipeline is not None:
+        log_pipeline.configure(max_size, full_policy)
+
+
+def configure_log_output(
+    log_format: str, sample_rates: Optional[Dict[str, float]] = None
+) -> None:
+    """
+    Switches the file output between the text and JSON-lines formats and sets
+    the sampling rates for high-volume INFO records.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Log format must be one of {LOG_FORMATS}")
+    if log_pipeline is not None:
+        log_pipeline.target.setFormatter(
+            JSONLogFormatter() if log_format == "json" else CustomFormatter()
+        )
+    log_sampler.rates = dict(sample_rates or {})
+
+
+def start_log_pipeline() -> None:
+    if log_pipeline is not None:
+        log_pipeline.start()
+
+
+def stop_log_pipeline() -> None:
+    """
+    Flushes queued records to disk; called on application shutdown.
+    """
+    if log_pipeline is not None:
+        log_pipeline.stop()
+
+
+def _reset_log_pipeline_after_fork() -> None:
+    if log_pipeline is not None:
+        log_pipeline.after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_log_pipeline_after_fork)
+
+
+def get_log_pipeline_stats() -> Dict[str, int]:
+    stats = log_pipeline.stats() if log_pipeline is not None else {}
+    stats["sampled_out"] = log_sampler.sampled_out
+    return stats
+
+
 # Instantiate a default logger for easy import
 app_logger = setup_app_logger()
@@ -0,0 +1,242 @@
+# tax-filer-backend/app/core/metrics.py
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_PLAIN_0_0_4,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    disable_created_metrics,
+    generate_latest,
+    multiprocess,
+)
+
+from app.core.logging_config import app_logger
+from app.models import AIServiceError
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025)
+COMPLETION_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TOKEN_BUCKETS = (25, 50, 100, 200, 350, 500, 1000, 2000, 4000, 8000)
+CONTENT_TYPE = CONTENT_TYPE_PLAIN_0_0_4
+
+# prometheus_client's multiprocess mode: set in the environment of every
+# worker (the gunicorn launcher does) before prometheus_client is imported.
+# Each worker then keeps its values in memory-mapped files in this directory,
+# and `/metrics` aggregates the files of all workers.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+disable_created_metrics()  # No `_created` series next to every counter
+registry = CollectorRegistry(auto_describe=True)
+
+
+class CallbackMetric:
+    """
+    Mirrors a counter or gauge that a service already keeps into a
+    prometheus_client metric. `func` returns `{label values tuple: value}` and
+    is read by `refresh_callback_metrics`, at every scrape and, with several
+    workers, every METRICS_REFRESH_INTERVAL_SECONDS, so each worker's values
+    reach the shared files. Counters are increased by the difference since
+    the last read (a value that went down counts as a reset).
+
+    `multiprocess_mode` tells how the gauges of several workers combine, see
+    prometheus_client's `Gauge`; gauges of exited workers are dropped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        func: Callable[[], Dict[Tuple[str, ...], float]],
+        labelnames: Sequence[str] = (),
+        type_name: str = "gauge",
+        multiprocess_mode: str = "livesum",
+    ):
+        self.name = name
+        self.func = func
+        self.type_name = type_name
+        if type_name == "counter":
+            self.metric = Counter(name, documentation, labelnames, registry=registry)
+        else:
+            self.metric = Gauge(
+                name,
+                documentation,
+                labelnames,
+                registry=registry,
+                multiprocess_mode=multiprocess_mode,
+            )
+        self._last: Dict[Tuple[str, ...], float] = {}
+        _callback_metrics.append(self)
+
+    def refresh(self) -> None:
+        for values, value in self.func().items():
+            if value is None:
+                continue
+            values = tuple(str(v) for v in values)
+            child = self.metric.labels(*values) if values else self.metric
+            if self.type_name == "counter":
+                last = self._last.get(values, 0)
+                child.inc(value - last if value >= last else value)
+                self._last[values] = value
+            else:
+                child.set(value)
+
+
+_callback_metrics: List[CallbackMetric] = []
+
+
+def refresh_callback_metrics() -> None:
+    """
+    Reads every `CallbackMetric`. Must run on the event loop thread, where the
+    services update their counters.
+    """
+    for metric in _callback_metrics:
+        try:
+            metric.refresh()
+        except Exception as e:  # A broken callback must not take /metrics down
+            app_logger.warning(f"Could not read metric {metric.name}: {e}")
+
+
+def render() -> bytes:
+    """
+    Prometheus text exposition format (version 0.0.4), aggregated over the
+    files of every worker in multiprocess mode (blocking). Call
+    `refresh_callback_metrics` first.
+    """
+    if MULTIPROC_DIR is None:
+        return generate_latest(registry)
+    workers = CollectorRegistry()
+    multiprocess.MultiProcessCollector(workers, MULTIPROC_DIR)
+    return generate_latest(workers)
+
+
+# --- Application metrics ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request until its response was fully sent.",
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by status class.",
+    ("status_class",),
+    registry=registry,
+)
+HTTP_REQUESTS_BY_STATUS_CLASS = {
+    status_class: HTTP_REQUESTS.labels(status_class)
+    for status_class in ("1xx", "2xx", "3xx", "4xx", "5xx")
+}
+JWT_DECODE_DURATION = Histogram(
+    "jwt_decode_duration_seconds",
+    "Time spent decoding and validating access tokens.",
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+JWT_VALIDATIONS = Counter(
+    "jwt_validations_total",
+    "Access token checks by result ('valid', 'invalid', 'revoked') and whether the verified-token cache served them.",
+    ("result", "cached"),
+    registry=registry,
+)
+JWT_VALID_CACHED = JWT_VALIDATIONS.labels("valid", "true")
+JWT_VALID_VERIFIED = JWT_VALIDATIONS.labels("valid", "false")
+JWT_INVALID = JWT_VALIDATIONS.labels("invalid", "false")
+JWT_REVOKED = JWT_VALIDATIONS.labels("revoked", "false")
+PROMPT_BUILD_DURATION = Histogram(
+    "ai_prompt_build_duration_seconds",
+    "Time spent building the tax advice prompt.",
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+OPENAI_COMPLETION_DURATION = Histogram(
+    "openai_completion_duration_seconds",
+    "OpenAI completion latency, including retries and model fallback.",
+    buckets=COMPLETION_BUCKETS,
+    registry=registry,
+)
+OPENAI_PROMPT_TOKENS = Histogram(
+    "openai_prompt_tokens",
+    "Prompt tokens per completion.",
+    buckets=TOKEN_BUCKETS,
+    registry=registry,
+)
+OPENAI_COMPLETION_TOKENS = Histogram(
+    "openai_completion_tokens",
+    "Completion tokens per completion.",
+    buckets=TOKEN_BUCKETS,
+    registry=registry,
+)
+OPENAI_CACHED_PROMPT_TOKENS = Counter(
+    "openai_cached_prompt_tokens_total",
+    "Prompt tokens served from the provider's prompt cache.",
+    registry=registry,
+)
+OPENAI_MAX_COMPLETION_TOKENS = Histogram(
+    "openai_max_completion_tokens",
+    "Completion token budget (max_completion_tokens) per completion.",
+    buckets=TOKEN_BUCKETS,
+    registry=registry,
+)
+OPENAI_COMPLETIONS_IN_FLIGHT = Gauge(
+    "openai_completions_in_flight",
+    "OpenAI completions currently in progress.",
+    registry=registry,
+    multiprocess_mode="livesum",
+)
+AI_ADVICE_OUTCOMES = Counter(
+    "ai_advice_requests_total",
+    "Upstream advice requests by outcome ('success' or the AIServiceError).",
+    ("outcome",),
+    registry=registry,
+)
+AI_ADVICE_OUTCOMES_BY_NAME = {
+    outcome: AI_ADVICE_OUTCOMES.labels(outcome)
+    for outcome in ["success"] + [str(error) for error in AIServiceError]
+}
+
+
+def record_advice_outcome(error_type: Optional[AIServiceError]) -> None:
+    AI_ADVICE_OUTCOMES_BY_NAME[str(error_type) if error_type else "success"].inc()
+
+
+def record_http_status(status_code: int) -> None:
+    counter = HTTP_REQUESTS_BY_STATUS_CLASS.get(f"{status_code // 100}xx")
+    if counter is not None:
+        counter.inc()
+
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_forever(interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        refresh_callback_metrics()
+
+
+def start_metrics_refresh(interval_seconds: float) -> None:
+    """
+    In multiprocess mode, mirrors the services' counters into this worker's
+    metric files every `interval_seconds`, so a scrape served by another
+    worker includes them.
+    """
+    global _refresh_task
+    if MULTIPROC_DIR is None or _refresh_task is not None:
+        return
+    _refresh_task = asyncio.create_task(_refresh_forever(interval_seconds))
+    app_logger.info(f"Writing metrics to {MULTIPROC_DIR} (pid {os.getpid()}).")
+
+
+async def stop_metrics_refresh() -> None:
+    global _refresh_task
+    if _refresh_task is None:
+        return
+    _refresh_task.cancel()
+    await asyncio.gather(_refresh_task, return_exceptions=True)
+    _refresh_task = None
+    refresh_callback_metrics()  # This worker's final counts
@@ -0,0 +1,75 @@
+# tax-filer-backend/app/core/server.py
+"""
+Sizing of the worker processes for `gunicorn.conf.py`. Deliberately free of
+application imports: it runs in the launcher before the settings are loaded.
+"""
+
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+MEMORY_RESERVE_SHARE = 0.2  # Left for the master process and the page cache
+UNLIMITED_MEMORY = 1 << 60  # cgroup v1 reports "no limit" as a huge number
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: Path = CGROUP_ROOT) -> Optional[float]:
+    """
+    CPUs the container may use (cgroup v2 `cpu.max`, or the v1 CFS quota),
+    None without a limit.
+    """
+    cpu_max = _read(root / "cpu.max")
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read(root / "cpu" / "cpu.cfs_quota_us")
+    period = _read(root / "cpu" / "cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit(root: Path = CGROUP_ROOT) -> Optional[int]:
+    """
+    Memory limit of the container in bytes (cgroup v2 `memory.max`, or v1
+    `memory.limit_in_bytes`), None without a limit.
+    """
+    limit = _read(root / "memory.max")
+    if limit is None:
+        limit = _read(root / "memory" / "memory.limit_in_bytes")
+    if not limit or limit == "max" or int(limit) >= UNLIMITED_MEMORY:
+        return None
+    return int(limit)
+
+
+def available_cpus(root: Path = CGROUP_ROOT) -> float:
+    cpus = float(len(os.sched_getaffinity(0)))
+    limit = cgroup_cpu_limit(root)
+    return min(cpus, limit) if limit else cpus
+
+
+def recommended_workers(
+    cpus: float,
+    memory_limit: Optional[int],
+    worker_memory_mb: int,
+    max_workers: int,
+) -> int:
+    """
+    One async worker per CPU (rounded up), as many as fit into the memory limit
+    after `MEMORY_RESERVE_SHARE`, capped at `max_workers` and at least one.
+    """
+    workers = max(1, math.ceil(cpus))
+    if memory_limit is not None and worker_memory_mb > 0:
+        usable = memory_limit * (1 - MEMORY_RESERVE_SHARE)
+        workers = min(workers, int(usable // (worker_memory_mb * 1024 * 1024)))
+    return max(1, min(workers, max_workers))
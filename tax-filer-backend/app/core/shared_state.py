@@ -0,0 +1,283 @@
+# tax-filer-backend/app/core/shared_state.py
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import weakref
+
+from app.core.config import settings
+
+SHARED_STATE_FILE = "shared-state.db"
+SHARED_STATE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS shared_kv ("
+    "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+    "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))",
+    "CREATE TABLE IF NOT EXISTS shared_counters ("
+    "namespace TEXT NOT NULL, key TEXT NOT NULL, value INTEGER NOT NULL, "
+    "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))",
+)
+PURGE_EVERY_WRITES = 1000  # Expired counters are deleted every this many writes
+
+_databases: "weakref.WeakSet[SQLiteDatabase]" = weakref.WeakSet()
+
+
+class SQLiteDatabase:
+    """
+    A local SQLite file in WAL mode, opened once per process. Objects created
+    before a pre-forking server (gunicorn with `preload_app`) forks its workers
+    get a fresh connection and lock in every worker, so no connection is ever
+    used by two processes. Hold `lock` while using `connection()`.
+    """
+
+    def __init__(self, path: str, schema: Sequence[str] = ()):
+        self.path = path
+        self.schema = tuple(schema)
+        self.lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inherited: List[sqlite3.Connection] = []
+        _databases.add(self)
+        with self.lock:
+            self.connection()  # Fails fast on a bad path
+
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Autocommit; callers group statements with explicit transactions
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, timeout=5.0, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _after_fork(self) -> None:
+        self.lock = threading.Lock()
+        if self._conn is not None:
+            # Never closed in the child: closing could checkpoint the parent's WAL
+            self._inherited.append(self._conn)
+            self._conn = None
+
+
+def _reopen_databases_after_fork() -> None:
+    for database in list(_databases):
+        database._after_fork()
+
+
+os.register_at_fork(after_in_child=_reopen_databases_after_fork)
+
+
+class SharedState:
+    """
+    State shared by the worker processes on a host through one SQLite file:
+    - key/value entries with expiry, grouped by namespace (the advice cache,
+      idempotency records),
+    - counters over fixed windows that start with their first charge (OpenAI
+      rate budget, session quotas).
+    All calls are blocking and are meant to be run off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(path, SHARED_STATE_SCHEMA)
+        self._writes = 0
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self.db.lock:
+            row = (
+                self.db.connection()
+                .execute(
+                    "SELECT value FROM shared_kv "
+                    "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, key, time.time()),
+                )
+                .fetchone()
+            )
+        return row[0] if row else None
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: str,
+        ttl_seconds: float,
+        max_entries: Optional[int] = None,
+    ) -> None:
+        """
+        Stores `value`, then drops expired entries of the namespace and, with
+        `max_entries`, the ones closest to expiry beyond that number.
+        """
+        now = time.time()
+        with self.db.lock:
+            conn = self.db.connection()
+            with transaction(conn):
+                conn.execute(
+                    "INSERT OR REPLACE INTO shared_kv VALUES (?, ?, ?, ?)",
+                    (namespace, key, value, now + ttl_seconds),
+                )
+                conn.execute(
+                    "DELETE FROM shared_kv WHERE namespace = ? AND expires_at <= ?",
+                    (namespace, now),
+                )
+                if max_entries is not None:
+                    conn.execute(
+                        "DELETE FROM shared_kv WHERE namespace = ? AND key NOT IN "
+                        "(SELECT key FROM shared_kv WHERE namespace = ? "
+                        "ORDER BY expires_at DESC LIMIT ?)",
+                        (namespace, namespace, max_entries),
+                    )
+
+    def add_if_absent(
+        self, namespace: str, key: str, value: str, ttl_seconds: float
+    ) -> Optional[str]:
+        """
+        Stores `value` unless an unexpired entry exists. Returns None when it
+        was stored, otherwise the existing value, so only one process wins.
+        """
+        now = time.time()
+        with self.db.lock:
+            conn = self.db.connection()
+            with transaction(conn):
+                row = conn.execute(
+                    "SELECT value FROM shared_kv "
+                    "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, key, now),
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO shared_kv VALUES (?, ?, ?, ?)",
+                    (namespace, key, value, now + ttl_seconds),
+                )
+        return None
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self.db.lock:
+            self.db.connection().execute(
+                "DELETE FROM shared_kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+
+    def clear(self, namespace: str) -> None:
+        with self.db.lock:
+            conn = self.db.connection()
+            with transaction(conn):
+                conn.execute("DELETE FROM shared_kv WHERE namespace = ?", (namespace,))
+                conn.execute(
+                    "DELETE FROM shared_counters WHERE namespace = ?", (namespace,)
+                )
+
+    def counter(self, namespace: str, key: str) -> int:
+        with self.db.lock:
+            row = (
+                self.db.connection()
+                .execute(
+                    "SELECT value FROM shared_counters "
+                    "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, key, time.time()),
+                )
+                .fetchone()
+            )
+        return row[0] if row else 0
+
+    def add(self, namespace: str, key: str, amount: int, window_seconds: float) -> int:
+        """
+        Adds `amount` to the counter and returns its new value. A counter whose
+        window has ended starts over with a new window.
+        """
+        with self.db.lock:
+            conn = self.db.connection()
+            with transaction(conn):
+                value = self._add(conn, namespace, key, amount, window_seconds)
+        return value
+
+    def consume(
+        self,
+        namespace: str,
+        charges: Dict[str, Tuple[int, int]],
+        window_seconds: float,
+    ) -> float:
+        """
+        Adds each `amount` of `{key: (amount, limit)}` to its counter if every
+        counter stays within its limit (a limit of 0 or less is unlimited; a
+        single charge above the limit still passes on an unused window).
+        Returns 0 on success, otherwise the seconds until the window that is
+        in the way ends, without charging anything.
+        """
+        now = time.time()
+        with self.db.lock:
+            conn = self.db.connection()
+            with transaction(conn):
+                wait = 0.0
+                for key, (amount, limit) in charges.items():
+                    if limit <= 0:
+                        continue
+                    row = conn.execute(
+                        "SELECT value, expires_at FROM shared_counters "
+                        "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                        (namespace, key, now),
+                    ).fetchone()
+                    if row is not None and row[0] > 0 and row[0] + amount > limit:
+                        wait = max(wait, row[1] - now)
+                if wait > 0:
+                    return wait
+                for key, (amount, _) in charges.items():
+                    self._add(conn, namespace, key, amount, window_seconds)
+        return 0.0
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _add(
+        self,
+        conn: sqlite3.Connection,
+        namespace: str,
+        key: str,
+        amount: int,
+        window_seconds: float,
+    ) -> int:
+        now = time.time()
+        (value,) = conn.execute(
+            "INSERT INTO shared_counters VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (namespace, key, amount, now + window_seconds, now, now),
+        ).fetchone()
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            conn.execute("DELETE FROM shared_counters WHERE expires_at <= ?", (now,))
+        return value
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    BEGIN IMMEDIATE ... COMMIT, so the read-check-write sequences of several
+    processes are serialized instead of failing on a lock upgrade.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def open_shared_state(directory: Optional[str]) -> Optional[SharedState]:
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return SharedState(os.path.join(directory, SHARED_STATE_FILE))
+
+
+shared_state = open_shared_state(settings.SHARED_STATE_DIR)
@@ -1,25 +1,57 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, status
+from fastapi.datastructures import Default
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
 
 from app.core.config import settings
-from app.core.logging_config import app_logger
+from app.core.logging_config import (
+    app_logger,
+    configure_log_output,
+    configure_log_pipeline,
+    start_log_pipeline,
+    stop_log_pipeline,
+)
+from app.core.metrics import start_metrics_refresh, stop_metrics_refresh
+from app.core.responses import FastJSONResponse
+from app.middleware.metrics_middleware import MetricsMiddleware
 from app.middleware.request_id_middleware import RequestIDMiddleware
-from app.routers import tax_info, token_router
+from app.routers import metrics_router, tax_info, token_router
+from app.services.ai_service import close_openai_client, start_openai_client
+from app.services.job_queue import advice_job_queue
+from app.services.usage_ledger import usage_ledger
+from app.utils.auth_utils import start_revocation_sync, stop_revocation_sync
 
 if settings.LOG_LEVEL:
     app_logger.setLevel(settings.LOG_LEVEL.upper())
+configure_log_pipeline(settings.LOG_QUEUE_MAX_SIZE, settings.LOG_QUEUE_FULL_POLICY)
+configure_log_output(settings.LOG_FORMAT, settings.log_sample_rates)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    start_log_pipeline()
     app_logger.info("Application startup: FastAPI server is starting.")
     app_logger.info(f"Project Name: {settings.PROJECT_NAME}")
+    app_logger.info(
+        f"OpenAI key present: {'yes' if settings.OPENAI_API_KEY else 'no'} "
+        f"(model: {settings.OPENAI_MODEL_NAME})"
+    )
+    await start_openai_client()
+    await advice_job_queue.start()
+    usage_ledger.start()
+    start_revocation_sync()
+    start_metrics_refresh(settings.METRICS_REFRESH_INTERVAL_SECONDS)
     yield
+    await stop_metrics_refresh()
+    await stop_revocation_sync()
+    await advice_job_queue.stop()
+    await usage_ledger.stop()  # Writes the records still buffered
+    await close_openai_client()
     app_logger.info("Application shutdown: FastAPI server is stopping.")
+    stop_log_pipeline()  # Flush queued log records to disk
 
 
 app = FastAPI(
@@ -28,6 +60,9 @@ app = FastAPI(
     version=settings.VERSION,
     description=settings.DESCRIPTION,
     lifespan=lifespan,
+    # Wrapped in Default() so routes with a response_model keep FastAPI's
+    # Pydantic-to-bytes encoding; only the others use FastJSONResponse
+    default_response_class=Default(FastJSONResponse),
 )
 
 
@@ -37,7 +72,7 @@ async def generic_exception_handler(request: Request, exc: Exception):
         f"Unhandled exception during request to {request.url.path}: {exc}",
         exc_info=True,
     )
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"message": "An internal server error occurred."},
     )
@@ -49,8 +84,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     app_logger.warning(
         f"Request validation error for {request.url.path}: {exc.errors()}"
     )
-    return JSONResponse(
-        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    return FastJSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
         content={"detail": exc.errors()},
     )
 
@@ -62,7 +97,15 @@ origins = [
     # "https://some-frontend-domain.com", # For production
 ]
 
-app.add_middleware(RequestIDMiddleware)
+if settings.RESPONSE_GZIP_MIN_BYTES > 0:
+    # Text/event-stream responses are excluded, so streamed advice is not buffered
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.RESPONSE_GZIP_MIN_BYTES,
+        compresslevel=settings.RESPONSE_GZIP_LEVEL,
+    )
+app.add_middleware(RequestIDMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+app.add_middleware(MetricsMiddleware)  # Outermost, so it times the whole stack
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -78,6 +121,7 @@ app.include_router(
 app.include_router(
     token_router.router, prefix=f"{settings.API_V1_STR}/token", tags=["JWT"]
 )
+app.include_router(metrics_router.router, tags=["System"])
 
 
 # Basic root endpoint
@@ -94,7 +138,7 @@ class UnicornException(Exception):
 
 @app.exception_handler(UnicornException)
 async def unicorn_exception_handler(request: Request, exc: UnicornException):
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=418,
         content={"message": f"Oops! {exc.name} did something. Details: {exc.detail}"},
     )
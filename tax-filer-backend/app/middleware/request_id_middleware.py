@@ -1,34 +1,75 @@
-from contextvars import ContextVar
-
 # tax-filer-backend/app/middleware/request_id_middleware.py
+from contextvars import ContextVar
+import time
 import uuid
 
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # ContextVar to hold the request ID
 request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+# Further per-request context picked up by the log formatters
+route_var: ContextVar[str | None] = ContextVar("route", default=None)
+request_started_var: ContextVar[float | None] = ContextVar(
+    "request_started", default=None
+)
+jti_var: ContextVar[str | None] = ContextVar("jti", default=None)  # Set by auth
+
+REQUEST_ID_HEADER = b"x-request-id"
+
 
+class RequestIDMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task hop or body buffering, so
+    streaming responses pass straight through) that:
+    - takes the request ID from `X-Request-ID` or generates a UUIDv4,
+    - exposes it through `request_id_var` for the duration of the request,
+      alongside the route and start time (and a slot for the session `jti`),
+    - adds it to the response headers, plus an optional `Server-Timing` header
+      with the time spent until the response headers were sent.
+    """
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        # Get X-Request-ID from header, or generate a new one
-        request_id = request.headers.get("X-Request-ID")
+    def __init__(self, app: ASGIApp, server_timing: bool = False) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
         if not request_id:
             request_id = str(uuid.uuid4())
 
-        # Set the request_id in the ContextVar
-        token = request_id_var.set(request_id)
+        started_at = time.perf_counter()
 
-        response = await call_next(request)
-        response.headers["X-Request-ID"] = request_id
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - started_at) * 1000
+                    headers.append("Server-Timing", f"app;dur={elapsed_ms:.1f}")
+            await send(message)
 
-        # Reset the ContextVar after the request is done
-        request_id_var.reset(token)
-        return response
+        token = request_id_var.set(request_id)
+        route_token = route_var.set(f"{scope['method']} {scope['path']}")
+        started_token = request_started_var.set(started_at)
+        jti_token = jti_var.set(None)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            # Always reset, even if the application raised
+            jti_var.reset(jti_token)
+            request_started_var.reset(started_token)
+            route_var.reset(route_token)
+            request_id_var.reset(token)
 
 
 def get_request_id() -> str | None:
@@ -1,5 +1,6 @@
+from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -14,10 +15,36 @@ class TaxInfoInput(BaseModel):
     # More fields in the future...
 
 
+class TaxEstimate(BaseModel):
+    country_code: str
+    currency: str
+    tax_year: str
+    taxable_income: float  # income - expenses - deductions, floored at 0
+    estimated_tax: float
+    effective_rate: float  # estimated_tax / income
+    marginal_rate: float  # Rate of the bracket the taxable income ends in
+    basis: str  # What the estimate covers and leaves out
+
+
 class TaxAdviceResponse(BaseModel):
     message: str
     advice: Optional[str] = None
-    raw_input: Optional[TaxInfoInput] = None  # For debugging
+    # Computed locally from bracket tables; None if the country is not covered
+    estimate: Optional[TaxEstimate] = None
+    degraded: bool = False  # General templated advice, the AI path was unavailable
+    # Echo of the request, only with `?include_input=true` (for debugging);
+    # left out of the JSON entirely otherwise
+    raw_input: Optional[TaxInfoInput] = Field(None, exclude_if=lambda v: v is None)
+
+
+class ModelRouteStatus(BaseModel):
+    model: str
+    rank: int  # Position in the current routing order, 1 is tried first
+    healthy: bool
+    avg_latency_seconds: Optional[float] = None
+    error_rate: float
+    requests: int
+    failures: int
 
 
 class AppInfo(BaseModel):
@@ -27,6 +54,7 @@ class AppInfo(BaseModel):
     default_openai_model: str
     configured_openai_model: str
     api: str
+    model_routing: List[ModelRouteStatus] = []
 
 
 class AIServiceError(str, Enum):
@@ -37,6 +65,7 @@ class AIServiceError(str, Enum):
     API_ERROR = "API_ERROR"
     OAI_ERROR = "OAI_ERROR"
     INTERNAL_ERR = "INTERNAL_ERR"
+    TIMEOUT = "TIMEOUT"
 
     def __str__(self) -> str:
         return self.value
@@ -50,8 +79,99 @@ class AIServiceResponse(BaseModel):
     success: bool
     content: str
     error_type: Optional[AIServiceError] = None
+    cached: bool = False
+    model: Optional[str] = None  # Model that actually produced the advice
+    # Templated fallback advice served instead of an error; error_type says why
+    degraded: bool = False
+
+
+class AIServiceStats(BaseModel):
+    cache: Dict[str, Any]
+    coalescing: Dict[str, Any]
+    admission: Dict[str, Any]
+    upstream: Dict[str, Any]
+    prompt: Dict[str, Any] = {}
+    ledger: Dict[str, Any] = {}
+
+
+class UsageAggregate(BaseModel):
+    # Set for the columns the report is grouped by
+    day: Optional[str] = None
+    model: Optional[str] = None
+    jti: Optional[str] = None
+    requests: int
+    cache_hits: int  # Served from the cache or a coalesced call, no tokens spent
+    errors: int
+    prompt_tokens: int
+    cached_prompt_tokens: int
+    completion_tokens: int
+    avg_latency_ms: Optional[float] = None  # Of the OpenAI calls
+    cost_usd: Optional[float] = None  # None when a model has no price configured
+
+
+class UsageReport(BaseModel):
+    group_by: List[str]
+    since: Optional[str] = None
+    until: Optional[str] = None
+    rows: List[UsageAggregate]
+
+
+class BatchTaxInfoInput(BaseModel):
+    items: List[TaxInfoInput] = Field(
+        ..., min_length=1, description="Tax information records to get advice for"
+    )
+
+
+class BatchTaxAdviceResponse(BaseModel):
+    message: str
+    succeeded: int
+    failed: int
+    results: List[AIServiceResponse]  # Same order as the submitted items
+    estimates: List[Optional[TaxEstimate]] = []  # Same order as well
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class AdviceJob(BaseModel):
+    job_id: str
+    status: JobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # Result is dropped after this time
+    result: Optional[AIServiceResponse] = None
+
+
+class AdviceJobQueueStats(BaseModel):
+    depth: int
+    max_depth: int
+    oldest_queued_age_seconds: float
+    running: int
+    workers: int
+    tracked_jobs: int
 
 
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+
+
+class RevokeTokenRequest(BaseModel):
+    jti: str = Field(..., min_length=1, description="ID of the token to revoke")
+    expires_at: Optional[datetime] = Field(
+        None,
+        description="The token's exp; defaults to the longest lifetime of an issued token",
+    )
+
+
+class RevokeTokenResponse(BaseModel):
+    jti: str
+    revoked_until: datetime
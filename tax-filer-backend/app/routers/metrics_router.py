@@ -0,0 +1,191 @@
+# tax-filer-backend/app/routers/metrics_router.py
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Response, status
+
+from app.core.config import settings
+from app.core.logging_config import get_log_pipeline_stats
+from app.core.metrics import (
+    CONTENT_TYPE,
+    MULTIPROC_DIR,
+    CallbackMetric,
+    refresh_callback_metrics,
+    render,
+)
+from app.services.ai_service import (
+    admission_controller,
+    advice_cache,
+    inflight_requests,
+    upstreams,
+)
+from app.services.fallback_advice import fallback_advisor
+from app.services.job_queue import advice_job_queue
+from app.services.resilience import CircuitState
+from app.services.session_quota import batch_item_quota, session_quota
+from app.services.usage_ledger import usage_ledger
+from app.utils.auth_utils import revocation_list, verified_token_cache
+
+router = APIRouter()
+
+CIRCUIT_STATE_VALUES = {
+    CircuitState.CLOSED: 0,
+    CircuitState.HALF_OPEN: 1,
+    CircuitState.OPEN: 2,
+}
+
+
+def _advice_job_counts():
+    stats = advice_job_queue.stats()
+    return {("queued",): stats.depth, ("running",): stats.running}
+
+
+def _log_discard_counts():
+    stats = get_log_pipeline_stats()
+    return {
+        ("dropped",): stats.get("dropped", 0),
+        ("sampled_out",): stats["sampled_out"],
+    }
+
+
+def _register_service_metrics() -> None:
+    """
+    Exposes the counters the services already keep, read at scrape time.
+    """
+    CallbackMetric(
+        "ai_advice_cache_lookups_total",
+        "Advice cache lookups by result.",
+        lambda: {
+            ("hit_local",): advice_cache.hits_local,
+            ("hit_shared",): advice_cache.hits_shared,
+            ("miss",): advice_cache.misses,
+        },
+        ("result",),
+        type_name="counter",
+    )
+    CallbackMetric(
+        "ai_advice_cache_evictions_total",
+        "Entries evicted from the in-process advice cache.",
+        lambda: {(): advice_cache.local.evictions},
+        type_name="counter",
+    )
+    CallbackMetric(
+        "ai_advice_cache_entries",
+        "Entries in the in-process advice cache.",
+        lambda: {(): len(advice_cache.local)},
+    )
+    CallbackMetric(
+        "ai_coalesced_requests_total",
+        "Advice requests served by joining an identical in-flight request.",
+        lambda: {(): inflight_requests.coalesced},
+        type_name="counter",
+    )
+    CallbackMetric(
+        "ai_admission_requests",
+        "Upstream requests currently admitted or waiting for admission.",
+        lambda: {
+            ("in_flight",): admission_controller.in_flight,
+            ("waiting",): admission_controller.waiting,
+        },
+        ("state",),
+    )
+    CallbackMetric(
+        "ai_admission_rejected_total",
+        "Upstream requests rejected by admission control.",
+        lambda: {(): admission_controller.rejected},
+        type_name="counter",
+    )
+    CallbackMetric(
+        "openai_circuit_state",
+        "Circuit breaker state per model (0 closed, 1 half-open, 2 open).",
+        lambda: {
+            (model,): CIRCUIT_STATE_VALUES[caller.circuit_breaker.state]
+            for model, caller in upstreams.items()
+        },
+        ("model",),
+        multiprocess_mode="livemax",
+    )
+    CallbackMetric(
+        "openai_retries_total",
+        "Retried OpenAI calls per model.",
+        lambda: {(model,): caller.retries for model, caller in upstreams.items()},
+        ("model",),
+        type_name="counter",
+    )
+    CallbackMetric(
+        "openai_hedges_total",
+        "Hedged OpenAI calls per model.",
+        lambda: {(model,): caller.hedges for model, caller in upstreams.items()},
+        ("model",),
+        type_name="counter",
+    )
+    CallbackMetric(
+        "advice_jobs",
+        "Advice jobs waiting in the queue or running.",
+        _advice_job_counts,
+        ("state",),
+    )
+    CallbackMetric(
+        "session_quota_rejected_total",
+        "Requests rejected because the session used up its quota.",
+        lambda: {(): session_quota.rejected + batch_item_quota.rejected},
+        type_name="counter",
+    )
+    CallbackMetric(
+        "ai_fallback_advice_total",
+        "Requests answered with templated fallback advice, by the error it replaced.",
+        lambda: {(reason,): count for reason, count in fallback_advisor.served.items()},
+        ("reason",),
+        type_name="counter",
+    )
+    CallbackMetric(
+        "jwt_cache_entries",
+        "Verified access tokens held in memory.",
+        lambda: {(): len(verified_token_cache)},
+    )
+    CallbackMetric(
+        "jwt_revoked_tokens",
+        "Revoked, not yet expired token IDs known to the worker.",
+        lambda: {(): len(revocation_list)},
+        multiprocess_mode="livemax",
+    )
+    CallbackMetric(
+        "usage_ledger_records_total",
+        "Usage ledger records written to disk or dropped by a full buffer.",
+        lambda: {
+            ("written",): usage_ledger.written,
+            ("dropped",): usage_ledger.dropped,
+        },
+        ("result",),
+        type_name="counter",
+    )
+    CallbackMetric(
+        "usage_ledger_buffered_records",
+        "Usage ledger records waiting to be written.",
+        lambda: {(): usage_ledger.buffered},
+    )
+    CallbackMetric(
+        "log_records_discarded_total",
+        "Log records dropped by a full log queue or sampled out.",
+        _log_discard_counts,
+        ("reason",),
+        type_name="counter",
+    )
+
+
+_register_service_metrics()
+
+
+@router.get("/metrics", summary="Prometheus Metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Metrics in the Prometheus text exposition format, aggregated over the
+    workers when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    refresh_callback_metrics()
+    if MULTIPROC_DIR is None:
+        body = render()
+    else:  # Reads every worker's files, off the event loop
+        body = await asyncio.to_thread(render)
+    return Response(body, media_type=CONTENT_TYPE)
@@ -1,18 +1,62 @@
-from typing import Any, Dict
+import asyncio
+from datetime import date
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
 from app.core.config import Settings
 from app.core.config import settings as app_settings
 from app.core.logging_config import app_logger
 from app.models import (
+    AdviceJob,
+    AdviceJobQueueStats,
+    AIServiceError,
     AIServiceResponse,
+    AIServiceStats,
     AppInfo,
+    BatchTaxAdviceResponse,
+    BatchTaxInfoInput,
     TaxAdviceResponse,
+    TaxEstimate,
     TaxInfoInput,
+    UsageAggregate,
+    UsageReport,
+)
+from app.services.admission import AdmissionRejectedError
+from app.services.ai_service import (
+    admission_controller,
+    get_ai_service_stats,
+    get_tax_advice_from_ai,
+    model_router,
+    stream_tax_advice_from_ai,
+)
+from app.services.idempotency import (
+    IdempotencyKeyInProgressError,
+    IdempotencyKeyReusedError,
+    idempotency_store,
+    request_fingerprint,
 )
-from app.services.ai_service import get_tax_advice_from_ai
-from app.utils.auth_utils import get_current_session_payload
+from app.services.job_queue import QueueFullError, advice_job_queue
+from app.services.session_quota import (
+    QuotaExceededError,
+    SessionQuota,
+    batch_item_quota,
+    session_quota,
+)
+from app.services.tax_engine import tax_engine
+from app.services.usage_ledger import parse_group_by, usage_ledger
+from app.utils.auth_utils import get_current_session_payload, require_admin_key
 
 router = APIRouter()
 
@@ -21,14 +65,64 @@ def get_settings() -> Settings:
     return app_settings
 
 
+async def enforce_session_quota(
+    jwt_payload: Dict[str, Any] = Depends(get_current_session_payload),
+) -> Dict[str, Any]:
+    """
+    Charges the request to the session's quota (see `SessionQuota`) and returns
+    the JWT payload.
+    """
+    await _charge_session_quota(jwt_payload.get("jti", "unknown_jti"))
+    return jwt_payload
+
+
+async def enforce_idempotent_session_quota(
+    tax_input: TaxInfoInput = Body(...),
+    jwt_payload: Dict[str, Any] = Depends(get_current_session_payload),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+) -> Dict[str, Any]:
+    """
+    `enforce_session_quota` for `/submit-advice`: a retry carrying a known
+    `Idempotency-Key` with the same body is answered without another
+    completion, so it is not charged again.
+    """
+    session_jti = jwt_payload.get("jti", "unknown_jti")
+    if idempotency_key and await idempotency_store.seen(
+        session_jti, idempotency_key, request_fingerprint(tax_input)
+    ):
+        return jwt_payload
+    await _charge_session_quota(session_jti)
+    return jwt_payload
+
+
+async def _charge_session_quota(
+    session_jti: str, requests: int = 1, quota: SessionQuota = session_quota
+) -> None:
+    try:
+        await quota.charge(session_jti, requests)
+    except QuotaExceededError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Session quota exceeded ({e.reason}). Please try again later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 @router.post(
     "/submit-advice",
     response_model=TaxAdviceResponse,
     summary="Submit Tax Info for AI Advice",
 )
 async def submit_tax_info_and_get_advice(
+    response: Response,
     tax_input: TaxInfoInput = Body(...),
-    jwt_payload: Dict[str, Any] = Depends(get_current_session_payload),
+    jwt_payload: Dict[str, Any] = Depends(enforce_idempotent_session_quota),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", min_length=1, max_length=255
+    ),
+    include_input: bool = Query(
+        False, description="Echo the submitted input back as `raw_input`"
+    ),
 ):
     """
     Receives user's tax information, processes it (e.g., validation),
@@ -38,36 +132,118 @@ async def submit_tax_info_and_get_advice(
     - **expenses**: User's total deductible expenses (must be >= 0).
     - **deductions**: User's other claimed deductions (optional, >= 0).
     - **country**: User's country of residence for tax purposes.
+
+    `raw_input` (the submitted input) is only included with `?include_input=true`.
+
+    With an `Idempotency-Key` header, a retry with the same key and body within
+    `IDEMPOTENCY_WINDOW_SECONDS` returns the original successful response (or
+    waits for the original request if it is still running) and is marked with
+    `Idempotent-Replayed: true`. Reusing a key with a different body is a 422.
+    With several workers sharing state, a retry that reaches another worker
+    while the original is still running gets a 409 with `Retry-After`.
     """
     session_jti = jwt_payload.get("jti", "unknown_jti")
     app_logger.info(
         f"Access granted for JWT (jti: {session_jti}). "
-        f"Processing tax advice request for country: {tax_input.country}"
+        f"Processing tax advice request for country: {tax_input.country}",
+        extra={"log_key": "access_granted"},
     )
+    if not idempotency_key:
+        advice_response, _ = await _get_advice_response(tax_input, session_jti)
+        return _with_input(advice_response, tax_input, include_input)
     try:
-        ai_advice: AIServiceResponse = await get_tax_advice_from_ai(tax_input)
+        (advice_response, _), replayed = await idempotency_store.run(
+            session_jti,
+            idempotency_key,
+            request_fingerprint(tax_input),
+            lambda: _get_advice_response(tax_input, session_jti),
+            should_store=lambda result: result[1],
+            encode=lambda result: result[0].model_dump_json(),
+            decode=lambda stored: (TaxAdviceResponse.model_validate_json(stored), True),
+        )
+    except IdempotencyKeyReusedError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="Idempotency-Key was already used with a different request body.",
+        )
+    except IdempotencyKeyInProgressError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed.",
+            headers={"Retry-After": "1"},
+        )
+    if replayed:
+        app_logger.info(f"Replaying response for Idempotency-Key of jti {session_jti}")
+        response.headers["Idempotent-Replayed"] = "true"
+    return _with_input(advice_response, tax_input, include_input)
+
+
+def _with_input(
+    advice_response: TaxAdviceResponse, tax_input: TaxInfoInput, include_input: bool
+) -> TaxAdviceResponse:
+    if not include_input:
+        return advice_response
+    # Already validated parts, so the copy skips validation; stored idempotent
+    # responses stay without the input
+    return advice_response.model_copy(update={"raw_input": tax_input})
+
 
+async def _get_advice_response(
+    tax_input: TaxInfoInput, session_jti: str
+) -> Tuple[TaxAdviceResponse, bool]:
+    """
+    Returns the response for `/submit-advice` and whether the AI call succeeded
+    (degraded fallback advice does not count).
+    """
+    try:
+        ai_advice: AIServiceResponse = await get_tax_advice_from_ai(
+            tax_input, session_id=session_jti
+        )
+
+        if ai_advice.success and ai_advice.degraded:
+            return (
+                TaxAdviceResponse(
+                    message="Tax information processed. The AI service is unavailable, so general advice was provided instead.",
+                    advice=ai_advice.content,
+                    estimate=tax_engine.estimate(tax_input),
+                    degraded=True,
+                ),
+                False,  # Not worth replaying once the AI service is back
+            )
         if ai_advice.success:
             app_logger.info(
                 f"Successfully generated AI advice for country: {tax_input.country}"
             )
-            return TaxAdviceResponse(
-                message="Tax information processed and AI advice retrieved successfully.",
-                advice=ai_advice.content,
-                raw_input=tax_input,
+            return (
+                TaxAdviceResponse(
+                    message="Tax information processed and AI advice retrieved successfully.",
+                    advice=ai_advice.content,
+                    estimate=tax_engine.estimate(tax_input),
+                ),
+                True,
             )
         else:
             app_logger.warning(
-                f"AI service returned an error for input: {tax_input.model_dump()} (Error: {ai_advice.error_type})"
+                f"AI service returned an error for input: {tax_input.model_dump()} (Error: {ai_advice.error_type})",
+                extra={"error_type": ai_advice.error_type},
             )
-            return TaxAdviceResponse(
-                message="Processed tax information, but encountered an issue getting AI advice.",
-                advice=ai_advice.content,
-                raw_input=tax_input,
+            return (
+                TaxAdviceResponse(
+                    message="Processed tax information, but encountered an issue getting AI advice.",
+                    advice=ai_advice.content,
+                    estimate=tax_engine.estimate(tax_input),
+                ),
+                False,
             )
 
     except HTTPException:  # Re-raise HTTPExceptions
         raise
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="AI service is temporarily unavailable due to high demand. Please try again later.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         app_logger.error(
             f"Error processing tax advice for input {tax_input.dict()}: {e}",
@@ -78,11 +254,243 @@ async def submit_tax_info_and_get_advice(
         )
 
 
+@router.post(
+    "/submit-advice/batch",
+    response_model=BatchTaxAdviceResponse,
+    summary="Submit a Batch of Tax Infos for AI Advice",
+)
+async def submit_tax_info_batch_and_get_advice(
+    batch: BatchTaxInfoInput = Body(...),
+    jwt_payload: Dict[str, Any] = Depends(get_current_session_payload),
+):
+    """
+    Gets AI advice for many tax information records in a single request.
+    Records are processed concurrently (at most `AI_BATCH_CONCURRENCY` at a time)
+    through the same cached, deduplicated path as `/submit-advice`. Like any
+    other request of the session, batch items count against the per-session
+    OpenAI admission cap, so at most `OPENAI_MAX_CONCURRENT_REQUESTS_PER_SESSION`
+    of them run at a time. Each item is
+    charged to the session's batch item budget (`SESSION_QUOTA_BATCH_ITEMS`
+    per `SESSION_QUOTA_BATCH_WINDOW_SECONDS`) instead of its request quota; a
+    batch that does not fit into what is left of it is rejected as a whole
+    with a 429, and one larger than the whole budget with a 413.
+
+    Failures are reported per item: `results[i]` always corresponds to
+    `items[i]` and carries its own `success`/`error_type`; items answered with
+    fallback advice count as succeeded and are marked `degraded`.
+    """
+    max_items = _max_batch_items()
+    if len(batch.items) > max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"A batch may contain at most {max_items} items.",
+        )
+
+    session_jti = jwt_payload.get("jti", "unknown_jti")
+    await _charge_session_quota(session_jti, 0)  # The daily token quota only
+    await _charge_session_quota(session_jti, len(batch.items), batch_item_quota)
+    app_logger.info(
+        f"Access granted for JWT (jti: {session_jti}). "
+        f"Processing batch tax advice request with {len(batch.items)} items",
+        extra={"log_key": "access_granted"},
+    )
+    concurrency = app_settings.AI_BATCH_CONCURRENCY
+    if admission_controller.max_concurrency_per_session > 0:
+        # More would only queue in admission control and time out there
+        concurrency = min(concurrency, admission_controller.max_concurrency_per_session)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def advise(tax_input: TaxInfoInput) -> AIServiceResponse:
+        async with semaphore:
+            try:
+                return await get_tax_advice_from_ai(tax_input, session_id=session_jti)
+            except AdmissionRejectedError as e:  # Fallback disabled for it
+                return e.to_response()
+            except Exception as e:
+                app_logger.error(
+                    f"Error processing batch item for country {tax_input.country}: {e}",
+                    exc_info=True,
+                )
+                return AIServiceResponse(
+                    success=False,
+                    content="An unexpected error occurred while trying to get AI-powered tax advice.",
+                    error_type=AIServiceError.INTERNAL_ERR,
+                )
+
+    results = await asyncio.gather(*(advise(item) for item in batch.items))
+    failed = sum(1 for result in results if not result.success)
+    app_logger.info(
+        f"Batch tax advice finished: {len(results) - failed} succeeded, {failed} failed"
+    )
+    return BatchTaxAdviceResponse(
+        message=(
+            "Batch processed successfully."
+            if not failed
+            else "Batch processed, but some items encountered an issue getting AI advice."
+        ),
+        succeeded=len(results) - failed,
+        failed=failed,
+        results=results,
+        estimates=tax_engine.estimate_many(batch.items),
+    )
+
+
+def _max_batch_items() -> int:
+    """
+    `AI_BATCH_MAX_ITEMS`, capped at the batch item budget: a larger batch
+    could never be admitted, so it is rejected as too large rather than with
+    a 429 whose `Retry-After` would never help.
+    """
+    if batch_item_quota.max_requests > 0:
+        return min(app_settings.AI_BATCH_MAX_ITEMS, batch_item_quota.max_requests)
+    return app_settings.AI_BATCH_MAX_ITEMS
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _advice_event_stream(
+    tax_input: TaxInfoInput, session_jti: str
+) -> AsyncIterator[str]:
+    estimate = tax_engine.estimate(tax_input)
+    if estimate is not None:
+        yield format_sse("estimate", estimate.model_dump())
+    async for item in stream_tax_advice_from_ai(tax_input, session_id=session_jti):
+        yield format_sse(item["event"], item["data"])
+
+
+@router.post(
+    "/submit-advice/stream",
+    response_class=StreamingResponse,
+    summary="Submit Tax Info for Streamed AI Advice",
+)
+async def submit_tax_info_and_stream_advice(
+    tax_input: TaxInfoInput = Body(...),
+    jwt_payload: Dict[str, Any] = Depends(enforce_session_quota),
+):
+    """
+    Same input as `/submit-advice`, but the advice is streamed back as
+    Server-Sent Events while the model generates it:
+
+    - **estimate**: the local `TaxEstimate`, sent first (if the country is covered).
+    - **delta**: `{"content": "..."}` for every generated chunk.
+    - **done**: `{"id": ..., "usage": {...}, "cached": bool}` once generation finished;
+      fallback advice (see `AI_FALLBACK_ON_ERRORS`) ends with `"degraded": true`
+      and the `error_type` that triggered it.
+    - **error**: `{"error_type": ..., "content": ...}` if the AI service failed;
+      `error_type` is one of the `AIServiceError` codes.
+    """
+    session_jti = jwt_payload.get("jti", "unknown_jti")
+    app_logger.info(
+        f"Access granted for JWT (jti: {session_jti}). "
+        f"Streaming tax advice for country: {tax_input.country}",
+        extra={"log_key": "access_granted"},
+    )
+    return StreamingResponse(
+        _advice_event_stream(tax_input, session_jti),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/estimate",
+    response_model=TaxEstimate,
+    summary="Estimate Tax Locally (no AI)",
+)
+async def estimate_tax(
+    tax_input: TaxInfoInput = Body(...),
+    jwt_payload: Dict[str, Any] = Depends(get_current_session_payload),
+):
+    """
+    Taxable income and estimated national income tax from the local bracket
+    tables. Instant and independent of the AI service, so it keeps working
+    when the AI path is degraded. Not charged to the session quota.
+    """
+    estimate = tax_engine.estimate(tax_input)
+    if estimate is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=(
+                f"No tax brackets for '{tax_input.country}'. "
+                f"Supported: {', '.join(tax_engine.supported_countries())}."
+            ),
+        )
+    return estimate
+
+
+@router.post(
+    "/jobs",
+    response_model=AdviceJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Queue Tax Info for Asynchronous AI Advice",
+)
+async def submit_tax_advice_job(
+    response: Response,
+    tax_input: TaxInfoInput = Body(...),
+    jwt_payload: Dict[str, Any] = Depends(enforce_session_quota),
+):
+    """
+    Queues the tax information for AI advice and returns a job id immediately.
+    Poll `GET /jobs/{job_id}` with the same token until the job has `succeeded`
+    or `failed`; finished results are kept for `ADVICE_JOBS_RESULT_TTL_SECONDS`.
+    """
+    session_jti = jwt_payload.get("jti", "unknown_jti")
+    try:
+        job = await advice_job_queue.submit(tax_input, owner=session_jti)
+    except QueueFullError as e:
+        app_logger.warning(f"Rejecting advice job for jti {session_jti}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many pending advice requests. Please try again later.",
+            headers={"Retry-After": "5"},
+        )
+    app_logger.info(
+        f"Queued advice job {job.job_id} (jti: {session_jti}) for country: {tax_input.country}"
+    )
+    response.headers["Location"] = f"{app_settings.API_V1_STR}/tax/jobs/{job.job_id}"
+    return job
+
+
+@router.get(
+    "/jobs/stats",
+    response_model=AdviceJobQueueStats,
+    summary="Get Advice Job Queue Stats",
+    tags=["System"],
+)
+async def get_advice_job_queue_stats():
+    """
+    Queue depth and age of the oldest queued job, e.g. for autoscaling decisions.
+    """
+    return advice_job_queue.stats()
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=AdviceJob,
+    summary="Get Asynchronous AI Advice Job",
+)
+async def get_tax_advice_job(
+    job_id: str,
+    jwt_payload: Dict[str, Any] = Depends(get_current_session_payload),
+):
+    job = await advice_job_queue.lookup(
+        job_id, owner=jwt_payload.get("jti", "unknown_jti")
+    )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found or its result has expired.",
+        )
+    return job
+
+
 @router.get(
     "/info", response_model=AppInfo, summary="Get Instance Info", tags=["System"]
 )
 async def get_app_info():
-    app_logger.info("Fetching application info.")
+    app_logger.info("Fetching application info.", extra={"log_key": "app_info"})
     return AppInfo(
         project_name=app_settings.PROJECT_NAME,
         version=app_settings.VERSION,
@@ -90,6 +498,66 @@ async def get_app_info():
         default_openai_model=app_settings.DEFAULT_OPENAI_MODEL,
         configured_openai_model=app_settings.OPENAI_MODEL_NAME,
         api=app_settings.API_V1_STR,
+        model_routing=model_router.routing_table(),
+    )
+
+
+@router.get(
+    "/ai/stats",
+    response_model=AIServiceStats,
+    summary="Get AI Service Stats",
+    tags=["System"],
+)
+async def get_ai_stats():
+    """
+    Cache, request coalescing, admission control, retry and circuit breaker
+    counters of the AI service.
+    """
+    return AIServiceStats(**get_ai_service_stats())
+
+
+@router.get(
+    "/ai/usage",
+    response_model=UsageReport,
+    summary="Get AI Usage and Cost (admin)",
+    tags=["System"],
+    dependencies=[Depends(require_admin_key)],
+)
+async def get_ai_usage(
+    group_by: str = Query("day,model", description="Any of day, model, jti"),
+    since: Optional[date] = Query(None, description="First UTC day, inclusive"),
+    until: Optional[date] = Query(None, description="Last UTC day, inclusive"),
+    model: Optional[str] = Query(None),
+):
+    """
+    Requests, cache hits, errors, tokens, average OpenAI latency and estimated
+    cost (AI_MODEL_PRICES) from the usage ledger. This worker's buffered
+    records are written first; other workers' records show up within
+    USAGE_LEDGER_FLUSH_INTERVAL_SECONDS.
+    """
+    if not usage_ledger.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The usage ledger is disabled (USAGE_LEDGER_ENABLED=false).",
+        )
+    try:
+        columns = parse_group_by(group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await usage_ledger.flush()
+    rows = await asyncio.to_thread(
+        usage_ledger.aggregate,
+        columns,
+        since.isoformat() if since else None,
+        until.isoformat() if until else None,
+        model,
+        app_settings.ai_model_prices,
+    )
+    return UsageReport(
+        group_by=list(columns),
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+        rows=[UsageAggregate(**row) for row in rows],
     )
 
 
@@ -1,11 +1,15 @@
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.core.config import settings
 from app.core.logging_config import app_logger
-from app.models import TokenResponse
-from app.utils.auth_utils import create_access_token
+from app.models import RevokeTokenRequest, RevokeTokenResponse, TokenResponse
+from app.utils.auth_utils import (
+    create_access_token,
+    require_admin_key,
+    revoke_token_id,
+)
 
 router = APIRouter()
 
@@ -40,3 +44,25 @@ async def request_new_jwt_token():
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not generate access token due to an internal error.",
         )
+
+
+@router.post(
+    "/revoke",
+    response_model=RevokeTokenResponse,
+    summary="Revoke a JWT Access Token (admin)",
+    tags=["Auth"],
+    dependencies=[Depends(require_admin_key)],
+)
+async def revoke_jwt_token(revoke_request: RevokeTokenRequest):
+    """
+    Rejects the token with the given `jti` from now on, in every worker within
+    JWT_REVOCATION_SYNC_INTERVAL_SECONDS when a shared store is configured.
+    The revocation is forgotten once the token would have expired anyway.
+    """
+    expires_at = revoke_request.expires_at or datetime.now(timezone.utc) + timedelta(
+        minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    await revoke_token_id(revoke_request.jti, expires_at)
+    return RevokeTokenResponse(jti=revoke_request.jti, revoked_until=expires_at)
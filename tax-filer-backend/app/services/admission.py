@@ -0,0 +1,260 @@
+# tax-filer-backend/app/services/admission.py
+import asyncio
+from contextlib import asynccontextmanager
+import math
+import sqlite3
+import time
+from typing import AsyncIterator, Dict, Optional
+
+from app.core.logging_config import app_logger
+from app.core.shared_state import SharedState
+from app.models import AIServiceError, AIServiceResponse
+
+RATE_BUDGET_NAMESPACE = "openai_rate_budget"
+
+
+class AdmissionRejectedError(Exception):
+    """
+    Raised when a completion cannot be admitted within the allowed wait time.
+    `retry_after` is the number of seconds after which a retry is likely to succeed.
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    def to_response(self) -> AIServiceResponse:
+        return AIServiceResponse(
+            success=False,
+            content="AI service is temporarily unavailable due to high demand (rate limit). Please try again later.",
+            error_type=AIServiceError.API_LIMIT_EXCEEDED,
+        )
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `capacity` tokens per minute.
+    A capacity of 0 disables the bucket.
+    """
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self.refill_per_second = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.refill_per_second,
+        )
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if they are available now).
+        """
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        if self.capacity > 0:
+            self._tokens -= min(amount, self.capacity)
+
+
+class _SessionSlots:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+
+async def _acquire(semaphore: asyncio.Semaphore, timeout: float) -> bool:
+    if not semaphore.locked():
+        await semaphore.acquire()
+        return True
+    if timeout <= 0:
+        return False
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class AdmissionController:
+    """
+    Back-pressure in front of the OpenAI client:
+    - a global cap on concurrent completions,
+    - request (RPM) and token (TPM) buckets sized to the account's limits,
+    - a per-session cap so a single `jti` cannot take every slot.
+    Requests wait up to `max_wait_seconds` for capacity and are otherwise
+    rejected with `AdmissionRejectedError` instead of being sent upstream.
+    The rate budget is only charged once a request holds its slots.
+
+    With a `shared_state`, the RPM/TPM budget is shared by every worker on the
+    host, as fixed one-minute windows, instead of per-process token buckets.
+    The concurrency caps stay per process.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_concurrency_per_session: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_wait_seconds: float,
+        shared_state: Optional[SharedState] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_session = max_concurrency_per_session
+        self.max_wait_seconds = max_wait_seconds
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.shared_state = shared_state
+        self._global = asyncio.Semaphore(max(1, max_concurrency))
+        self._sessions: Dict[str, _SessionSlots] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        session_id: Optional[str],
+        estimated_tokens: int,
+        max_wait_seconds: Optional[float] = None,
+    ) -> AsyncIterator[float]:
+        """
+        Holds a completion slot for the duration of the block and yields the
+        time spent waiting for it, in seconds. `max_wait_seconds` can only
+        shorten the configured wait.
+        """
+        started_at = time.monotonic()
+        if max_wait_seconds is None or max_wait_seconds > self.max_wait_seconds:
+            max_wait_seconds = self.max_wait_seconds
+        deadline = started_at + max_wait_seconds
+        session = self._session_slots(session_id)
+        self.waiting += 1
+        try:
+            if session is not None and not await _acquire(
+                session.semaphore, deadline - time.monotonic()
+            ):
+                self._reject("per-session concurrency limit reached", 1.0, session_id)
+            try:
+                if not await _acquire(self._global, deadline - time.monotonic()):
+                    self._reject("global concurrency limit reached", 1.0, session_id)
+                try:
+                    # Charged last, so a request rejected for a slot spends none
+                    await self._wait_for_rate_budget(
+                        deadline, estimated_tokens, session_id
+                    )
+                except BaseException:
+                    self._global.release()
+                    raise
+            except BaseException:
+                if session is not None:
+                    session.semaphore.release()
+                raise
+        except BaseException:
+            self.waiting -= 1
+            self._release_session(session_id, session)
+            raise
+
+        self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield time.monotonic() - started_at
+        finally:
+            self.in_flight -= 1
+            self._global.release()
+            if session is not None:
+                session.semaphore.release()
+            self._release_session(session_id, session)
+
+    async def _wait_for_rate_budget(
+        self, deadline: float, estimated_tokens: int, session_id: Optional[str]
+    ) -> None:
+        while True:
+            if self.shared_state is not None:
+                wait = await self._consume_shared_budget(estimated_tokens)
+                if wait <= 0:
+                    return
+            else:
+                wait = max(
+                    self.request_bucket.wait_time(1),
+                    self.token_bucket.wait_time(estimated_tokens),
+                )
+                if wait <= 0:
+                    self.request_bucket.consume(1)
+                    self.token_bucket.consume(estimated_tokens)
+                    return
+            if time.monotonic() + wait > deadline:
+                self._reject("OpenAI rate budget exhausted", wait, session_id)
+            await asyncio.sleep(wait)
+
+    async def _consume_shared_budget(self, estimated_tokens: int) -> float:
+        requests_limit = int(self.request_bucket.capacity)
+        tokens_limit = int(self.token_bucket.capacity)
+        if requests_limit <= 0 and tokens_limit <= 0:
+            return 0.0
+        try:
+            return await asyncio.to_thread(
+                self.shared_state.consume,
+                RATE_BUDGET_NAMESPACE,
+                {
+                    "requests": (1, requests_limit),
+                    "tokens": (estimated_tokens, tokens_limit),
+                },
+                60,
+            )
+        except sqlite3.Error as e:
+            app_logger.warning(f"Shared OpenAI rate budget unavailable: {e}")
+            return 0.0  # Upstream 429s are still retried and fall back
+
+    def _reject(self, reason: str, retry_after: float, session_id: Optional[str]):
+        self.rejected += 1
+        app_logger.warning(
+            f"Rejecting AI request for session {session_id}: {reason} "
+            f"(retry after ~{retry_after:.1f}s)"
+        )
+        raise AdmissionRejectedError(reason, retry_after)
+
+    def _session_slots(self, session_id: Optional[str]) -> Optional[_SessionSlots]:
+        if session_id is None or self.max_concurrency_per_session <= 0:
+            return None
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _SessionSlots(
+                self.max_concurrency_per_session
+            )
+        session.users += 1
+        return session
+
+    def _release_session(
+        self, session_id: Optional[str], session: Optional[_SessionSlots]
+    ) -> None:
+        if session is None:
+            return
+        session.users -= 1
+        if session.users == 0:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "active_sessions": len(self._sessions),
+        }
@@ -0,0 +1,283 @@
+# tax-filer-backend/app/services/advice_cache.py
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import math
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.core.logging_config import app_logger
+from app.core.shared_state import SharedState
+from app.models import AIServiceResponse, TaxInfoInput
+
+EVICTION_POLICIES = ("lru", "fifo")
+SHARED_NAMESPACE = "advice_cache"
+
+
+def canonicalize_tax_input(tax_data: TaxInfoInput) -> Dict[str, Any]:
+    """
+    Returns a canonical representation of the user's input, so that requests
+    differing only in formatting (country casing/whitespace, float noise,
+    missing vs zero deductions) map to the same cache entry.
+    """
+    return {
+        "country": tax_data.country.strip().upper(),
+        "income": round(float(tax_data.income), 2),
+        "expenses": round(float(tax_data.expenses), 2),
+        "deductions": round(float(tax_data.deductions or 0), 2),
+    }
+
+
+@dataclass(frozen=True)
+class IncomeBands:
+    """
+    Log-scale buckets for amounts, used by the "banded" cache mode. Band 0
+    holds 0, band 1 everything below `floor`, and band k >= 2 the range
+    [floor * base**(k - 2), floor * base**(k - 1)), so every band above the
+    floor is `base` times wider than the previous one (1.25: about 25% apart).
+    """
+
+    base: float = 1.25
+    floor: float = 1000.0
+
+    def __post_init__(self):
+        if self.base <= 1 or self.floor <= 0:
+            raise ValueError("Income bands need base > 1 and floor > 0")
+
+    def index(self, amount: float) -> int:
+        if amount <= 0:
+            return 0
+        if amount < self.floor:
+            return 1
+        # The epsilon keeps exact band edges (1250 with base 1.25) in the upper band
+        return int(math.log(amount / self.floor, self.base) + 1e-9) + 2
+
+    def bounds(self, index: int) -> Tuple[float, float]:
+        if index <= 0:
+            return 0.0, 0.0
+        if index == 1:
+            return 0.0, self.floor
+        lower = self.floor * self.base ** (index - 2)
+        return lower, lower * self.base
+
+    def representative(self, index: int) -> float:
+        """
+        The geometric middle of the band (half the floor for band 1).
+        """
+        lower, upper = self.bounds(index)
+        if index == 1:
+            return upper / 2
+        return round(math.sqrt(lower * upper), 2)
+
+
+def canonicalize_tax_input_banded(
+    tax_data: TaxInfoInput, bands: IncomeBands
+) -> Dict[str, Any]:
+    """
+    Like `canonicalize_tax_input`, with the amounts replaced by their band.
+    """
+    return {
+        "country": tax_data.country.strip().upper(),
+        "income": bands.index(tax_data.income),
+        "expenses": bands.index(tax_data.expenses),
+        "deductions": bands.index(tax_data.deductions or 0),
+    }
+
+
+def band_input(tax_data: TaxInfoInput, bands: IncomeBands) -> TaxInfoInput:
+    """
+    The input standing in for every input in the same bands.
+    """
+    canonical = canonicalize_tax_input_banded(tax_data, bands)
+    return TaxInfoInput(
+        country=canonical["country"],
+        income=bands.representative(canonical["income"]),
+        expenses=bands.representative(canonical["expenses"]),
+        deductions=bands.representative(canonical["deductions"]),
+    )
+
+
+def make_cache_key(
+    tax_data: TaxInfoInput,
+    model: str,
+    prompt_version: str,
+    bands: Optional[IncomeBands] = None,
+) -> str:
+    """
+    Builds a stable cache key from the canonical input, the model name and the
+    prompt version, so a model switch or prompt change never serves stale advice.
+    With `bands`, the key covers the input's bands instead of its exact amounts
+    (and the band scheme itself, so changing it starts from an empty cache).
+    """
+    material: Dict[str, Any] = {"model": model, "prompt_version": prompt_version}
+    if bands is None:
+        material["input"] = canonicalize_tax_input(tax_data)
+    else:
+        material["input"] = canonicalize_tax_input_banded(tax_data, bands)
+        material["bands"] = [bands.base, bands.floor]
+    key_material = json.dumps(material, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry.
+    Once `max_entries` is reached the oldest entry is evicted; with the "lru"
+    policy a hit refreshes the entry's position, with "fifo" it does not.
+    """
+
+    def __init__(
+        self, max_entries: int, ttl_seconds: float, eviction_policy: str = "lru"
+    ):
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(
+                f"Unknown eviction policy '{eviction_policy}', expected one of {EVICTION_POLICIES}"
+            )
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.eviction_policy = eviction_policy
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        if self.eviction_policy == "lru":
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AdviceCache:
+    """
+    Two-tier cache for successful `AIServiceResponse`s: an in-process TTL/LRU
+    tier in front of an optional tier shared by the workers on the host, kept
+    in a `SharedState` (its own SQLite file at `shared_path`, or the given
+    `shared_state`). Error responses are never stored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        eviction_policy: str = "lru",
+        shared_path: Optional[str] = None,
+        shared_max_entries: int = 10000,
+        shared_state: Optional[SharedState] = None,
+    ):
+        self.local = TTLCache(max_entries, ttl_seconds, eviction_policy)
+        self.ttl_seconds = ttl_seconds
+        self.shared_max_entries = shared_max_entries
+        self.shared = shared_state
+        if shared_path:
+            try:
+                self.shared = SharedState(shared_path)
+            except sqlite3.Error as e:
+                app_logger.error(
+                    f"Could not open shared advice cache at '{shared_path}': {e}. "
+                    "Continuing with the in-process tier only."
+                )
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.stores = 0
+
+    async def get(self, key: str) -> Optional[AIServiceResponse]:
+        cached = self.local.get(key)
+        if cached is not None:
+            self.hits_local += 1
+            return cached
+
+        if self.shared is not None:
+            try:
+                raw = await asyncio.to_thread(self.shared.get, SHARED_NAMESPACE, key)
+            except sqlite3.Error as e:
+                app_logger.warning(f"Shared advice cache lookup failed: {e}")
+                raw = None
+            if raw is not None:
+                try:
+                    cached = AIServiceResponse.model_validate_json(raw)
+                except ValidationError as e:
+                    # Written by an older version, or corrupt: a miss
+                    app_logger.warning(
+                        f"Dropping unreadable shared advice cache entry: {e}"
+                    )
+                    await self._delete_shared(key)
+                else:
+                    self.local.set(key, cached)
+                    self.hits_shared += 1
+                    return cached
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: AIServiceResponse) -> None:
+        if not response.success or response.degraded:
+            return
+        cached = response.model_copy(update={"cached": True})
+        self.local.set(key, cached)
+        self.stores += 1
+        if self.shared is not None:
+            try:
+                await asyncio.to_thread(
+                    self.shared.set,
+                    SHARED_NAMESPACE,
+                    key,
+                    cached.model_dump_json(),
+                    self.ttl_seconds,
+                    self.shared_max_entries,
+                )
+            except sqlite3.Error as e:
+                app_logger.warning(f"Shared advice cache write failed: {e}")
+
+    async def _delete_shared(self, key: str) -> None:
+        try:
+            await asyncio.to_thread(self.shared.delete, SHARED_NAMESPACE, key)
+        except sqlite3.Error as e:
+            app_logger.warning(f"Shared advice cache delete failed: {e}")
+
+    def clear(self) -> None:
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear(SHARED_NAMESPACE)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_local + self.hits_shared + self.misses
+        return {
+            "hits_local": self.hits_local,
+            "hits_shared": self.hits_shared,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.local.evictions,
+            "size": len(self.local),
+            "hit_ratio": (
+                (self.hits_local + self.hits_shared) / lookups if lookups else 0.0
+            ),
+        }
@@ -1,98 +1,458 @@
-from openai import (
-    APIConnectionError,
-    APIStatusError,
-    AsyncOpenAI,
-    NotFoundError,
-    OpenAIError,
-    RateLimitError,
-)
+import asyncio
+from contextlib import AsyncExitStack
+import importlib.util
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
 
 from app.core.config import settings
 from app.core.logging_config import app_logger
+from app.core.metrics import (
+    OPENAI_CACHED_PROMPT_TOKENS,
+    OPENAI_COMPLETION_DURATION,
+    OPENAI_COMPLETION_TOKENS,
+    OPENAI_COMPLETIONS_IN_FLIGHT,
+    OPENAI_MAX_COMPLETION_TOKENS,
+    OPENAI_PROMPT_TOKENS,
+    record_advice_outcome,
+)
+from app.core.shared_state import shared_state
+from app.middleware.request_id_middleware import jti_var
 from app.models import AIServiceError, AIServiceResponse, TaxInfoInput
+from app.services.admission import AdmissionController, AdmissionRejectedError
+from app.services.advice_cache import AdviceCache, IncomeBands, make_cache_key
+from app.services.fallback_advice import fallback_advisor, fallback_applies
+from app.services.model_router import ModelRouter
+from app.services.prompt_builder import TaxPrompt, prompt_builder
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientCaller,
+    RetryPolicy,
+)
+from app.services.session_quota import session_quota
+from app.services.single_flight import SingleFlight
+from app.services.tax_engine import tax_engine
+from app.services.usage_ledger import usage_ledger
+
+# The `openai` package takes longer to import than the rest of the app, so it is
+# imported where it is first needed (creating the client, then classifying the
+# errors it raised) instead of at module import.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
+# Owned by the application lifespan (see `start_openai_client`), and created
+# lazily on first use where no lifespan runs (tests, scripts).
+client: Optional["AsyncOpenAI"] = None
 
-def build_tax_prompt(tax_data: TaxInfoInput) -> str:
-    return f"""
-    You are a helpful AI Tax Assistant providing general tax information.
-    This advice is for informational and educational purposes only and NOT a substitute for professional tax advice.
-    Do not ask follow-up questions, provide a concise summary based on the input.
 
-    User's Tax Information:
-    - Country for Tax Purposes: {tax_data.country}
-    - Annual Income: {tax_data.income:,.2f}
-    - Work-Related/Business Expenses: {tax_data.expenses:,.2f}
-    - Other Claimed Deductions: {tax_data.deductions:,.2f}
+def _http2_available() -> bool:
+    if not settings.OPENAI_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        app_logger.warning(
+            "OPENAI_HTTP2 is enabled but the 'h2' package is not installed "
+            "(pip install 'httpx[http2]'); falling back to HTTP/1.1."
+        )
+        return False
+    return True
+
 
-    Based on this information for {tax_data.country}, provide some general tax considerations, potential deductions they might explore further,
-    or common tax obligations they should be aware of. Keep the advice general and high-level.
-    Mention that tax laws vary greatly and change, so consulting a local tax professional is crucial.
+def build_openai_client() -> Optional["AsyncOpenAI"]:
+    """
+    Creates the OpenAI client on top of a tuned, pooled httpx transport.
+    Returns None (and logs) if the client cannot be created.
     """
+    try:
+        from openai import AsyncOpenAI
+
+        if not settings.OPENAI_API_KEY:
+            app_logger.critical(
+                "OPENAI_API_KEY not found in settings. AI service will not function."
+            )
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                settings.OPENAI_TIMEOUT_SECONDS,
+                connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS,
+            ),
+            http2=_http2_available(),
+        )
+        # Retries are handled by `upstreams` below, not by the SDK
+        return AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            http_client=http_client,
+            max_retries=0,
+        )
+    except Exception as e:
+        app_logger.critical(f"Failed to initialize OpenAI client: {e}", exc_info=True)
+        return None
+
+
+def get_openai_client() -> Optional["AsyncOpenAI"]:
+    global client
+    if client is None:
+        client = build_openai_client()
+    return client
 
 
-# Ensure OpenAI client is initialized safely
-try:
-    if not settings.OPENAI_API_KEY:
-        app_logger.critical(
-            "OPENAI_API_KEY not found in settings. AI service will not function."
+async def warm_up_openai_client(openai_client: "AsyncOpenAI", connections: int) -> int:
+    """
+    Pre-opens up to `connections` pooled connections (DNS, TCP and TLS setup)
+    with concurrent lightweight `GET /models` calls, so the first user requests
+    after a deploy do not pay for it. Returns how many calls succeeded.
+    """
+    if connections <= 0:
+        return 0
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                *(openai_client.models.list() for _ in range(connections)),
+                return_exceptions=True,
+            ),
+            timeout=settings.OPENAI_WARMUP_TIMEOUT_SECONDS,
         )
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-except Exception as e:
-    app_logger.critical(f"Failed to initialize OpenAI client: {e}", exc_info=True)
-    client = None  # Ensure client is None if initialization fails
+    except asyncio.TimeoutError:
+        app_logger.warning("OpenAI client warm-up timed out.")
+        return 0
+    opened = sum(1 for result in results if not isinstance(result, BaseException))
+    if opened < connections:
+        app_logger.warning(
+            f"OpenAI client warm-up: {connections - opened} of {connections} calls failed."
+        )
+    return opened
 
 
-async def get_tax_advice_from_ai(tax_data: TaxInfoInput) -> AIServiceResponse:
+async def start_openai_client() -> None:
     """
-    Sends user tax input to OpenAI (GPT model) and retrieves tax advice.
+    Creates and warms up the OpenAI client, and loads the tokenizer used to
+    count prompt tokens. Called from the application lifespan.
     """
-    prompt = build_tax_prompt(tax_data)
+    await asyncio.to_thread(prompt_builder.tokens.load)
+    openai_client = get_openai_client()
+    if openai_client is None:
+        return
+    opened = await warm_up_openai_client(
+        openai_client, settings.OPENAI_WARMUP_CONNECTIONS
+    )
+    app_logger.info(
+        f"OpenAI client ready (base URL: {openai_client.base_url}, "
+        f"{opened} warm connections)."
+    )
+
+
+async def close_openai_client() -> None:
+    """
+    Closes the OpenAI client and its connection pool. Called on shutdown.
+    """
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+
+advice_cache = AdviceCache(
+    max_entries=settings.AI_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AI_CACHE_TTL_SECONDS,
+    eviction_policy=settings.AI_CACHE_EVICTION_POLICY,
+    shared_path=settings.AI_CACHE_SQLITE_PATH,
+    shared_max_entries=settings.AI_CACHE_SQLITE_MAX_ENTRIES,
+    shared_state=shared_state,
+)
+inflight_requests = SingleFlight()
+
+
+def _is_retryable(e: BaseException) -> bool:
+    import openai
+
+    return isinstance(
+        e,
+        (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError),
+    )
+
+
+def _is_upstream_failure(e: BaseException) -> bool:
+    import openai
+
+    # Network errors (incl. timeouts) and 5xx mean the upstream is unhealthy;
+    # 4xx (incl. 429) mean it is up and answering.
+    return isinstance(e, (openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_after_seconds(e: BaseException) -> Optional[float]:
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) / scale
+        except ValueError:  # HTTP-date form, fall back to our own backoff
+            return None
+    return None
+
+
+def _build_upstream() -> ResilientCaller:
+    return ResilientCaller(
+        retry_policy=RetryPolicy(
+            max_attempts=settings.OPENAI_RETRY_MAX_ATTEMPTS,
+            base_delay_seconds=settings.OPENAI_RETRY_BASE_DELAY_SECONDS,
+            max_delay_seconds=settings.OPENAI_RETRY_MAX_DELAY_SECONDS,
+        ),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=settings.OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_seconds=settings.OPENAI_CIRCUIT_RECOVERY_SECONDS,
+        ),
+        is_retryable=_is_retryable,
+        is_upstream_failure=_is_upstream_failure,
+        retry_after=_retry_after_seconds,
+        is_rejected_locally=lambda e: isinstance(e, AdmissionRejectedError),
+        hedge_enabled=settings.OPENAI_HEDGE_ENABLED,
+        hedge_percentile=settings.OPENAI_HEDGE_PERCENTILE,
+        hedge_min_delay_seconds=settings.OPENAI_HEDGE_MIN_DELAY_SECONDS,
+    )
+
+
+model_router = ModelRouter(
+    settings.openai_model_candidates,
+    latency_slo_seconds=settings.OPENAI_LATENCY_SLO_SECONDS,
+    error_rate_threshold=settings.OPENAI_MODEL_ERROR_RATE_THRESHOLD,
+    cooldown_seconds=settings.OPENAI_MODEL_COOLDOWN_SECONDS,
+)
+# One retry policy/circuit breaker per model, so an outage of one model does
+# not block the fallbacks
+upstreams = {model: _build_upstream() for model in model_router.models}
+admission_controller = AdmissionController(
+    max_concurrency=settings.openai_max_concurrency_per_worker,
+    max_concurrency_per_session=settings.OPENAI_MAX_CONCURRENT_REQUESTS_PER_SESSION,
+    requests_per_minute=settings.OPENAI_RPM_LIMIT,
+    tokens_per_minute=settings.OPENAI_TPM_LIMIT,
+    max_wait_seconds=settings.OPENAI_ADMISSION_MAX_WAIT_SECONDS,
+    shared_state=shared_state,
+)
+
+
+async def get_tax_advice_from_ai(
+    tax_data: TaxInfoInput, session_id: Optional[str] = None
+) -> AIServiceResponse:
+    """
+    Returns tax advice for the given input, served from the advice cache when an
+    equivalent request was answered recently, otherwise fetched from OpenAI.
+    Concurrent requests for the same canonical input share a single upstream call.
+    Only successful responses are cached.
+
+    Upstream calls go through the admission controller; `session_id` (the JWT
+    `jti`) is used for per-session fairness. Raises `AdmissionRejectedError`
+    when no capacity frees up within `OPENAI_ADMISSION_MAX_WAIT_SECONDS`.
+
+    Failures listed in `AI_FALLBACK_ON_ERRORS` (including admission
+    rejections, as API_LIMIT_EXCEEDED) are answered with degraded, templated
+    advice instead; see `fallback_advice`.
+
+    Every request is recorded in the usage ledger: the one that made the
+    OpenAI call with its token usage, cache hits and coalesced requests as
+    cache hits without tokens.
+    """
+    bands = cache_bands()
+    request_key = make_cache_key(
+        tax_data, settings.OPENAI_MODEL_NAME, prompt_builder.version, bands
+    )
+    if settings.AI_CACHE_ENABLED:
+        cached = await advice_cache.get(request_key)
+        if cached is not None:
+            app_logger.info(
+                f"Serving cached AI advice. Country: {tax_data.country}, Income: {tax_data.income}"
+            )
+            usage_ledger.record(cached.model, session_id, cache_hit=True)
+            return _personalize(tax_data, cached, bands)
+
+    fetched = False
+
+    def fetch():
+        nonlocal fetched
+        fetched = True  # Recorded by _request_tax_advice
+        return _fetch_and_cache_advice(tax_data, request_key, session_id, bands)
 
-    if not client:
-        app_logger.error("OpenAI client not initialized. Cannot fetch AI advice.")
-        return AIServiceResponse(
-            success=False,
-            content=r"AI service is not available due to a configuration error. Please contact support.",
-            error_type=AIServiceError.CONFIG_ERROR,
-        )
     try:
-        app_logger.info(
-            f"Sending request to OpenAI for tax advice. Country: {tax_data.country}, Income: {tax_data.income}"
+        if not settings.AI_COALESCE_REQUESTS:
+            response = await fetch()
+        else:
+            response = await inflight_requests.do(request_key, fetch)
+    except AdmissionRejectedError:
+        if not fetched:
+            usage_ledger.record(
+                None, session_id, error_type=AIServiceError.API_LIMIT_EXCEEDED
+            )
+        if not fallback_applies(AIServiceError.API_LIMIT_EXCEEDED):
+            raise
+        return fallback_advisor.respond(tax_data, AIServiceError.API_LIMIT_EXCEEDED)
+    if not fetched:  # Shared the call of a concurrent identical request
+        usage_ledger.record(
+            response.model,
+            session_id,
+            cache_hit=response.success,
+            error_type=response.error_type,
         )
-        completion = await client.chat.completions.create(
-            model=settings.OPENAI_MODEL_NAME,
-            messages=[
-                {
-                    "role": "developer",
-                    "content": "You are an AI assistant providing general tax information.",
-                },
-                {"role": "user", "content": prompt, "name": "customer"},
-            ],
-            max_completion_tokens=350,
-            temperature=0.6,
-            n=1,
-            stop=None,
+    return with_fallback(tax_data, _personalize(tax_data, response, bands))
+
+
+def cache_bands() -> Optional[IncomeBands]:
+    """
+    The band scheme of the "banded" cache mode, None in "exact" mode.
+    """
+    if settings.AI_CACHE_MODE != "banded":
+        return None
+    return IncomeBands(settings.AI_CACHE_BAND_BASE, settings.AI_CACHE_BAND_FLOOR)
+
+
+def personalized_header(tax_data: TaxInfoInput, bands: IncomeBands) -> str:
+    """
+    The user's exact figures, put in front of advice shared by the whole band.
+    """
+    estimate = tax_engine.estimate(tax_data)
+    currency = f" {estimate.currency}" if estimate is not None else ""
+    header = (
+        f"Your figures for {tax_data.country.strip()}: income {tax_data.income:,.2f}{currency}, "
+        f"expenses {tax_data.expenses:,.2f}{currency}, "
+        f"deductions {tax_data.deductions or 0:,.2f}{currency}"
+    )
+    if estimate is not None:
+        header += (
+            f", estimated tax {estimate.estimated_tax:,.2f}{currency} "
+            f"({estimate.effective_rate:.1%} effective)"
         )
-        advice = completion.choices[0].message.content.strip()
-        app_logger.info(
-            f"Successfully received advice from OpenAI with id={completion.id} ({completion.usage.completion_tokens} tokens)"
+    lower, upper = bands.bounds(bands.index(tax_data.income))
+    return (
+        f"{header}. The advice below applies to annual incomes between "
+        f"{lower:,.0f} and {upper:,.0f}."
+    )
+
+
+def _personalize(
+    tax_data: TaxInfoInput,
+    response: AIServiceResponse,
+    bands: Optional[IncomeBands],
+) -> AIServiceResponse:
+    if bands is None or not response.success or response.degraded:
+        return response
+    return response.model_copy(
+        update={
+            "content": f"{personalized_header(tax_data, bands)}\n\n{response.content}"
+        }
+    )
+
+
+def with_fallback(
+    tax_data: TaxInfoInput, response: AIServiceResponse
+) -> AIServiceResponse:
+    """
+    Swaps a failed response for fallback advice when the policy allows it.
+    """
+    if response.success or not fallback_applies(response.error_type):
+        return response
+    return fallback_advisor.respond(tax_data, response.error_type)
+
+
+def _admission_max_wait_seconds() -> Optional[float]:
+    """
+    With the fallback enabled for rate limiting, waiting in the admission queue
+    longer than AI_FALLBACK_MAX_QUEUE_WAIT_MS is not worth it.
+    """
+    if settings.AI_FALLBACK_MAX_QUEUE_WAIT_MS > 0 and fallback_applies(
+        AIServiceError.API_LIMIT_EXCEEDED
+    ):
+        return settings.AI_FALLBACK_MAX_QUEUE_WAIT_MS / 1000
+    return None
+
+
+async def _fetch_and_cache_advice(
+    tax_data: TaxInfoInput,
+    request_key: str,
+    session_id: Optional[str],
+    bands: Optional[IncomeBands] = None,
+) -> AIServiceResponse:
+    response = await _request_tax_advice(tax_data, session_id, bands)
+    if settings.AI_CACHE_ENABLED:
+        await advice_cache.set(request_key, response)
+    return response
+
+
+def _completion_params(prompt: TaxPrompt, model: str) -> Dict[str, Any]:
+    """
+    Parameters shared by the regular and the streaming completion calls.
+    """
+    return dict(
+        model=model,
+        messages=prompt.messages,
+        max_completion_tokens=prompt.max_completion_tokens,
+        temperature=0.6,
+        n=1,
+        stop=None,
+    )
+
+
+def _client_unavailable_response() -> AIServiceResponse:
+    app_logger.error(
+        "OpenAI client not initialized. Cannot fetch AI advice.",
+        extra={"error_type": AIServiceError.CONFIG_ERROR},
+    )
+    return AIServiceResponse(
+        success=False,
+        content=r"AI service is not available due to a configuration error. Please contact support.",
+        error_type=AIServiceError.CONFIG_ERROR,
+    )
+
+
+def _error_response_from_exception(e: Exception) -> AIServiceResponse:
+    """
+    Logs an exception raised while talking to OpenAI and maps it to the
+    user-facing `AIServiceResponse` for the matching `AIServiceError`.
+    """
+    import openai
+
+    if isinstance(e, CircuitOpenError):
+        app_logger.warning(
+            "OpenAI circuit breaker is open, skipping the upstream call.",
+            extra={"error_type": AIServiceError.API_CONN_ERROR},
+        )
+        err_msg = (
+            "AI service is temporarily unavailable. Please try again in a little while."
+        )
+        return AIServiceResponse(
+            success=False, content=err_msg, error_type=AIServiceError.API_CONN_ERROR
+        )
+    if isinstance(e, openai.APIConnectionError):
+        app_logger.error(
+            f"OpenAI API Connection Error: {e}",
+            exc_info=True,
+            extra={"error_type": AIServiceError.API_CONN_ERROR},
         )
-        return AIServiceResponse(success=True, content=advice)
-    except APIConnectionError as e:
-        app_logger.error(f"OpenAI API Connection Error: {e}", exc_info=True)
         err_msg = "Could not retrieve AI-powered advice at this moment due to a network issue reaching OpenAI."
         return AIServiceResponse(
             success=False, content=err_msg, error_type=AIServiceError.API_CONN_ERROR
         )
-    except RateLimitError as e:
-        app_logger.error(f"OpenAI API Rate Limit Exceeded: {e}", exc_info=True)
+    if isinstance(e, openai.RateLimitError):  # Expected under load, no traceback needed
+        app_logger.warning(
+            f"OpenAI API Rate Limit Exceeded: {e}",
+            extra={"error_type": AIServiceError.API_LIMIT_EXCEEDED},
+        )
         err_msg = "AI service is temporarily unavailable due to high demand (rate limit). Please try again later."
         return AIServiceResponse(
             success=False, content=err_msg, error_type=AIServiceError.API_LIMIT_EXCEEDED
         )
-    except NotFoundError as e:
+    if isinstance(e, openai.NotFoundError):
+        message = e.body.get("message") if isinstance(e.body, dict) else e.message
         app_logger.error(
-            f"OpenAI API error while getting tax advice '{e.code}'. Message: {e.body['message']} (RequestID: {e.request_id})"
+            f"OpenAI API error while getting tax advice '{e.code}'. Message: {message} (RequestID: {e.request_id})",
+            extra={"error_type": AIServiceError.INVALID_MODEL},
         )
         err_msg = (
             "Could not retrieve AI-powered advice at this moment due to internal issue"
@@ -100,10 +460,11 @@ async def get_tax_advice_from_ai(tax_data: TaxInfoInput) -> AIServiceResponse:
         return AIServiceResponse(
             success=False, content=err_msg, error_type=AIServiceError.INVALID_MODEL
         )
-    except APIStatusError as e:  # Catch other API errors
+    if isinstance(e, openai.APIStatusError):  # Catch other API errors
         app_logger.error(
             f"OpenAI API Status Error (status {e.status_code}): {e.response}",
             exc_info=True,
+            extra={"error_type": AIServiceError.API_ERROR},
         )
         err_msg = (
             r"Could not retrieve AI-powered advice at this moment due to an API error"
@@ -111,21 +472,397 @@ async def get_tax_advice_from_ai(tax_data: TaxInfoInput) -> AIServiceResponse:
         return AIServiceResponse(
             success=False, content=err_msg, error_type=AIServiceError.API_ERROR
         )
-    except OpenAIError as e:
+    if isinstance(e, openai.OpenAIError):
         app_logger.error(
-            f"OpenAI API Error (status {e.status_code}): {e.response}", exc_info=True
+            f"OpenAI API Error: {e}",
+            exc_info=True,
+            extra={"error_type": AIServiceError.OAI_ERROR},
         )
         err_msg = r"Could not retrieve AI-powered advice at this moment due to an OpenAI error"
         return AIServiceResponse(
             success=False, content=err_msg, error_type=AIServiceError.OAI_ERROR
         )
+    app_logger.error(
+        f"Unexpected error when calling OpenAI API: {e}",
+        exc_info=True,
+        extra={"error_type": AIServiceError.INTERNAL_ERR},
+    )
+    err_msg = "An unexpected error occurred while trying to get AI-powered tax advice."
+    return AIServiceResponse(
+        success=False, content=err_msg, error_type=AIServiceError.INTERNAL_ERR
+    )
+
+
+def _should_fall_back(e: BaseException) -> bool:
+    import openai
+
+    # Missing model, rate limited, upstream down or erroring: another model may work
+    return isinstance(
+        e,
+        (
+            openai.NotFoundError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+            openai.APIConnectionError,
+            CircuitOpenError,
+        ),
+    )
+
+
+class _AdmittedStream:
+    """
+    A completion stream that holds its admission slot until it is closed.
+    """
+
+    def __init__(self, stream: Any, slot: AsyncExitStack):
+        self.stream = stream
+        self._slot = slot
+
+    def __aiter__(self):
+        return self.stream.__aiter__()
+
+    async def close(self) -> None:
+        try:
+            await self.stream.close()
+        finally:
+            await self._slot.aclose()
+
+
+async def _create_completion(
+    openai_client: "AsyncOpenAI",
+    prompt: TaxPrompt,
+    session_id: Optional[str] = None,
+    stream: bool = False,
+) -> Tuple[Any, str, float]:
+    """
+    Sends the completion request to the candidate models in routing order,
+    falling back to the next one on 404/429/5xx/connection errors.
+
+    Every upstream attempt (retry, hedge or fallback model) is admitted on its
+    own, so it takes a request from the rate budget, and a concurrency slot
+    is held only while a request is out, not during retry backoff. A stream
+    keeps its slot until it is closed. Raises `AdmissionRejectedError` when
+    an attempt is not admitted in time.
+
+    Returns the completion (or the stream), the model that produced it, and
+    the seconds spent waiting for admission.
+    """
+    max_wait_seconds = _admission_max_wait_seconds()
+    waited = 0.0
+    last_error: Optional[Exception] = None
+    for model in model_router.candidates():
+        params = _completion_params(prompt, model)
+        if stream:
+            params.update(stream=True, stream_options={"include_usage": True})
+
+        async def attempt(params: Dict[str, Any] = params) -> Any:
+            nonlocal waited
+            slot = AsyncExitStack()
+            waited += await slot.enter_async_context(
+                admission_controller.admit(
+                    session_id, prompt.total_tokens, max_wait_seconds
+                )
+            )
+            OPENAI_COMPLETIONS_IN_FLIGHT.inc()
+            slot.callback(OPENAI_COMPLETIONS_IN_FLIGHT.dec)
+            try:
+                result = await openai_client.chat.completions.create(**params)
+            except BaseException:
+                await slot.aclose()
+                raise
+            if stream:
+                return _AdmittedStream(result, slot)
+            await slot.aclose()
+            return result
+
+        started_at = time.perf_counter()
+        try:
+            result = await upstreams[model].call(attempt, hedge=not stream)
+        except Exception as e:
+            if not _should_fall_back(e):
+                raise
+            import openai
+
+            model_router.record_failure(model, hard=isinstance(e, openai.NotFoundError))
+            app_logger.warning(
+                f"Model '{model}' failed ({type(e).__name__}), trying the next candidate."
+            )
+            last_error = e
+            continue
+        if not stream:  # A stream's time-to-headers is not comparable
+            model_router.record_success(model, time.perf_counter() - started_at)
+        return result, model, waited
+    raise last_error
+
+
+async def _request_tax_advice(
+    tax_data: TaxInfoInput,
+    session_id: Optional[str] = None,
+    bands: Optional[IncomeBands] = None,
+) -> AIServiceResponse:
+    """
+    Sends user tax input to OpenAI (GPT model) and retrieves tax advice.
+    """
+    prompt = prompt_builder.build(tax_data, bands)
+
+    openai_client = get_openai_client()
+    if not openai_client:
+        failure = _client_unavailable_response()
+        record_advice_outcome(failure.error_type)
+        usage_ledger.record(None, session_id, error_type=failure.error_type)
+        return failure
+    try:
+        app_logger.info(
+            f"Sending request to OpenAI for tax advice. Country: {tax_data.country}, Income: {tax_data.income}"
+        )
+        started_at = time.perf_counter()
+        completion, model, waited = await _create_completion(
+            openai_client, prompt, session_id
+        )
+        latency = time.perf_counter() - started_at - waited
+        usage = _usage_counts(completion.usage)
+        _observe_completion(latency, usage, prompt)
+        advice = completion.choices[0].message.content.strip()
+        app_logger.info(
+            f"Successfully received advice from OpenAI model {model} with id={completion.id} "
+            f"({_format_usage(usage, prompt)})",
+            extra={
+                "log_key": "openai_completion",
+                "latency_ms": round(latency * 1000, 2),
+                **usage,
+                "max_completion_tokens": prompt.max_completion_tokens,
+            },
+        )
+        record_advice_outcome(None)
+        usage_ledger.record(model, session_id, **usage, latency_seconds=latency)
+        return AIServiceResponse(success=True, content=advice, model=model)
+    except AdmissionRejectedError:
+        record_advice_outcome(AIServiceError.API_LIMIT_EXCEEDED)
+        usage_ledger.record(
+            None, session_id, error_type=AIServiceError.API_LIMIT_EXCEEDED
+        )
+        raise
     except Exception as e:
-        app_logger.error(
-            f"Unexpected error when calling OpenAI API: {e}", exc_info=True
+        failure = _error_response_from_exception(e)
+        record_advice_outcome(failure.error_type)
+        usage_ledger.record(None, session_id, error_type=failure.error_type)
+        return failure
+
+
+def _usage_counts(usage: Any) -> Dict[str, int]:
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_prompt_tokens": getattr(details, "cached_tokens", None) or 0,
+        "completion_tokens": usage.completion_tokens,
+    }
+
+
+def _format_usage(usage: Dict[str, int], prompt: TaxPrompt) -> str:
+    return (
+        f"{usage['prompt_tokens']} prompt tokens ({usage['cached_prompt_tokens']} cached, "
+        f"{prompt.prompt_tokens} counted locally), {usage['completion_tokens']} of "
+        f"{prompt.max_completion_tokens} completion tokens"
+    )
+
+
+def _observe_completion(
+    latency_seconds: float, usage: Dict[str, int], prompt: TaxPrompt
+) -> None:
+    OPENAI_COMPLETION_DURATION.observe(latency_seconds)
+    OPENAI_PROMPT_TOKENS.observe(usage["prompt_tokens"])
+    OPENAI_CACHED_PROMPT_TOKENS.inc(usage["cached_prompt_tokens"])
+    OPENAI_COMPLETION_TOKENS.observe(usage["completion_tokens"])
+    OPENAI_MAX_COMPLETION_TOKENS.observe(prompt.max_completion_tokens)
+    prompt_builder.pace.observe(latency_seconds, usage["completion_tokens"])
+    # Charged to the session that triggered the call (set by auth, inherited by tasks)
+    session_quota.record_tokens(
+        jti_var.get(), usage["prompt_tokens"] + usage["completion_tokens"]
+    )
+
+
+async def stream_tax_advice_from_ai(
+    tax_data: TaxInfoInput, session_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams tax advice from OpenAI as it is generated.
+    Yields `{"event": ..., "data": ...}` items: one "delta" per content chunk,
+    followed by either a final "done" event (completion id and token usage) or
+    an "error" event carrying the matching `AIServiceError` (admission
+    rejections add a `retry_after` hint in seconds). Errors covered by the
+    fallback policy are answered with the fallback advice as a single delta
+    and a "done" event with `degraded: true` instead, unless some content was
+    already streamed.
+    A cached answer is replayed as a single delta; a completed stream is cached.
+    In the "banded" cache mode the personalized header comes first, as its own
+    delta sent with the first upstream delta, and is not part of the cached
+    advice.
+    """
+    bands = cache_bands()
+    request_key = make_cache_key(
+        tax_data, settings.OPENAI_MODEL_NAME, prompt_builder.version, bands
+    )
+    if settings.AI_CACHE_ENABLED:
+        cached = await advice_cache.get(request_key)
+        if cached is not None:
+            usage_ledger.record(cached.model, session_id, cache_hit=True)
+            cached = _personalize(tax_data, cached, bands)
+            yield {"event": "delta", "data": {"content": cached.content}}
+            yield {
+                "event": "done",
+                "data": {
+                    "id": None,
+                    "model": cached.model,
+                    "usage": None,
+                    "cached": True,
+                },
+            }
+            return
+
+    openai_client = get_openai_client()
+    if not openai_client:
+        failure = _client_unavailable_response()
+        record_advice_outcome(failure.error_type)
+        usage_ledger.record(None, session_id, error_type=failure.error_type)
+        for event in _stream_failure_events(tax_data, failure):
+            yield event
+        return
+
+    prompt = prompt_builder.build(tax_data, bands)
+    # Held back until the first upstream delta, so a failed call is answered
+    # with the fallback advice alone
+    header = (
+        {
+            "event": "delta",
+            "data": {"content": personalized_header(tax_data, bands) + "\n\n"},
+        }
+        if bands is not None
+        else None
+    )
+    parts: List[str] = []
+    completion_id = None
+    usage = None
+    model = None
+    try:
+        app_logger.info(
+            f"Streaming request to OpenAI for tax advice. Country: {tax_data.country}, Income: {tax_data.income}"
         )
-        err_msg = (
-            "An unexpected error occurred while trying to get AI-powered tax advice."
+        started_at = time.perf_counter()
+        stream, model, waited = await _create_completion(
+            openai_client, prompt, session_id, stream=True
         )
-        return AIServiceResponse(
-            success=False, content=err_msg, error_type=AIServiceError.INTERNAL_ERR
+        try:
+            async for chunk in stream:
+                completion_id = chunk.id
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if header is not None:
+                        yield header
+                        header = None
+                    parts.append(chunk.choices[0].delta.content)
+                    yield {
+                        "event": "delta",
+                        "data": {"content": chunk.choices[0].delta.content},
+                    }
+        finally:
+            await stream.close()
+    except AdmissionRejectedError as e:
+        failure = e.to_response()
+        record_advice_outcome(failure.error_type)
+        usage_ledger.record(None, session_id, error_type=failure.error_type)
+        for event in _stream_failure_events(
+            tax_data, failure, retry_after=e.retry_after
+        ):
+            yield event
+        return
+    except Exception as e:
+        failure = _error_response_from_exception(e)
+        record_advice_outcome(failure.error_type)
+        usage_ledger.record(model, session_id, error_type=failure.error_type)
+        for event in _stream_failure_events(tax_data, failure, streamed=bool(parts)):
+            yield event
+        return
+
+    latency = time.perf_counter() - started_at - waited
+    counts = _usage_counts(usage) if usage is not None else {}
+    if counts:
+        _observe_completion(latency, counts, prompt)
+    record_advice_outcome(None)
+    usage_ledger.record(model, session_id, **counts, latency_seconds=latency)
+    app_logger.info(
+        f"Finished streaming advice from OpenAI model {model} with id={completion_id} "
+        f"({_format_usage(counts, prompt) if counts else 'usage unknown'})",
+        extra={
+            "log_key": "openai_completion",
+            "latency_ms": round(latency * 1000, 2),
+            **counts,
+            "max_completion_tokens": prompt.max_completion_tokens,
+        },
+    )
+    if settings.AI_CACHE_ENABLED:
+        await advice_cache.set(
+            request_key,
+            AIServiceResponse(
+                success=True, content="".join(parts).strip(), model=model
+            ),
         )
+    if header is not None:  # A completion without content
+        yield header
+    yield {
+        "event": "done",
+        "data": {
+            "id": completion_id,
+            "model": model,
+            "usage": (
+                {**counts, "total_tokens": usage.total_tokens} if counts else None
+            ),
+            "cached": False,
+        },
+    }
+
+
+def _stream_failure_events(
+    tax_data: TaxInfoInput,
+    failure: AIServiceResponse,
+    retry_after: Optional[int] = None,
+    streamed: bool = False,
+) -> List[Dict[str, Any]]:
+    if not streamed and fallback_applies(failure.error_type):
+        fallback = fallback_advisor.respond(tax_data, failure.error_type)
+        return [
+            {"event": "delta", "data": {"content": fallback.content}},
+            {
+                "event": "done",
+                "data": {
+                    "id": None,
+                    "model": None,
+                    "usage": None,
+                    "cached": False,
+                    "degraded": True,
+                    "error_type": failure.error_type,
+                },
+            },
+        ]
+    data = {"error_type": failure.error_type, "content": failure.content}
+    if retry_after is not None:
+        data["retry_after"] = retry_after
+    return [{"event": "error", "data": data}]
+
+
+def get_ai_service_stats() -> Dict[str, Any]:
+    """
+    Runtime counters of the AI service layers, for monitoring.
+    """
+    return {
+        "cache": {**advice_cache.stats(), "mode": settings.AI_CACHE_MODE},
+        "coalescing": {
+            "upstream_calls": inflight_requests.calls,
+            "coalesced_calls": inflight_requests.coalesced,
+            "in_flight": inflight_requests.in_flight(),
+        },
+        "admission": admission_controller.stats(),
+        "upstream": {model: caller.stats() for model, caller in upstreams.items()},
+        "prompt": prompt_builder.stats(),
+        "ledger": usage_ledger.stats(),
+    }
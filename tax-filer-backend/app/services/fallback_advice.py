@@ -0,0 +1,114 @@
+# tax-filer-backend/app/services/fallback_advice.py
+import json
+from pathlib import Path
+import string
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.logging_config import app_logger
+from app.models import AIServiceError, AIServiceResponse, TaxInfoInput
+from app.services.tax_engine import tax_engine
+
+DEFAULT_TEMPLATES_FILE = (
+    Path(__file__).resolve().parent.parent / "data" / "advice_templates.json"
+)
+DEFAULT_TEMPLATE_KEY = "DEFAULT"
+# Placeholders a template may use; the per-country ones need a tax estimate
+INPUT_FIELDS = {"country", "income", "expenses", "deductions", "taxable_income"}
+ESTIMATE_FIELDS = {"tax_year", "estimated_tax", "effective_rate", "marginal_rate"}
+
+
+def template_fields(template: str) -> set:
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+
+class FallbackAdvisor:
+    """
+    Serves general, templated advice when the AI path is unavailable or
+    overloaded. Templates are written offline per country (see
+    `scripts/generate_advice_templates.py`), loaded once, and filled in with
+    the user's numbers and the local tax estimate, so a response costs a dict
+    lookup and a `str.format`. Countries without a template or a tax estimate
+    get the "DEFAULT" template.
+    """
+
+    def __init__(self, templates: Dict[str, str]):
+        if DEFAULT_TEMPLATE_KEY not in templates:
+            raise ValueError(f"Advice templates need a '{DEFAULT_TEMPLATE_KEY}' entry")
+        for key, template in templates.items():
+            allowed = INPUT_FIELDS | (
+                ESTIMATE_FIELDS if key != DEFAULT_TEMPLATE_KEY else set()
+            )
+            unknown = template_fields(template) - allowed
+            if unknown:
+                raise ValueError(
+                    f"Template {key} uses unknown fields {sorted(unknown)}"
+                )
+        self.templates = templates
+        self.served: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: Path) -> "FallbackAdvisor":
+        with open(path, encoding="utf-8") as f:
+            templates = json.load(f)
+        app_logger.info(
+            f"Loaded {len(templates)} fallback advice templates from {path}"
+        )
+        return cls(templates)
+
+    def render(self, tax_data: TaxInfoInput) -> str:
+        estimate = tax_engine.estimate(tax_data)
+        template = (
+            self.templates.get(estimate.country_code) if estimate is not None else None
+        )
+        currency = f" {estimate.currency}" if estimate is not None else ""
+        deductions = tax_data.deductions or 0.0
+        values = {
+            "country": tax_data.country.strip(),
+            "income": f"{tax_data.income:,.2f}{currency}",
+            "expenses": f"{tax_data.expenses:,.2f}{currency}",
+            "deductions": f"{deductions:,.2f}{currency}",
+            "taxable_income": f"{max(tax_data.income - tax_data.expenses - deductions, 0.0):,.2f}{currency}",
+        }
+        if template is None:
+            return self.templates[DEFAULT_TEMPLATE_KEY].format_map(values)
+        values.update(
+            tax_year=estimate.tax_year,
+            estimated_tax=f"{estimate.estimated_tax:,.2f}{currency}",
+            effective_rate=f"{estimate.effective_rate:.1%}",
+            marginal_rate=f"{estimate.marginal_rate:.0%}",
+        )
+        return template.format_map(values)
+
+    def respond(
+        self, tax_data: TaxInfoInput, reason: Optional[AIServiceError]
+    ) -> AIServiceResponse:
+        """
+        A degraded but successful response; `error_type` keeps the reason.
+        """
+        self.served[str(reason)] = self.served.get(str(reason), 0) + 1
+        app_logger.warning(
+            f"Serving fallback advice for country {tax_data.country} ({reason})",
+            extra={"error_type": reason},
+        )
+        return AIServiceResponse(
+            success=True,
+            content=self.render(tax_data),
+            error_type=reason,
+            degraded=True,
+        )
+
+
+def fallback_applies(error_type: Optional[AIServiceError]) -> bool:
+    return (
+        settings.AI_FALLBACK_ENABLED
+        and error_type is not None
+        and str(error_type) in settings.ai_fallback_errors
+    )
+
+
+fallback_advisor = FallbackAdvisor.from_file(
+    Path(settings.AI_FALLBACK_TEMPLATES_PATH)
+    if settings.AI_FALLBACK_TEMPLATES_PATH
+    else DEFAULT_TEMPLATES_FILE
+)
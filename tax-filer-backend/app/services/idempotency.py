@@ -0,0 +1,222 @@
+# tax-filer-backend/app/services/idempotency.py
+import asyncio
+import hashlib
+import json
+import sqlite3
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.logging_config import app_logger
+from app.core.shared_state import SharedState, shared_state
+from app.services.advice_cache import TTLCache
+from app.services.single_flight import SingleFlight
+
+T = TypeVar("T")
+
+RESPONSES_NAMESPACE = "idempotency"
+PENDING_NAMESPACE = "idempotency_pending"
+# How long a key stays claimed by a worker that died before finishing it
+PENDING_TTL_SECONDS = 300
+
+
+class IdempotencyKeyReusedError(Exception):
+    """
+    Raised when an `Idempotency-Key` is sent again with a different request body.
+    """
+
+
+class IdempotencyKeyInProgressError(Exception):
+    """
+    Raised when the request that first used an `Idempotency-Key` is still
+    running in another worker process.
+    """
+
+
+def request_fingerprint(body: BaseModel) -> str:
+    return hashlib.sha256(body.model_dump_json().encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Remembers responses by session and `Idempotency-Key` for `ttl_seconds`, so
+    a retried request gets the original response instead of triggering another
+    completion. A retry that arrives while the first request is still running
+    attaches to it. A key is bound to the body it was first used with.
+    Keys are scoped per session, so one session can never replay another's
+    response.
+
+    State is per worker process, unless a `shared_state` is given and `run` is
+    passed an `encode`/`decode` pair for the results: then a key is claimed
+    across workers before the work starts and successful results are shared,
+    so a retry landing on another worker replays them too. A retry arriving on
+    another worker while the first request is still running raises
+    `IdempotencyKeyInProgressError` instead of waiting for it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        shared_state: Optional[SharedState] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared_state = shared_state
+        self._responses = TTLCache(max_entries, ttl_seconds)
+        self._inflight = SingleFlight()
+        self._inflight_fingerprints: Dict[str, str] = {}
+        self.replayed = 0
+
+    @staticmethod
+    def _store_key(scope: str, key: str) -> str:
+        return f"{scope}:{key}"
+
+    async def seen(self, scope: str, key: str, fingerprint: str) -> bool:
+        """
+        Whether a request with this key and body is running or was answered,
+        i.e. a retry that will not trigger another completion.
+        """
+        store_key = self._store_key(scope, key)
+        stored = self._responses.get(store_key)
+        if (
+            self._inflight_fingerprints.get(store_key) == fingerprint
+            or stored is not None
+            and stored[0] == fingerprint
+        ):
+            return True
+        if self.shared_state is None:
+            return False
+        try:
+            return await asyncio.to_thread(self._seen_shared, store_key, fingerprint)
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not look up shared idempotency key: {e}")
+            return False
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        func: Callable[[], Awaitable[T]],
+        should_store: Callable[[T], bool],
+        encode: Optional[Callable[[T], str]] = None,
+        decode: Optional[Callable[[str], T]] = None,
+    ) -> Tuple[T, bool]:
+        """
+        Returns `(result, replayed)`: the stored or in-flight result for the key,
+        or the result of `func()`, kept when `should_store(result)` holds.
+        """
+        store_key = self._store_key(scope, key)
+        stored = self._responses.get(store_key)
+        if stored is not None:
+            stored_fingerprint, result = stored
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyKeyReusedError(key)
+            self.replayed += 1
+            return result, True
+
+        inflight_fingerprint = self._inflight_fingerprints.get(store_key)
+        if inflight_fingerprint is not None and inflight_fingerprint != fingerprint:
+            raise IdempotencyKeyReusedError(key)
+        attached = inflight_fingerprint is not None
+        shared = (
+            self.shared_state is not None and encode is not None and decode is not None
+        )
+
+        async def compute() -> Tuple[T, bool]:
+            claimed = False
+            try:
+                if shared:
+                    stored_json, claimed = await self._claim_shared(
+                        store_key, fingerprint
+                    )
+                    if stored_json is not None:
+                        result = decode(stored_json)
+                        self._responses.set(store_key, (fingerprint, result))
+                        return result, True
+                result = await func()
+                if should_store(result):
+                    self._responses.set(store_key, (fingerprint, result))
+                    if shared:
+                        await self._store_shared(store_key, fingerprint, encode(result))
+                return result, False
+            finally:
+                self._inflight_fingerprints.pop(store_key, None)
+                if claimed:
+                    await self._release_shared(store_key)
+
+        if not attached:
+            self._inflight_fingerprints[store_key] = fingerprint
+        result, replayed = await self._inflight.do(store_key, compute)
+        if attached or replayed:
+            self.replayed += 1
+        return result, attached or replayed
+
+    def _seen_shared(self, store_key: str, fingerprint: str) -> bool:
+        if self.shared_state.get(PENDING_NAMESPACE, store_key) == fingerprint:
+            return True
+        stored = self.shared_state.get(RESPONSES_NAMESPACE, store_key)
+        return stored is not None and json.loads(stored)["fingerprint"] == fingerprint
+
+    async def _claim_shared(
+        self, store_key: str, fingerprint: str
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Returns `(stored result, claimed)`. Raises when another worker holds the
+        key or stored it for a different body. The pending marker is claimed
+        before the stored result is read: a finished request stores its result
+        before releasing the marker, so it can never be missed.
+        """
+        try:
+            return await asyncio.to_thread(self._claim, store_key, fingerprint)
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not claim shared idempotency key: {e}")
+            return None, False
+
+    def _claim(self, store_key: str, fingerprint: str) -> Tuple[Optional[str], bool]:
+        pending = self.shared_state.add_if_absent(
+            PENDING_NAMESPACE, store_key, fingerprint, PENDING_TTL_SECONDS
+        )
+        if pending is not None:
+            if pending != fingerprint:
+                raise IdempotencyKeyReusedError(store_key)
+            raise IdempotencyKeyInProgressError(store_key)
+        stored = self.shared_state.get(RESPONSES_NAMESPACE, store_key)
+        if stored is None:
+            return None, True
+        self.shared_state.delete(PENDING_NAMESPACE, store_key)
+        record = json.loads(stored)
+        if record["fingerprint"] != fingerprint:
+            raise IdempotencyKeyReusedError(store_key)
+        return record["result"], False
+
+    async def _store_shared(self, store_key: str, fingerprint: str, value: str) -> None:
+        record = json.dumps({"fingerprint": fingerprint, "result": value})
+        try:
+            await asyncio.to_thread(
+                self.shared_state.set,
+                RESPONSES_NAMESPACE,
+                store_key,
+                record,
+                self.ttl_seconds,
+                self.max_entries,
+            )
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not store shared idempotent response: {e}")
+
+    async def _release_shared(self, store_key: str) -> None:
+        try:
+            await asyncio.to_thread(
+                self.shared_state.delete, PENDING_NAMESPACE, store_key
+            )
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not release shared idempotency key: {e}")
+
+
+idempotency_store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_MAX_KEYS,
+    ttl_seconds=settings.IDEMPOTENCY_WINDOW_SECONDS,
+    shared_state=shared_state,
+)
@@ -0,0 +1,434 @@
+# tax-filer-backend/app/services/job_queue.py
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import uuid
+
+from app.core.config import settings
+from app.core.logging_config import app_logger
+from app.core.metrics import record_advice_outcome
+from app.core.shared_state import SQLiteDatabase, transaction
+from app.middleware.request_id_middleware import jti_var
+from app.models import (
+    AdviceJob,
+    AdviceJobQueueStats,
+    AIServiceError,
+    AIServiceResponse,
+    JobStatus,
+    TaxInfoInput,
+)
+from app.services.admission import AdmissionRejectedError
+from app.services.ai_service import get_tax_advice_from_ai, with_fallback
+
+# (input, session jti) -> advice
+AdviceHandler = Callable[[TaxInfoInput, Optional[str]], Awaitable[AIServiceResponse]]
+
+
+UNFINISHED = f"'{JobStatus.QUEUED.value}', '{JobStatus.RUNNING.value}'"
+SHARED_JOBS_FILE = "advice-jobs.db"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its maximum depth."""
+
+
+class SQLiteJobStore:
+    """
+    Journals jobs to a local SQLite file so queued work and unexpired results
+    survive a restart, and so every worker sharing the file can read any job.
+    Each unfinished job is leased by the worker process running it; a worker
+    renews its leases while it runs and releases them when it stops, so jobs
+    of a worker that died are claimed by another one once the lease ends.
+    All calls are blocking and are meant to be run off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS advice_jobs ("
+                "job_id TEXT PRIMARY KEY, owner TEXT, job TEXT NOT NULL, "
+                "tax_input TEXT NOT NULL, expires_at REAL, status TEXT NOT NULL, "
+                "claimed_by TEXT, lease_until REAL)"
+            ],
+        )
+
+    def save(
+        self,
+        job: AdviceJob,
+        owner: Optional[str],
+        tax_input: TaxInfoInput,
+        claimed_by: Optional[str] = None,
+        lease_until: Optional[float] = None,
+    ):
+        expires_at = job.expires_at.timestamp() if job.expires_at else None
+        with self.db.lock, transaction(self.db.connection()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO advice_jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.job_id,
+                    owner,
+                    job.model_dump_json(),
+                    tax_input.model_dump_json(),
+                    expires_at,
+                    job.status.value,
+                    claimed_by,
+                    lease_until,
+                ),
+            )
+            conn.execute(
+                "DELETE FROM advice_jobs WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),),
+            )
+
+    def fetch(self, job_id: str) -> Optional[Tuple[Optional[str], str]]:
+        """
+        `(owner, job JSON)` of an unexpired job, or None.
+        """
+        with self.db.lock:
+            return (
+                self.db.connection()
+                .execute(
+                    "SELECT owner, job FROM advice_jobs WHERE job_id = ? "
+                    "AND (expires_at IS NULL OR expires_at > ?)",
+                    (job_id, time.time()),
+                )
+                .fetchone()
+            )
+
+    def claim(self, claimed_by: str, lease_seconds: float) -> List[tuple]:
+        """
+        Leases the unfinished jobs nobody holds a lease on to `claimed_by` and
+        returns them as `(owner, job JSON, input JSON)` rows.
+        """
+        now = time.time()
+        with self.db.lock, transaction(self.db.connection()) as conn:
+            conn.execute(
+                "DELETE FROM advice_jobs WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (now,),
+            )
+            rows = conn.execute(
+                "SELECT job_id, owner, job, tax_input FROM advice_jobs "
+                f"WHERE status IN ({UNFINISHED}) "
+                "AND (lease_until IS NULL OR lease_until <= ?)",
+                (now,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE advice_jobs SET claimed_by = ?, lease_until = ? WHERE job_id = ?",
+                [(claimed_by, now + lease_seconds, row[0]) for row in rows],
+            )
+        return [row[1:] for row in rows]
+
+    def renew(self, claimed_by: str, lease_seconds: float) -> None:
+        with self.db.lock:
+            self.db.connection().execute(
+                "UPDATE advice_jobs SET lease_until = ? "
+                f"WHERE claimed_by = ? AND status IN ({UNFINISHED})",
+                (time.time() + lease_seconds, claimed_by),
+            )
+
+    def release(self, claimed_by: str) -> None:
+        with self.db.lock:
+            self.db.connection().execute(
+                "UPDATE advice_jobs SET claimed_by = NULL, lease_until = NULL "
+                f"WHERE claimed_by = ? AND status IN ({UNFINISHED})",
+                (claimed_by,),
+            )
+
+
+class AdviceJobQueue:
+    """
+    Bounded in-process queue of advice requests drained by a pool of worker
+    tasks. Submitting returns immediately with a job id; results can be polled
+    until they expire `result_ttl_seconds` after the job finished.
+
+    With a `sqlite_path` shared by several worker processes, `lookup` finds a
+    job in whichever worker it was submitted to, and the jobs of a worker that
+    exits or stops renewing its leases for `lease_seconds` run elsewhere.
+    """
+
+    def __init__(
+        self,
+        handler: AdviceHandler,
+        max_depth: int = 1000,
+        workers: int = 4,
+        job_timeout_seconds: float = 60,
+        result_ttl_seconds: float = 900,
+        sqlite_path: Optional[str] = None,
+        lease_seconds: float = 30,
+    ):
+        self.handler = handler
+        self.max_depth = max_depth
+        self.worker_count = workers
+        self.job_timeout_seconds = job_timeout_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.store = SQLiteJobStore(sqlite_path) if sqlite_path else None
+        self.lease_seconds = lease_seconds
+        self.worker_id: Optional[str] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self._jobs: Dict[str, AdviceJob] = {}
+        self._owners: Dict[str, Optional[str]] = {}
+        self._inputs: Dict[str, TaxInfoInput] = {}
+        self._queued_at: "OrderedDict[str, float]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._queue = asyncio.Queue()
+        for job_id in self._queued_at:  # Jobs left over from a previous stop()
+            self._queue.put_nowait(job_id)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"advice-job-worker-{i}")
+            for i in range(max(1, self.worker_count))
+        ]
+        if self.store is not None:
+            # Per process: the queue object is created before gunicorn forks
+            self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            await self._restore()
+            self._lease_task = asyncio.create_task(
+                self._renew_leases(), name="advice-job-leases"
+            )
+        app_logger.info(
+            f"Advice job queue started with {len(self._workers)} workers "
+            f"(max depth {self.max_depth})."
+        )
+
+    async def stop(self) -> None:
+        tasks = [*self._workers, *([self._lease_task] if self._lease_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._lease_task = None
+        self._queue = None
+        for job_id, job in self._jobs.items():  # Interrupted jobs run again on start()
+            if job.status == JobStatus.RUNNING:
+                job.status = JobStatus.QUEUED
+                self._queued_at[job_id] = time.monotonic()
+        if self.store is not None and self.worker_id is not None:
+            try:  # Another worker can pick them up right away
+                await asyncio.to_thread(self.store.release, self.worker_id)
+            except sqlite3.Error as e:
+                app_logger.warning(f"Could not release advice job leases: {e}")
+        app_logger.info("Advice job queue stopped.")
+
+    async def submit(
+        self, tax_input: TaxInfoInput, owner: Optional[str] = None
+    ) -> AdviceJob:
+        if not self.started:
+            await self.start()
+        self._purge_expired()
+        if len(self._queued_at) >= self.max_depth:
+            raise QueueFullError(f"Advice job queue is full ({self.max_depth} jobs)")
+
+        job = AdviceJob(
+            job_id=str(uuid.uuid4()),
+            status=JobStatus.QUEUED,
+            created_at=datetime.now(timezone.utc),
+        )
+        self._track(job, owner, tax_input)
+        await self._persist(job)
+        self._enqueue(job.job_id)
+        return job.model_copy()
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[AdviceJob]:
+        """
+        Returns the job, or None if it is unknown, expired, or owned by another session.
+        """
+        self._purge_expired()
+        job = self._jobs.get(job_id)
+        if job is None or self._owners.get(job_id) != owner:
+            return None
+        return job.model_copy()
+
+    async def lookup(
+        self, job_id: str, owner: Optional[str] = None
+    ) -> Optional[AdviceJob]:
+        """
+        `get`, falling back to the shared store for jobs of other workers.
+        """
+        job = self.get(job_id, owner)
+        if job is not None or self.store is None:
+            return job
+        try:
+            row = await asyncio.to_thread(self.store.fetch, job_id)
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not look up advice job {job_id}: {e}")
+            return None
+        if row is None or row[0] != owner:
+            return None
+        return AdviceJob.model_validate_json(row[1])
+
+    def stats(self) -> AdviceJobQueueStats:
+        self._purge_expired()
+        oldest = next(iter(self._queued_at.values()), None)
+        return AdviceJobQueueStats(
+            depth=len(self._queued_at),
+            max_depth=self.max_depth,
+            oldest_queued_age_seconds=(
+                round(time.monotonic() - oldest, 3) if oldest is not None else 0.0
+            ),
+            running=self._running,
+            workers=len(self._workers),
+            tracked_jobs=len(self._jobs),
+        )
+
+    def _track(
+        self, job: AdviceJob, owner: Optional[str], tax_input: TaxInfoInput
+    ) -> None:
+        self._jobs[job.job_id] = job
+        self._owners[job.job_id] = owner
+        self._inputs[job.job_id] = tax_input
+
+    def _enqueue(self, job_id: str) -> None:
+        self._queued_at[job_id] = time.monotonic()
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:  # Never let one job take a worker down
+                app_logger.error(f"Advice job {job_id} crashed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        self._queued_at.pop(job_id, None)
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now(timezone.utc)
+        await self._persist(job)  # Visible to the other workers
+        self._running += 1
+        owner = self._owners.get(job_id)
+        jti_token = jti_var.set(owner)  # Logs per session
+        try:
+            # The owner's session for admission fairness, quotas and usage
+            result = await asyncio.wait_for(
+                self.handler(self._inputs[job_id], owner),
+                timeout=self.job_timeout_seconds,
+            )
+        except AdmissionRejectedError as e:
+            result = e.to_response()
+        except asyncio.TimeoutError:
+            app_logger.warning(
+                f"Advice job {job_id} timed out after {self.job_timeout_seconds}s"
+            )
+            result = AIServiceResponse(
+                success=False,
+                content="Generating AI-powered advice took too long. Please try again later.",
+                error_type=AIServiceError.TIMEOUT,
+            )
+            record_advice_outcome(result.error_type)  # Cancelled before recording it
+            result = with_fallback(self._inputs[job_id], result)
+        except Exception as e:
+            app_logger.error(f"Advice job {job_id} failed: {e}", exc_info=True)
+            result = AIServiceResponse(
+                success=False,
+                content="An unexpected error occurred while trying to get AI-powered tax advice.",
+                error_type=AIServiceError.INTERNAL_ERR,
+            )
+        finally:
+            self._running -= 1
+            jti_var.reset(jti_token)
+
+        job.result = result
+        job.status = JobStatus.SUCCEEDED if result.success else JobStatus.FAILED
+        job.finished_at = datetime.now(timezone.utc)
+        job.expires_at = job.finished_at + timedelta(seconds=self.result_ttl_seconds)
+        await self._persist(job)
+
+    def _purge_expired(self) -> None:
+        now = datetime.now(timezone.utc)
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.expires_at is not None and job.expires_at <= now
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._owners.pop(job_id, None)
+            self._inputs.pop(job_id, None)
+
+    async def _persist(self, job: AdviceJob) -> None:
+        if self.store is None:
+            return
+        try:
+            await asyncio.to_thread(
+                self.store.save,
+                job,
+                self._owners.get(job.job_id),
+                self._inputs[job.job_id],
+                self.worker_id,
+                time.time() + self.lease_seconds,
+            )
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not persist advice job {job.job_id}: {e}")
+
+    async def _restore(self) -> None:
+        """
+        Claims and queues the unfinished jobs no worker holds a lease on: left
+        over from a restart, or from a worker that died.
+        """
+        try:
+            rows = await asyncio.to_thread(
+                self.store.claim, self.worker_id, self.lease_seconds
+            )
+        except sqlite3.Error as e:
+            app_logger.error(f"Could not restore advice jobs: {e}")
+            return
+        requeued = 0
+        for owner, job_json, input_json in rows:
+            job = AdviceJob.model_validate(json.loads(job_json))
+            if job.job_id in self._jobs:
+                continue
+            self._track(job, owner, TaxInfoInput.model_validate_json(input_json))
+            job.status = JobStatus.QUEUED
+            self._enqueue(job.job_id)
+            requeued += 1
+        if requeued:
+            app_logger.info(f"Requeued {requeued} unfinished advice jobs from disk.")
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(
+                    self.store.renew, self.worker_id, self.lease_seconds
+                )
+            except sqlite3.Error as e:
+                app_logger.warning(f"Could not renew advice job leases: {e}")
+            await self._restore()
+
+
+advice_job_queue = AdviceJobQueue(
+    handler=get_tax_advice_from_ai,
+    max_depth=settings.ADVICE_JOBS_MAX_QUEUE_DEPTH,
+    workers=settings.ADVICE_JOBS_WORKERS,
+    job_timeout_seconds=settings.ADVICE_JOBS_TIMEOUT_SECONDS,
+    result_ttl_seconds=settings.ADVICE_JOBS_RESULT_TTL_SECONDS,
+    sqlite_path=(
+        settings.ADVICE_JOBS_SQLITE_PATH
+        or (
+            os.path.join(settings.SHARED_STATE_DIR, SHARED_JOBS_FILE)
+            if settings.SHARED_STATE_DIR
+            else None
+        )
+    ),
+    lease_seconds=settings.ADVICE_JOBS_LEASE_SECONDS,
+)
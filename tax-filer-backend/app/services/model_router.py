@@ -0,0 +1,128 @@
+# tax-filer-backend/app/services/model_router.py
+import time
+from typing import Dict, List, Optional
+
+from app.core.logging_config import app_logger
+from app.models import ModelRouteStatus
+
+
+class ModelStats:
+    """
+    Rolling (exponentially weighted) latency and error rate of a single model.
+    """
+
+    __slots__ = (
+        "model",
+        "avg_latency_seconds",
+        "error_rate",
+        "requests",
+        "failures",
+        "unavailable_until",
+    )
+
+    def __init__(self, model: str):
+        self.model = model
+        self.avg_latency_seconds: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.unavailable_until = 0.0
+
+
+class ModelRouter:
+    """
+    Orders the configured candidate models for each request:
+    healthy models whose rolling latency is within the SLO come first, fastest
+    first (models without samples count as exactly at the SLO, ties keep the
+    configured order); then healthy models above the SLO; unhealthy models are
+    only tried as a last resort.
+    A model is unhealthy while its rolling error rate is above
+    `error_rate_threshold` or during the cooldown after a hard failure (e.g. 404).
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        latency_slo_seconds: float,
+        error_rate_threshold: float = 0.5,
+        cooldown_seconds: float = 30,
+        smoothing: float = 0.2,
+    ):
+        if not models:
+            raise ValueError("ModelRouter needs at least one candidate model")
+        self.latency_slo_seconds = latency_slo_seconds
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.smoothing = smoothing
+        self._stats: Dict[str, ModelStats] = {m: ModelStats(m) for m in models}
+
+    @property
+    def models(self) -> List[str]:
+        return list(self._stats)
+
+    def is_healthy(self, model: str) -> bool:
+        stats = self._stats[model]
+        if time.monotonic() < stats.unavailable_until:
+            return False
+        return stats.error_rate <= self.error_rate_threshold
+
+    def candidates(self) -> List[str]:
+        order = {model: i for i, model in enumerate(self._stats)}
+
+        def rank(model: str):
+            stats = self._stats[model]
+            latency = (
+                stats.avg_latency_seconds
+                if stats.avg_latency_seconds is not None
+                else self.latency_slo_seconds
+            )
+            if not self.is_healthy(model):
+                return (2, order[model], 0.0)
+            if latency > self.latency_slo_seconds:
+                return (1, order[model], 0.0)
+            return (0, latency, order[model])
+
+        return sorted(self._stats, key=rank)
+
+    def record_success(self, model: str, latency_seconds: float) -> None:
+        stats = self._stats[model]
+        stats.requests += 1
+        stats.avg_latency_seconds = (
+            latency_seconds
+            if stats.avg_latency_seconds is None
+            else (1 - self.smoothing) * stats.avg_latency_seconds
+            + self.smoothing * latency_seconds
+        )
+        stats.error_rate = (1 - self.smoothing) * stats.error_rate
+        stats.unavailable_until = 0.0
+
+    def record_failure(self, model: str, hard: bool = False) -> None:
+        """
+        Records a failed call. `hard` failures (e.g. the model does not exist)
+        take the model out of rotation for the cooldown period right away.
+        """
+        stats = self._stats[model]
+        stats.requests += 1
+        stats.failures += 1
+        stats.error_rate = (1 - self.smoothing) * stats.error_rate + self.smoothing
+        if hard or stats.error_rate > self.error_rate_threshold:
+            stats.unavailable_until = time.monotonic() + self.cooldown_seconds
+            app_logger.warning(
+                f"Model '{model}' marked unhealthy for {self.cooldown_seconds}s "
+                f"(error rate {stats.error_rate:.2f}, hard failure: {hard})"
+            )
+
+    def routing_table(self) -> List[ModelRouteStatus]:
+        ranked = self.candidates()
+        return [
+            ModelRouteStatus(
+                model=model,
+                rank=ranked.index(model) + 1,
+                healthy=self.is_healthy(model),
+                avg_latency_seconds=self._stats[model].avg_latency_seconds,
+                error_rate=round(self._stats[model].error_rate, 4),
+                requests=self._stats[model].requests,
+                failures=self._stats[model].failures,
+            )
+            for model in self._stats
+        ]
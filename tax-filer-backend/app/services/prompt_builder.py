@@ -0,0 +1,330 @@
+# tax-filer-backend/app/services/prompt_builder.py
+from dataclasses import dataclass
+import hashlib
+import importlib.util
+import json
+import math
+from pathlib import Path
+import re
+import string
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging_config import app_logger
+from app.core.metrics import PROMPT_BUILD_DURATION
+from app.models import TaxEstimate, TaxInfoInput
+from app.services.advice_cache import IncomeBands
+from app.services.tax_engine import tax_engine
+
+DEFAULT_TEMPLATES_FILE = (
+    Path(__file__).resolve().parent.parent / "data" / "prompt_templates.json"
+)
+TEMPLATE_FIELDS = {
+    "instructions": set(),
+    "figures": {"country", "income", "expenses", "deductions"},
+    "banded_figures": {"country", "income", "expenses", "deductions"},
+    "estimate": {
+        "taxable_income",
+        "currency",
+        "tax_year",
+        "estimated_tax",
+        "effective_rate",
+        "marginal_rate",
+        "basis",
+    },
+    "length": {"words"},
+}
+DEFAULT_ENCODING = "o200k_base"  # For models tiktoken does not know
+# Chat format overhead (see OpenAI's token counting guide): per message, and
+# once for the start of the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+# Asking for a little less than the budget lets the answer end on its own
+# instead of being cut off at max_completion_tokens
+WORDS_PER_TOKEN = 0.75
+LENGTH_HEADROOM = 0.8
+# Digit groups, letter runs, newline runs, runs of two or more spaces (a
+# single space is merged into the next word) and single other symbols, roughly
+# the pieces a BPE tokenizer splits text into
+TOKEN_PIECES = re.compile(r"\d{1,3}|[^\W\d_]+|\n+|[ \t]{2,}|[^\w\s]|_")
+
+
+def compact(lines: List[str]) -> str:
+    """
+    Joins template lines without indentation, trailing spaces or blank lines,
+    which would otherwise be billed as prompt tokens.
+    """
+    return "\n".join(line.strip() for line in lines if line.strip())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count estimate without a tokenizer: one token per digit group of up
+    to three, per symbol and per run of line breaks or indentation, letter
+    runs at about six characters per token.
+    """
+    tokens = 0
+    for piece in TOKEN_PIECES.findall(text):
+        tokens += math.ceil(len(piece) / 6) if piece[0].isalpha() else 1
+    return tokens
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens locally. Uses tiktoken's encoding for the model when
+    the optional `tiktoken` package is installed and its encoding could be
+    loaded (`load()`, done off the event loop at startup, may download it
+    once), otherwise `estimate_tokens`.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def load(self) -> bool:
+        if self._encoding is not None:
+            return True
+        if importlib.util.find_spec("tiktoken") is None:
+            app_logger.info(
+                "The 'tiktoken' package is not installed; prompt tokens are estimated."
+            )
+            return False
+        try:
+            import tiktoken
+
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as e:
+            app_logger.warning(
+                f"Could not load the tiktoken encoding ({e}); prompt tokens are estimated."
+            )
+            return False
+        return True
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        tokens = TOKENS_PER_REPLY
+        for message in messages:
+            tokens += TOKENS_PER_MESSAGE
+            for key, value in message.items():
+                tokens += self.count(value) + (1 if key == "name" else 0)
+        return tokens
+
+
+class CompletionPace:
+    """
+    Moving average of completion seconds per generated token, over whole
+    calls (so including time to first token, which errs on the short side).
+    Tells how many tokens fit into a latency target once `min_samples`
+    completions were seen.
+    """
+
+    def __init__(self, alpha: float = 0.2, min_samples: int = 5):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.samples = 0
+        self.seconds_per_token: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, completion_tokens: int) -> None:
+        if completion_tokens <= 0:
+            return
+        pace = seconds / completion_tokens
+        with self._lock:
+            self.samples += 1
+            if self.seconds_per_token is None:
+                self.seconds_per_token = pace
+            else:
+                self.seconds_per_token += self.alpha * (pace - self.seconds_per_token)
+
+    def tokens_within(self, seconds: float) -> Optional[int]:
+        if seconds <= 0 or self.samples < self.min_samples:
+            return None
+        return int(seconds / self.seconds_per_token)
+
+
+@dataclass(frozen=True)
+class TaxPrompt:
+    messages: List[Dict[str, str]]
+    prompt_tokens: int  # Counted locally, including the chat format overhead
+    max_completion_tokens: int
+
+    @property
+    def total_tokens(self) -> int:
+        """
+        Upper bound of the tokens the completion consumes, charged to the TPM
+        budget before the request is sent.
+        """
+        return self.prompt_tokens + self.max_completion_tokens
+
+
+class PromptBuilder:
+    """
+    Builds the chat messages for a tax advice completion from versioned
+    templates (see `app/data/prompt_templates.json`):
+    - a developer message with all instructions, byte-identical for every
+      request, so the provider's prompt caching can reuse it as a prefix,
+    - a user message with only the figures of this request, the local
+      estimate and the length to aim for.
+    `version` changes with the template contents and is part of the advice
+    cache key.
+
+    The completion budget grows with the input's complexity (expenses and
+    deductions to discuss, no local estimate to lean on) between `min_tokens`
+    and `max_tokens`, and is capped by what the recent completion pace allows
+    within `latency_target_seconds` (0 disables the cap).
+    """
+
+    def __init__(
+        self,
+        templates: Dict[str, Any],
+        token_counter: TokenCounter,
+        min_tokens: int = 150,
+        max_tokens: int = 350,
+        latency_target_seconds: float = 0,
+    ):
+        missing = set(TEMPLATE_FIELDS) - set(templates)
+        if missing or "version" not in templates:
+            raise ValueError(
+                f"Prompt templates need 'version' and {sorted(TEMPLATE_FIELDS)}"
+            )
+        self.templates = {name: compact(templates[name]) for name in TEMPLATE_FIELDS}
+        for name, allowed in TEMPLATE_FIELDS.items():
+            fields = {
+                field
+                for _, field, _, _ in string.Formatter().parse(self.templates[name])
+                if field
+            }
+            if fields - allowed:
+                raise ValueError(
+                    f"Prompt template {name} uses unknown fields {sorted(fields - allowed)}"
+                )
+        digest = hashlib.sha256(
+            json.dumps(self.templates, sort_keys=True).encode()
+        ).hexdigest()
+        self.version = f"{templates['version']}-{digest[:8]}"
+        self.tokens = token_counter
+        self.min_tokens = min(min_tokens, max_tokens)
+        self.max_tokens = max_tokens
+        self.latency_target_seconds = latency_target_seconds
+        self.pace = CompletionPace()
+
+    @classmethod
+    def from_file(cls, path: Path, token_counter: TokenCounter, **options):
+        with open(path, encoding="utf-8") as f:
+            templates = json.load(f)
+        return cls(templates, token_counter, **options)
+
+    @property
+    def prefix(self) -> Dict[str, str]:
+        return {"role": "developer", "content": self.templates["instructions"]}
+
+    def build(
+        self, tax_data: TaxInfoInput, bands: Optional[IncomeBands] = None
+    ) -> TaxPrompt:
+        """
+        With `bands` (the "banded" cache mode), the prompt only describes the
+        ranges the amounts fall into, so the advice fits every input in them.
+        """
+        started_at = time.perf_counter()
+        estimate = None if bands is not None else tax_engine.estimate(tax_data)
+        budget = self.completion_budget(tax_data, estimate)
+        sections = [self._figures(tax_data, bands)]
+        if estimate is not None:
+            sections.append(self._estimate(estimate))
+        sections.append(
+            self.templates["length"].format(
+                words=int(budget * WORDS_PER_TOKEN * LENGTH_HEADROOM)
+            )
+        )
+        messages = [
+            self.prefix,
+            {"role": "user", "content": "\n".join(sections), "name": "customer"},
+        ]
+        prompt = TaxPrompt(messages, self.tokens.count_messages(messages), budget)
+        PROMPT_BUILD_DURATION.observe(time.perf_counter() - started_at)
+        return prompt
+
+    def completion_budget(
+        self, tax_data: TaxInfoInput, estimate: Optional[TaxEstimate]
+    ) -> int:
+        complexity = 0.25 * (
+            1 + (tax_data.expenses > 0) + ((tax_data.deductions or 0) > 0)
+        )
+        if estimate is None:
+            complexity += 0.25
+        budget = self.min_tokens + round(
+            (self.max_tokens - self.min_tokens) * complexity
+        )
+        within_target = self.pace.tokens_within(self.latency_target_seconds)
+        if within_target is not None:
+            budget = min(budget, within_target)
+        return max(self.min_tokens, min(budget, self.max_tokens))
+
+    def stats(self) -> Dict[str, Any]:
+        seconds_per_token = self.pace.seconds_per_token
+        return {
+            "version": self.version,
+            "exact_token_counts": self.tokens.exact,
+            "prefix_tokens": self.tokens.count(self.prefix["content"]),
+            "completion_ms_per_token": (
+                round(seconds_per_token * 1000, 2) if seconds_per_token else None
+            ),
+        }
+
+    def _figures(self, tax_data: TaxInfoInput, bands: Optional[IncomeBands]) -> str:
+        deductions = tax_data.deductions or 0
+        if bands is None:
+            return self.templates["figures"].format(
+                country=tax_data.country,
+                income=f"{tax_data.income:,.2f}",
+                expenses=f"{tax_data.expenses:,.2f}",
+                deductions=f"{deductions:,.2f}",
+            )
+
+        def amount_range(amount: float) -> str:
+            lower, upper = bands.bounds(bands.index(amount))
+            return f"{lower:,.2f} to {upper:,.2f}" if upper else "none"
+
+        return self.templates["banded_figures"].format(
+            country=tax_data.country,
+            income=amount_range(tax_data.income),
+            expenses=amount_range(tax_data.expenses),
+            deductions=amount_range(deductions),
+        )
+
+    def _estimate(self, estimate: TaxEstimate) -> str:
+        return self.templates["estimate"].format(
+            taxable_income=f"{estimate.taxable_income:,.2f}",
+            currency=estimate.currency,
+            tax_year=estimate.tax_year,
+            estimated_tax=f"{estimate.estimated_tax:,.2f}",
+            effective_rate=f"{estimate.effective_rate:.1%}",
+            marginal_rate=f"{estimate.marginal_rate:.1%}",
+            basis=estimate.basis,
+        )
+
+
+prompt_builder = PromptBuilder.from_file(
+    (
+        Path(settings.AI_PROMPT_TEMPLATES_PATH)
+        if settings.AI_PROMPT_TEMPLATES_PATH
+        else DEFAULT_TEMPLATES_FILE
+    ),
+    TokenCounter(settings.OPENAI_MODEL_NAME),
+    min_tokens=settings.AI_COMPLETION_TOKENS_MIN,
+    max_tokens=settings.AI_COMPLETION_TOKENS_MAX,
+    latency_target_seconds=settings.AI_COMPLETION_LATENCY_TARGET_SECONDS,
+)
@@ -0,0 +1,295 @@
+# tax-filer-backend/app/services/resilience.py
+import asyncio
+from collections import deque
+from enum import Enum
+import random
+import time
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.core.logging_config import app_logger
+
+T = TypeVar("T")
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and rejects
+    calls for `recovery_seconds`. After that a single probe call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.failure_threshold <= 0 or self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.recovery_seconds:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != CircuitState.CLOSED:
+            app_logger.info("Circuit breaker closed: upstream recovered.")
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        Lets another probe through when the current one never reached the
+        upstream (e.g. it was rejected by admission control).
+        """
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.failure_threshold <= 0:
+            return
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            if self.state != CircuitState.OPEN:
+                self.times_opened += 1
+                app_logger.warning(
+                    f"Circuit breaker opened after {self.consecutive_failures} consecutive "
+                    f"failures; short-circuiting for {self.recovery_seconds}s."
+                )
+            self.state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter.
+    A server-provided Retry-After takes precedence over the computed delay, as
+    long as it does not exceed `max_delay_seconds`.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay_seconds: float = 0.5,
+        max_delay_seconds: float = 8.0,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+    def backoff(
+        self, attempt: int, retry_after: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Delay before retry number `attempt` (1-based), or None if no retry should
+        be made (attempts exhausted or the server asked us to wait too long).
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay_seconds else None
+        ceiling = min(
+            self.max_delay_seconds, self.base_delay_seconds * (2 ** (attempt - 1))
+        )
+        return random.uniform(0, ceiling)
+
+
+class LatencyTracker:
+    """
+    Keeps the last `window` latency samples to derive percentiles, e.g. the
+    hedging delay.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+async def hedged_call(
+    call: Callable[[], Awaitable[T]],
+    delay: float,
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> T:
+    """
+    Starts `call()`; if it has not finished after `delay` seconds, starts a second
+    identical call and returns whichever succeeds first. The slower one is cancelled.
+    If both fail, the first failure is raised.
+    """
+    primary = asyncio.ensure_future(call())
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done:
+        return primary.result()
+
+    if on_hedge is not None:
+        on_hedge()
+    hedge = asyncio.ensure_future(call())
+    pending = {primary, hedge}
+    first_error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                first_error = first_error or task.exception()
+        raise first_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class ResilientCaller:
+    """
+    Runs an upstream call behind a circuit breaker, with retries and optional
+    hedging. Error classification is supplied by the caller, so this module stays
+    independent of the SDK in use:
+    - `is_retryable(exc)`: whether another attempt may succeed,
+    - `is_upstream_failure(exc)`: whether the error counts against the breaker,
+    - `retry_after(exc)`: server-provided delay in seconds, if any,
+    - `is_rejected_locally(exc)`: whether the call failed before reaching the
+      upstream; such errors are raised as they are, without a retry and
+      without counting for or against the breaker.
+    A cancelled call does not count either; a half-open probe is released.
+    """
+
+    def __init__(
+        self,
+        retry_policy: RetryPolicy,
+        circuit_breaker: CircuitBreaker,
+        is_retryable: Callable[[BaseException], bool],
+        is_upstream_failure: Callable[[BaseException], bool],
+        retry_after: Callable[[BaseException], Optional[float]],
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 95,
+        hedge_min_delay_seconds: float = 0.5,
+        hedge_min_samples: int = 20,
+        is_rejected_locally: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.is_retryable = is_retryable
+        self.is_upstream_failure = is_upstream_failure
+        self.retry_after = retry_after
+        self.is_rejected_locally = is_rejected_locally
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.short_circuited = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(
+            self.hedge_min_delay_seconds,
+            self.latency.percentile(self.hedge_percentile),
+        )
+
+    async def call(self, func: Callable[[], Awaitable[T]], hedge: bool = True) -> T:
+        attempt = 1
+        while True:
+            if not self.circuit_breaker.allow_request():
+                self.short_circuited += 1
+                raise CircuitOpenError("Upstream circuit breaker is open")
+            self.attempts += 1
+            started_at = time.perf_counter()
+            try:
+                delay = self.hedge_delay() if hedge else None
+                if delay is not None:
+                    result = await hedged_call(func, delay, self._count_hedge)
+                else:
+                    result = await func()
+            except Exception as e:
+                if self.is_rejected_locally is not None and self.is_rejected_locally(e):
+                    self.circuit_breaker.release_probe()
+                    raise
+                if self.is_upstream_failure(e):
+                    self.circuit_breaker.record_failure()
+                else:
+                    # The upstream answered; only a hard failure should trip the breaker
+                    self.circuit_breaker.record_success()
+                backoff = (
+                    self.retry_policy.backoff(attempt, self.retry_after(e))
+                    if self.is_retryable(e)
+                    else None
+                )
+                if backoff is None:
+                    raise
+                self.retries += 1
+                app_logger.warning(
+                    f"Upstream call failed ({type(e).__name__}: {e}); "
+                    f"retry {attempt}/{self.retry_policy.max_attempts - 1} in {backoff:.2f}s"
+                )
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (client gone, timeout, shutdown): the outcome is unknown
+                self.circuit_breaker.release_probe()
+                raise
+            self.latency.record(time.perf_counter() - started_at)
+            self.circuit_breaker.record_success()
+            return result
+
+    def _count_hedge(self) -> None:
+        self.hedges += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "circuit_state": str(self.circuit_breaker.state),
+            "circuit_times_opened": self.circuit_breaker.times_opened,
+            "consecutive_failures": self.circuit_breaker.consecutive_failures,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "short_circuited": self.short_circuited,
+            "latency_p95_seconds": self.latency.percentile(95),
+        }
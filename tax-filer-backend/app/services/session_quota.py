@@ -0,0 +1,219 @@
+# tax-filer-backend/app/services/session_quota.py
+import asyncio
+import math
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.logging_config import app_logger
+from app.core.shared_state import SharedState, shared_state
+
+SECONDS_PER_DAY = 86400
+REQUESTS_NAMESPACE = "session_requests"
+BATCH_ITEMS_NAMESPACE = "session_batch_items"
+TOKENS_NAMESPACE = "session_tokens"
+
+
+class QuotaExceededError(Exception):
+    """
+    Raised when a session has used up one of its quotas.
+    `retry_after` is the number of seconds until the quota resets.
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class SessionQuota:
+    """
+    Per-session (JWT `jti`) limits: at most `max_requests` requests per
+    `window_seconds` (fixed windows starting at a session's first request; a
+    batch item is charged to a separate instance, see `batch_item_quota`) and
+    at most `max_tokens_per_day` OpenAI tokens per UTC day, as reported by
+    `completion.usage`. Tokens are charged once a completion has finished, so
+    the request that crosses the daily budget still completes and later ones
+    are rejected. A limit of 0 disables it.
+
+    State is per worker process, unless a `shared_state` is given: then the
+    counters are shared by every worker on the host. Use `charge` from async
+    code, which keeps the shared counters' I/O off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: float,
+        max_tokens_per_day: int,
+        max_sessions: int = 100000,
+        shared_state: Optional[SharedState] = None,
+        namespace: str = REQUESTS_NAMESPACE,
+    ):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.max_tokens_per_day = max_tokens_per_day
+        self.max_sessions = max_sessions
+        self.shared_state = shared_state
+        self.namespace = namespace  # Of the shared request counters
+        self.rejected = 0
+        self._pending: Set[asyncio.Future] = set()
+        self._windows: Dict[str, List[float]] = {}  # jti -> [window start, count]
+        self._tokens: Dict[str, List[int]] = {}  # jti -> [UTC day, tokens]
+
+    async def charge(self, jti: str, requests: int = 1) -> None:
+        """
+        `check`, run in a worker thread when the counters are shared.
+        """
+        if self.shared_state is None:
+            self.check(jti, requests)
+        else:
+            await asyncio.to_thread(self.check, jti, requests)
+
+    def check(self, jti: str, requests: int = 1) -> None:
+        """
+        Charges `requests` requests to the session, or raises
+        `QuotaExceededError` without charging any of them. With `requests=0`
+        only the daily token quota is checked.
+        """
+        now = time.time()
+        if self.max_requests > 0 and requests > self.max_requests:
+            self._reject(
+                jti,
+                f"{requests} requests exceed the quota of {self.max_requests}",
+                self.window_seconds,
+            )
+        if self.shared_state is not None:
+            self._check_shared(jti, requests, now)
+            return
+        if self.max_tokens_per_day > 0:
+            day = int(now // SECONDS_PER_DAY)
+            usage = self._tokens.get(jti)
+            if usage is not None and usage[0] == day:
+                if usage[1] >= self.max_tokens_per_day:
+                    self._reject(
+                        jti,
+                        "daily token quota used up",
+                        (day + 1) * SECONDS_PER_DAY - now,
+                    )
+        if self.max_requests > 0 and requests > 0:
+            window = self._windows.get(jti)
+            if window is None or now - window[0] >= self.window_seconds:
+                if window is None and len(self._windows) >= self.max_sessions:
+                    self._prune(now)
+                self._windows[jti] = [now, requests]
+            elif window[1] + requests > self.max_requests:
+                self._reject(
+                    jti, "request quota used up", window[0] + self.window_seconds - now
+                )
+            else:
+                window[1] += requests
+
+    def record_tokens(self, jti: Optional[str], tokens: int) -> None:
+        if not jti or self.max_tokens_per_day <= 0:
+            return
+        day = int(time.time() // SECONDS_PER_DAY)
+        if self.shared_state is not None:
+            self._add_shared_tokens_soon(jti, day, tokens)
+            return
+        usage = self._tokens.get(jti)
+        if usage is None or usage[0] != day:
+            if usage is None and len(self._tokens) >= self.max_sessions:
+                self._prune(time.time())
+            self._tokens[jti] = [day, tokens]
+        else:
+            usage[1] += tokens
+
+    def tokens_used_today(self, jti: str) -> int:
+        if self.shared_state is not None:
+            day = int(time.time() // SECONDS_PER_DAY)
+            return self.shared_state.counter(TOKENS_NAMESPACE, f"{jti}:{day}")
+        usage = self._tokens.get(jti)
+        if usage is None or usage[0] != int(time.time() // SECONDS_PER_DAY):
+            return 0
+        return usage[1]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked_sessions": len(self._windows.keys() | self._tokens.keys()),
+            "rejected": self.rejected,
+        }
+
+    def _check_shared(self, jti: str, requests: int, now: float) -> None:
+        if self.max_tokens_per_day > 0:
+            day = int(now // SECONDS_PER_DAY)
+            used = self.shared_state.counter(TOKENS_NAMESPACE, f"{jti}:{day}")
+            if used >= self.max_tokens_per_day:
+                self._reject(
+                    jti, "daily token quota used up", (day + 1) * SECONDS_PER_DAY - now
+                )
+        if self.max_requests > 0 and requests > 0:
+            wait = self.shared_state.consume(
+                self.namespace,
+                {jti: (requests, self.max_requests)},
+                self.window_seconds,
+            )
+            if wait > 0:
+                self._reject(jti, "request quota used up", wait)
+
+    def _add_shared_tokens_soon(self, jti: str, day: int, tokens: int) -> None:
+        """
+        Charges the tokens in a worker thread when called on the event loop.
+        """
+        args = (
+            TOKENS_NAMESPACE,
+            f"{jti}:{day}",
+            tokens,
+            (day + 1) * SECONDS_PER_DAY - time.time(),
+        )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.shared_state.add(*args)
+            return
+        future = loop.run_in_executor(None, self._add_shared_tokens, args)
+        self._pending.add(future)  # Keeps a reference until it is done
+        future.add_done_callback(self._pending.discard)
+
+    def _add_shared_tokens(self, args: tuple) -> None:
+        try:
+            self.shared_state.add(*args)
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not charge tokens to the shared quota: {e}")
+
+    def _reject(self, jti: str, reason: str, retry_after: float) -> None:
+        self.rejected += 1
+        app_logger.warning(f"Session quota exceeded for jti {jti}: {reason}")
+        raise QuotaExceededError(reason, retry_after)
+
+    def _prune(self, now: float) -> None:
+        day = int(now // SECONDS_PER_DAY)
+        for jti in [
+            jti
+            for jti, (started_at, _) in self._windows.items()
+            if now - started_at >= self.window_seconds
+        ]:
+            del self._windows[jti]
+        for jti in [
+            jti for jti, (usage_day, _) in self._tokens.items() if usage_day != day
+        ]:
+            del self._tokens[jti]
+
+
+session_quota = SessionQuota(
+    max_requests=settings.SESSION_QUOTA_REQUESTS,
+    window_seconds=settings.SESSION_QUOTA_WINDOW_SECONDS,
+    max_tokens_per_day=settings.SESSION_QUOTA_TOKENS_PER_DAY,
+    shared_state=shared_state,
+)
+# Batch items have their own, larger budget, so a back-office import of
+# hundreds of records per request fits; their tokens still count against
+# `session_quota`
+batch_item_quota = SessionQuota(
+    max_requests=settings.SESSION_QUOTA_BATCH_ITEMS,
+    window_seconds=settings.SESSION_QUOTA_BATCH_WINDOW_SECONDS,
+    max_tokens_per_day=0,
+    shared_state=shared_state,
+    namespace=BATCH_ITEMS_NAMESPACE,
+)
@@ -0,0 +1,202 @@
+# tax-filer-backend/app/services/tax_engine.py
+from dataclasses import dataclass
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import app_logger
+from app.models import TaxEstimate, TaxInfoInput
+
+DEFAULT_BRACKETS_FILE = (
+    Path(__file__).resolve().parent.parent / "data" / "tax_brackets.json"
+)
+
+
+@dataclass(frozen=True)
+class BracketTable:
+    """
+    Progressive brackets of one country as arrays: bracket `i` taxes the part
+    of the taxable income between `lower[i]` and `lower[i] + width[i]` at
+    `rates[i]` (the top bracket has an infinite width). `brackets` holds the
+    same `(lower, width, rate)` rows as plain floats for the scalar path.
+    """
+
+    code: str
+    name: str
+    currency: str
+    tax_year: str
+    basis: str
+    lower: np.ndarray
+    width: np.ndarray
+    rates: np.ndarray
+    brackets: Tuple[Tuple[float, float, float], ...]
+
+    @classmethod
+    def from_dict(cls, code: str, data: dict) -> "BracketTable":
+        uppers = [
+            np.inf if upper is None else float(upper) for upper, _ in data["brackets"]
+        ]
+        if uppers[-1] != np.inf or uppers != sorted(uppers):
+            raise ValueError(
+                f"Brackets of {code} must be ascending and end with an open top bracket"
+            )
+        lower = np.array([0.0] + uppers[:-1])
+        width = np.array(uppers) - lower
+        rates = np.array([float(rate) for _, rate in data["brackets"]])
+        return cls(
+            code=code,
+            name=data["name"],
+            currency=data["currency"],
+            tax_year=data["tax_year"],
+            basis=data["basis"],
+            lower=lower,
+            width=width,
+            rates=rates,
+            brackets=tuple(zip(lower.tolist(), width.tolist(), rates.tolist())),
+        )
+
+
+class TaxEngine:
+    """
+    Deterministic estimate of the national income tax for a `TaxInfoInput`:
+    taxable income is `income - expenses - deductions` (floored at 0), taxed
+    with the country's bracket table. The bracket math is vectorized, so
+    `compute` scores whole arrays of inputs at once; `estimate_many` groups
+    inputs by country and runs one `compute` per country. `estimate` (one
+    input, the per-request case) walks the brackets in plain Python instead,
+    as NumPy's per-call overhead outweighs the math for a single row.
+    """
+
+    def __init__(self, tables: Dict[str, BracketTable], aliases: Dict[str, str]):
+        self.tables = tables
+        self.aliases = aliases
+
+    @classmethod
+    def from_file(cls, path: Path) -> "TaxEngine":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        tables, aliases = {}, {}
+        for code, country in data.items():
+            tables[code] = BracketTable.from_dict(code, country)
+            for alias in [code, country["name"], *country.get("aliases", [])]:
+                aliases[alias.strip().upper()] = code
+        app_logger.info(f"Loaded tax brackets for {len(tables)} countries from {path}")
+        return cls(tables, aliases)
+
+    def resolve_country(self, country: str) -> Optional[str]:
+        return self.aliases.get(country.strip().upper())
+
+    def supported_countries(self) -> List[str]:
+        return sorted(self.tables)
+
+    def compute(
+        self,
+        code: str,
+        income: np.ndarray,
+        expenses: np.ndarray,
+        deductions: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Taxable income, tax, effective rate (of income) and marginal rate for
+        arrays of inputs of one country.
+        """
+        table = self.tables[code]
+        taxable = np.maximum(income - expenses - deductions, 0.0)
+        portions = np.clip(taxable[:, None] - table.lower, 0.0, table.width)
+        tax = portions @ table.rates
+        bracket = np.searchsorted(table.lower, taxable, side="right") - 1
+        return {
+            "taxable_income": taxable,
+            "estimated_tax": tax,
+            "effective_rate": np.divide(
+                tax, income, out=np.zeros_like(tax), where=income > 0
+            ),
+            "marginal_rate": table.rates[np.maximum(bracket, 0)],
+        }
+
+    def estimate_many(
+        self, inputs: Sequence[TaxInfoInput]
+    ) -> List[Optional[TaxEstimate]]:
+        """
+        Estimates in input order; None for countries without bracket data.
+        """
+        estimates: List[Optional[TaxEstimate]] = [None] * len(inputs)
+        by_country: Dict[str, List[int]] = {}
+        for i, tax_input in enumerate(inputs):
+            code = self.resolve_country(tax_input.country)
+            if code is not None:
+                by_country.setdefault(code, []).append(i)
+
+        for code, indices in by_country.items():
+            table = self.tables[code]
+            values = np.array(
+                [
+                    (
+                        inputs[i].income,
+                        inputs[i].expenses,
+                        inputs[i].deductions or 0.0,
+                    )
+                    for i in indices
+                ]
+            )
+            result = self.compute(code, values[:, 0], values[:, 1], values[:, 2])
+            taxable = np.round(result["taxable_income"], 2).tolist()
+            tax = np.round(result["estimated_tax"], 2).tolist()
+            effective = np.round(result["effective_rate"], 4).tolist()
+            marginal = result["marginal_rate"].tolist()
+            for row, i in enumerate(indices):
+                estimates[i] = _make_estimate(
+                    table, taxable[row], tax[row], effective[row], marginal[row]
+                )
+        return estimates
+
+    def estimate(self, tax_input: TaxInfoInput) -> Optional[TaxEstimate]:
+        code = self.resolve_country(tax_input.country)
+        if code is None:
+            return None
+        table = self.tables[code]
+        taxable = max(
+            tax_input.income - tax_input.expenses - (tax_input.deductions or 0.0), 0.0
+        )
+        tax, marginal = 0.0, table.brackets[0][2]
+        for lower, width, rate in table.brackets:
+            if taxable < lower:
+                break
+            tax += min(taxable - lower, width) * rate
+            marginal = rate
+        return _make_estimate(
+            table,
+            round(taxable, 2),
+            round(tax, 2),
+            round(tax / tax_input.income, 4) if tax_input.income > 0 else 0.0,
+            marginal,
+        )
+
+
+def _make_estimate(
+    table: BracketTable,
+    taxable_income: float,
+    estimated_tax: float,
+    effective_rate: float,
+    marginal_rate: float,
+) -> TaxEstimate:
+    return TaxEstimate(
+        country_code=table.code,
+        currency=table.currency,
+        tax_year=table.tax_year,
+        taxable_income=taxable_income,
+        estimated_tax=estimated_tax,
+        effective_rate=effective_rate,
+        marginal_rate=marginal_rate,
+        basis=table.basis,
+    )
+
+
+tax_engine = TaxEngine.from_file(
+    Path(settings.TAX_BRACKETS_PATH)
+    if settings.TAX_BRACKETS_PATH
+    else DEFAULT_BRACKETS_FILE
+)
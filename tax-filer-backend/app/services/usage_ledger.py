@@ -0,0 +1,357 @@
+# tax-filer-backend/app/services/usage_ledger.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.logging_config import LOG_DIR, app_logger
+from app.core.shared_state import SQLiteDatabase, transaction
+from app.middleware.request_id_middleware import jti_var
+from app.models import AIServiceError
+
+LEDGER_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS usage_ledger ("
+    "recorded_at REAL NOT NULL, day TEXT NOT NULL, model TEXT, jti TEXT, "
+    "prompt_tokens INTEGER NOT NULL, cached_prompt_tokens INTEGER NOT NULL, "
+    "completion_tokens INTEGER NOT NULL, latency_ms REAL, "
+    "cache_hit INTEGER NOT NULL, error_type TEXT)",
+    "CREATE INDEX IF NOT EXISTS usage_ledger_day_model ON usage_ledger (day, model)",
+)
+GROUP_COLUMNS = ("day", "model", "jti")
+# USD per million tokens: (input, output, cached input)
+ModelPrices = Dict[str, Tuple[float, float, float]]
+UsageRow = Tuple[Any, ...]
+
+
+def parse_group_by(value: str) -> Tuple[str, ...]:
+    """
+    "day,model" -> ("day", "model"). Raises ValueError on unknown columns.
+    """
+    columns = tuple(column.strip() for column in value.split(",") if column.strip())
+    unknown = [column for column in columns if column not in GROUP_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(
+            f"group_by must be a comma-separated subset of {', '.join(GROUP_COLUMNS)}"
+        )
+    return tuple(dict.fromkeys(columns))
+
+
+def completion_cost(
+    prices: Optional[Tuple[float, float, float]],
+    prompt_tokens: int,
+    cached_prompt_tokens: int,
+    completion_tokens: int,
+) -> Optional[float]:
+    if prices is None:
+        return None
+    input_price, output_price, cached_price = prices
+    return (
+        (prompt_tokens - cached_prompt_tokens) * input_price
+        + cached_prompt_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
+
+
+class UsageLedger:
+    """
+    One row per advice request (model, prompt/cached/completion tokens, upstream
+    latency, session jti, cache hit, error type) in a local SQLite file, for
+    usage and cost reports.
+
+    `record` only appends a tuple to an in-memory buffer, so the request path
+    never waits on the disk. A background task (`start`/`stop`, run by the
+    application lifespan) writes the buffer off the event loop, one
+    transaction per batch, every `flush_interval_seconds` or as soon as
+    `batch_size` records are waiting. Beyond `max_buffered` waiting records
+    (e.g. a stalled disk) new records are dropped and counted. Rows older than
+    `retention_days` are deleted once a day. The file is opened on the first
+    write; with several workers each one appends to it.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        batch_size: int = 200,
+        flush_interval_seconds: float = 5,
+        max_buffered: int = 10000,
+        retention_days: int = 90,
+    ):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_buffered = max_buffered
+        self.retention_days = retention_days
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_ms: Optional[float] = None
+        self._buffer: List[UsageRow] = []
+        self._db: Optional[SQLiteDatabase] = None
+        self._open_lock = threading.Lock()
+        self._pruned_day: Optional[str] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def record(
+        self,
+        model: Optional[str],
+        jti: Optional[str] = None,
+        prompt_tokens: int = 0,
+        cached_prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency_seconds: Optional[float] = None,
+        cache_hit: bool = False,
+        error_type: Optional[AIServiceError] = None,
+    ) -> None:
+        """
+        `jti` defaults to the session of the current request or job (set by
+        auth and by the job queue), e.g. for batch items.
+        """
+        if not self.path:
+            return
+        if len(self._buffer) >= self.max_buffered:
+            self.dropped += 1
+            self._wake_writer()
+            return
+        now = time.time()
+        self._buffer.append(
+            (
+                now,
+                time.strftime("%Y-%m-%d", time.gmtime(now)),
+                model,
+                jti if jti is not None else jti_var.get(),
+                prompt_tokens,
+                cached_prompt_tokens,
+                completion_tokens,
+                (
+                    round(latency_seconds * 1000, 2)
+                    if latency_seconds is not None
+                    else None
+                ),
+                int(cache_hit),
+                error_type.value if error_type is not None else None,
+            )
+        )
+        if len(self._buffer) >= self.batch_size:
+            self._wake_writer()
+
+    async def flush(self) -> int:
+        """
+        Writes the buffered records and returns how many were written. On a
+        write error the batch is put back, as far as it fits into the buffer.
+        """
+        if not self._buffer:
+            return 0
+        batch, self._buffer = self._buffer, []
+        started_at = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except (sqlite3.Error, OSError) as e:
+            room = max(0, self.max_buffered - len(self._buffer))
+            self._buffer[:0] = batch[:room]
+            self.dropped += max(0, len(batch) - room)
+            app_logger.warning(f"Could not write {len(batch)} usage records: {e}")
+            return 0
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_flush_ms = round((time.perf_counter() - started_at) * 1000, 2)
+        return len(batch)
+
+    def start(self) -> None:
+        if not self.path or self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_forever(), name="usage-ledger")
+        if len(self._buffer) >= self.batch_size:  # Recorded before the start
+            self._wake_writer()
+        app_logger.info(f"Recording advice usage to {self.path}.")
+
+    async def stop(self) -> None:
+        """
+        Stops the background task after a last flush of the buffered records.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "buffered": self.buffered,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+    def aggregate(
+        self,
+        group_by: Sequence[str] = ("day", "model"),
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        model: Optional[str] = None,
+        prices: Optional[ModelPrices] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Totals of the written records per `group_by` (columns of
+        `GROUP_COLUMNS`), for UTC days from `since` to `until` (inclusive,
+        YYYY-MM-DD). `cost_usd` is computed with `prices` (by model), and is
+        None when a group used a model without a price. Blocking.
+        """
+        sql_columns = list(dict.fromkeys([*group_by, "model"]))
+        where, params = ["1 = 1"], []
+        for clause, value in (("day >= ?", since), ("day <= ?", until)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        if model:
+            where.append("model = ?")
+            params.append(model)
+        columns = ", ".join(sql_columns)
+        db = self._database()
+        with db.lock:
+            rows = (
+                db.connection()
+                .execute(
+                    f"SELECT {columns}, COUNT(*), SUM(cache_hit), "
+                    "SUM(error_type IS NOT NULL), SUM(prompt_tokens), "
+                    "SUM(cached_prompt_tokens), SUM(completion_tokens), "
+                    "SUM(latency_ms), COUNT(latency_ms) FROM usage_ledger "
+                    f"WHERE {' AND '.join(where)} GROUP BY {columns} ORDER BY {columns}",
+                    params,
+                )
+                .fetchall()
+            )
+
+        prices = prices or {}
+        groups: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+        for row in rows:
+            keys = dict(zip(sql_columns, row))
+            (
+                requests,
+                cache_hits,
+                errors,
+                prompt_tokens,
+                cached_prompt_tokens,
+                completion_tokens,
+                latency_ms_sum,
+                latency_count,
+            ) = row[len(sql_columns) :]
+            group = groups.setdefault(
+                tuple(keys[column] for column in group_by),
+                {
+                    **{column: keys[column] for column in group_by},
+                    "requests": 0,
+                    "cache_hits": 0,
+                    "errors": 0,
+                    "prompt_tokens": 0,
+                    "cached_prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost_usd": 0.0,
+                    "_latency_ms_sum": 0.0,
+                    "_latency_count": 0,
+                },
+            )
+            group["requests"] += requests
+            group["cache_hits"] += cache_hits
+            group["errors"] += errors
+            group["prompt_tokens"] += prompt_tokens
+            group["cached_prompt_tokens"] += cached_prompt_tokens
+            group["completion_tokens"] += completion_tokens
+            group["_latency_ms_sum"] += latency_ms_sum or 0
+            group["_latency_count"] += latency_count
+            cost = completion_cost(
+                prices.get(keys["model"]),
+                prompt_tokens,
+                cached_prompt_tokens,
+                completion_tokens,
+            )
+            if cost is None and prompt_tokens + completion_tokens > 0:
+                group["cost_usd"] = None
+            elif group["cost_usd"] is not None:
+                group["cost_usd"] += cost or 0
+
+        results = []
+        for group in groups.values():
+            latency_ms_sum = group.pop("_latency_ms_sum")
+            latency_count = group.pop("_latency_count")
+            group["avg_latency_ms"] = (
+                round(latency_ms_sum / latency_count, 2) if latency_count else None
+            )
+            if group["cost_usd"] is not None:
+                group["cost_usd"] = round(group["cost_usd"], 6)
+            results.append(group)
+        return results
+
+    def _wake_writer(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _flush_forever(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self.flush_interval_seconds
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _database(self) -> SQLiteDatabase:
+        with self._open_lock:
+            if self._db is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._db = SQLiteDatabase(self.path, LEDGER_SCHEMA)
+        return self._db
+
+    def _write(self, rows: List[UsageRow]) -> None:
+        db = self._database()
+        today = rows[-1][1]
+        with db.lock, transaction(db.connection()) as conn:
+            conn.executemany(
+                "INSERT INTO usage_ledger VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            if self.retention_days > 0 and self._pruned_day != today:
+                oldest = datetime.now(timezone.utc) - timedelta(
+                    days=self.retention_days
+                )
+                conn.execute(
+                    "DELETE FROM usage_ledger WHERE day < ?",
+                    (oldest.strftime("%Y-%m-%d"),),
+                )
+                self._pruned_day = today
+
+
+DEFAULT_LEDGER_FILE = LOG_DIR / "usage-ledger.db"
+
+usage_ledger = UsageLedger(
+    (
+        (settings.USAGE_LEDGER_SQLITE_PATH or str(DEFAULT_LEDGER_FILE))
+        if settings.USAGE_LEDGER_ENABLED
+        else None
+    ),
+    batch_size=settings.USAGE_LEDGER_BATCH_SIZE,
+    flush_interval_seconds=settings.USAGE_LEDGER_FLUSH_INTERVAL_SECONDS,
+    max_buffered=settings.USAGE_LEDGER_MAX_BUFFERED,
+    retention_days=settings.USAGE_LEDGER_RETENTION_DAYS,
+)
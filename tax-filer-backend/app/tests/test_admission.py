@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.core.shared_state import SharedState
+from app.services.admission import AdmissionController, AdmissionRejectedError
+
+
+def make_controller(**overrides):
+    options = dict(
+        max_concurrency=4,
+        max_concurrency_per_session=1,
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_wait_seconds=0,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+@pytest.mark.asyncio
+async def test_session_cannot_take_more_than_its_share():
+    controller = make_controller()
+
+    async with controller.admit("session-a", 100):
+        with pytest.raises(AdmissionRejectedError):
+            async with controller.admit("session-a", 100):
+                pass
+        async with controller.admit("session-b", 100):  # Other sessions still get in
+            assert controller.stats()["in_flight"] == 2
+
+    stats = controller.stats()
+    assert stats["in_flight"] == 0 and stats["active_sessions"] == 0
+    assert stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_when_a_slot_frees_up():
+    controller = make_controller(max_concurrency=1, max_wait_seconds=1)
+    order = []
+
+    async def call(name):
+        async with controller.admit(name, 10):
+            order.append(name)
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(call("a"), call("b"))
+    assert order == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_token_budget_exhaustion_fails_fast_with_retry_after():
+    controller = make_controller(tokens_per_minute=600)
+    tokens = 100 + 350  # Prompt + max completion tokens
+
+    async with controller.admit("session-a", tokens):
+        pass
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        async with controller.admit("session-b", tokens):
+            pass
+    # 150 tokens left, 300 missing at 10 tokens/s
+    assert exc_info.value.retry_after == 30
+
+
+@pytest.mark.asyncio
+async def test_max_wait_override_only_shortens_the_wait():
+    controller = make_controller(max_concurrency=1, max_wait_seconds=5)
+
+    async with controller.admit("session-a", 10):
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(AdmissionRejectedError):
+            async with controller.admit("session-b", 10, max_wait_seconds=0.05):
+                pass
+        assert asyncio.get_running_loop().time() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_rate_budget_is_shared_between_workers(tmp_path):
+    state = SharedState(str(tmp_path / "shared-state.db"))
+    worker_a = make_controller(requests_per_minute=1, shared_state=state)
+    worker_b = make_controller(requests_per_minute=1, shared_state=state)
+
+    async with worker_a.admit("session-a", 10):
+        pass
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        async with worker_b.admit("session-b", 10):
+            pass
+    assert exc_info.value.retry_after == 60
+
+
+@pytest.mark.asyncio
+async def test_requests_rejected_for_a_slot_spend_no_rate_budget():
+    controller = make_controller(max_concurrency=1, requests_per_minute=2)
+
+    async with controller.admit("session-a", 10):
+        with pytest.raises(AdmissionRejectedError):
+            async with controller.admit("session-b", 10):
+                pass
+    async with controller.admit("session-b", 10):  # The second request is left
+        pass
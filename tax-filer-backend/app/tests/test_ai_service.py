@@ -0,0 +1,456 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from openai import APIConnectionError, NotFoundError
+import pytest
+
+from app.core.shared_state import SharedState
+from app.models import AIServiceError, TaxInfoInput
+from app.services import ai_service
+from app.services.admission import AdmissionController, AdmissionRejectedError
+from app.services.advice_cache import (
+    SHARED_NAMESPACE,
+    AdviceCache,
+    IncomeBands,
+    TTLCache,
+    make_cache_key,
+)
+from app.services.model_router import ModelRouter
+from app.services.usage_ledger import UsageLedger
+
+
+def make_completion(content: str = "Mocked advice", completion_id: str = "cmpl-1"):
+    return SimpleNamespace(
+        id=completion_id,
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=120, completion_tokens=42),
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_advice_cache():
+    ai_service.advice_cache.clear()
+    yield
+    ai_service.advice_cache.clear()
+
+
+@pytest.fixture
+def mock_completion_create(mocker):
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(
+        return_value=make_completion()
+    )
+    mocker.patch.object(ai_service, "client", fake_client)
+    return fake_client.chat.completions.create
+
+
+@pytest.mark.asyncio
+async def test_repeated_input_is_served_from_cache(mock_completion_create):
+    first = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=50000, expenses=1000, country="gr")
+    )
+    second = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=50000.0, expenses=1000.0, deductions=0, country=" GR ")
+    )
+
+    assert first.success and not first.cached
+    assert second.success and second.cached
+    assert second.content == first.content
+    assert mock_completion_create.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_error_responses_are_not_cached(mocker):
+    mocker.patch.object(ai_service, "get_openai_client", return_value=None)
+    tax_input = TaxInfoInput(income=50000, expenses=1000, country="GR")
+    stores_before = ai_service.advice_cache.stats()["stores"]
+
+    first = await ai_service.get_tax_advice_from_ai(tax_input)
+    second = await ai_service.get_tax_advice_from_ai(tax_input)
+
+    assert first.error_type == AIServiceError.CONFIG_ERROR
+    assert not second.cached
+    assert ai_service.advice_cache.stats()["stores"] == stores_before
+
+
+@pytest.mark.asyncio
+async def test_fallback_advice_when_client_is_unavailable(mocker):
+    mocker.patch.object(ai_service, "get_openai_client", return_value=None)
+    tax_input = TaxInfoInput(income=50000, expenses=1000, country="USA")
+
+    response = await ai_service.get_tax_advice_from_ai(tax_input)
+
+    assert response.success and response.degraded
+    assert response.error_type == AIServiceError.CONFIG_ERROR
+    assert "49,000.00 USD" in response.content  # Filled in with the user's numbers
+
+    mocker.patch.object(ai_service.settings, "AI_FALLBACK_ENABLED", False)
+    response = await ai_service.get_tax_advice_from_ai(tax_input)
+    assert not response.success and not response.degraded
+
+
+@pytest.mark.asyncio
+async def test_fallback_advice_when_admission_is_rejected(mocker):
+    mocker.patch.object(
+        ai_service,
+        "_fetch_and_cache_advice",
+        side_effect=AdmissionRejectedError("global concurrency limit reached", 1.0),
+    )
+    tax_input = TaxInfoInput(income=50000, expenses=1000, country="GR")
+
+    response = await ai_service.get_tax_advice_from_ai(tax_input)
+
+    assert response.degraded
+    assert response.error_type == AIServiceError.API_LIMIT_EXCEEDED
+    mocker.patch.object(ai_service.settings, "AI_FALLBACK_ON_ERRORS", "CONFIG_ERROR")
+    with pytest.raises(AdmissionRejectedError):
+        await ai_service.get_tax_advice_from_ai(tax_input)
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_fallback_advice_when_client_is_unavailable(mocker):
+    mocker.patch.object(ai_service, "get_openai_client", return_value=None)
+    tax_input = TaxInfoInput(income=30000, expenses=0, country="GB")
+
+    events = [e async for e in ai_service.stream_tax_advice_from_ai(tax_input)]
+
+    assert [e["event"] for e in events] == ["delta", "done"]
+    assert "GBP" in events[0]["data"]["content"]
+    assert events[-1]["data"]["degraded"] is True
+    assert events[-1]["data"]["error_type"] == AIServiceError.CONFIG_ERROR
+
+
+def test_cache_key_depends_on_model_and_prompt_version():
+    tax_input = TaxInfoInput(income=50000, expenses=1000, country="GR")
+
+    assert make_cache_key(tax_input, "model-a", "1") != make_cache_key(
+        tax_input, "model-b", "1"
+    )
+    assert make_cache_key(tax_input, "model-a", "1") != make_cache_key(
+        tax_input, "model-a", "2"
+    )
+
+
+def test_income_bands_are_log_scale():
+    bands = IncomeBands(base=1.25, floor=1000)
+
+    assert [bands.index(v) for v in (0, 999.99, 1000, 1249.99, 1250)] == [0, 1, 2, 2, 3]
+    lower, upper = bands.bounds(bands.index(50000))
+    assert lower <= 50000 < upper and upper == lower * 1.25
+    assert bands.index(bands.representative(bands.index(50000))) == bands.index(50000)
+
+
+@pytest.mark.asyncio
+async def test_banded_mode_shares_advice_within_a_band(mocker, mock_completion_create):
+    mocker.patch.object(ai_service.settings, "AI_CACHE_MODE", "banded")
+
+    first = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=50000, expenses=1000, country="USA")
+    )
+    second = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=50500.55, expenses=1010, country="usa")
+    )
+
+    assert mock_completion_create.await_count == 1
+    assert second.cached
+    assert first.content.startswith("Your figures for USA: income 50,000.00 USD")
+    assert second.content.startswith("Your figures for usa: income 50,500.55 USD")
+    assert first.content.endswith("Mocked advice")
+    prompt = mock_completion_create.await_args.kwargs["messages"][-1]["content"]
+    assert "50,000.00" not in prompt  # Only the band ranges reach the model
+    assert ai_service.get_ai_service_stats()["cache"]["mode"] == "banded"
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_entries=2, ttl_seconds=60, eviction_policy="lru")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" becomes the least recently used entry
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_unreadable_shared_cache_entries_are_misses(tmp_path):
+    shared_state = SharedState(str(tmp_path / "shared-state.db"))
+    cache = AdviceCache(shared_state=shared_state)
+    shared_state.set(SHARED_NAMESPACE, "old", '{"success": "maybe"}', 60)
+    shared_state.set(SHARED_NAMESPACE, "corrupt", "{not json", 60)
+
+    assert await cache.get("old") is None
+    assert await cache.get("corrupt") is None
+    assert cache.stats()["misses"] == 2
+    assert shared_state.get(SHARED_NAMESPACE, "old") is None  # Deleted
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_completion(mocker):
+    async def slow_completion(**kwargs):
+        await asyncio.sleep(0.05)
+        return make_completion("Shared advice")
+
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(side_effect=slow_completion)
+    mocker.patch.object(ai_service, "client", fake_client)
+    mocker.patch.object(ai_service.settings, "AI_CACHE_ENABLED", False)
+    tax_input = TaxInfoInput(income=42000, expenses=500, country="DE")
+
+    waiters = [
+        asyncio.ensure_future(ai_service.get_tax_advice_from_ai(tax_input))
+        for _ in range(5)
+    ]
+    await asyncio.sleep(0.01)
+    waiters[0].cancel()  # Cancelling one waiter must not abort the shared call
+    results = await asyncio.gather(*waiters[1:])
+
+    assert fake_client.chat.completions.create.await_count == 1
+    assert all(r.success and r.content == "Shared advice" for r in results)
+    assert ai_service.inflight_requests.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_every_request_is_recorded_in_the_usage_ledger(
+    mocker, tmp_path, mock_completion_create
+):
+    ledger = UsageLedger(str(tmp_path / "usage.db"))
+    mocker.patch.object(ai_service, "usage_ledger", ledger)
+    tax_input = TaxInfoInput(income=61000, expenses=0, country="USA")
+
+    await ai_service.get_tax_advice_from_ai(tax_input, session_id="jti-1")
+    await ai_service.get_tax_advice_from_ai(tax_input, session_id="jti-2")
+    mocker.patch.object(ai_service, "get_openai_client", return_value=None)
+    await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=1, expenses=0, country="USA"), session_id="jti-2"
+    )
+    await ledger.flush()
+
+    rows = {row["jti"]: row for row in ledger.aggregate(("jti",))}
+    assert rows["jti-1"]["prompt_tokens"] == 120  # From completion.usage
+    assert rows["jti-1"]["completion_tokens"] == 42
+    assert rows["jti-1"]["avg_latency_ms"] is not None
+    assert rows["jti-2"]["requests"] == 2
+    assert rows["jti-2"]["cache_hits"] == 1
+    assert rows["jti-2"]["errors"] == 1  # CONFIG_ERROR, answered from the fallback
+    assert rows["jti-2"]["prompt_tokens"] == 0
+
+
+def make_stream_chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(
+        id="cmpl-stream", choices=choices if content else [], usage=usage
+    )
+
+
+class FakeStream:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_stream_emits_deltas_then_done_and_caches(mocker):
+    usage = SimpleNamespace(prompt_tokens=100, completion_tokens=2, total_tokens=102)
+    stream = FakeStream(
+        [
+            make_stream_chunk("Hello "),
+            make_stream_chunk("GR"),
+            make_stream_chunk(usage=usage),
+        ]
+    )
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(return_value=stream)
+    mocker.patch.object(ai_service, "client", fake_client)
+    tax_input = TaxInfoInput(income=30000, expenses=0, country="GR")
+
+    events = [e async for e in ai_service.stream_tax_advice_from_ai(tax_input)]
+
+    assert [e["event"] for e in events] == ["delta", "delta", "done"]
+    assert events[-1]["data"]["usage"]["completion_tokens"] == 2
+    assert stream.closed
+    cached = await ai_service.get_tax_advice_from_ai(tax_input)
+    assert cached.cached and cached.content == "Hello GR"
+
+
+@pytest.mark.asyncio
+async def test_stream_maps_midstream_errors(mocker):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    stream = FakeStream(
+        [make_stream_chunk("Partial")], error=APIConnectionError(request=request)
+    )
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(return_value=stream)
+    mocker.patch.object(ai_service, "client", fake_client)
+    tax_input = TaxInfoInput(income=30000, expenses=0, country="GR")
+
+    events = [e async for e in ai_service.stream_tax_advice_from_ai(tax_input)]
+
+    assert [e["event"] for e in events] == ["delta", "error"]
+    assert events[-1]["data"]["error_type"] == AIServiceError.API_CONN_ERROR
+    assert ai_service.advice_cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_banded_stream_holds_the_header_back_until_upstream_content(mocker):
+    mocker.patch.object(ai_service.settings, "AI_CACHE_MODE", "banded")
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(
+        side_effect=APIConnectionError(request=request)
+    )
+    mocker.patch.object(ai_service, "client", fake_client)
+    upstream = ai_service.upstreams[ai_service.settings.OPENAI_MODEL_NAME]
+    mocker.patch.object(upstream.retry_policy, "base_delay_seconds", 0)
+    tax_input = TaxInfoInput(income=41000, expenses=0, country="GR")
+
+    events = [e async for e in ai_service.stream_tax_advice_from_ai(tax_input)]
+
+    assert [e["event"] for e in events] == ["delta", "done"]  # No header first
+    assert events[-1]["data"]["degraded"] is True
+
+    fake_client.chat.completions.create = mocker.AsyncMock(
+        return_value=FakeStream([make_stream_chunk("Banded advice")])
+    )
+    events = [e async for e in ai_service.stream_tax_advice_from_ai(tax_input)]
+
+    assert [e["event"] for e in events] == ["delta", "delta", "done"]
+    assert events[0]["data"]["content"].startswith("Your figures for GR")
+    assert events[1]["data"]["content"] == "Banded advice"
+
+
+@pytest.mark.asyncio
+async def test_connection_errors_are_retried(mocker):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(
+        side_effect=[APIConnectionError(request=request), make_completion("Retried")]
+    )
+    mocker.patch.object(ai_service, "client", fake_client)
+    upstream = ai_service.upstreams[ai_service.settings.OPENAI_MODEL_NAME]
+    mocker.patch.object(upstream.retry_policy, "base_delay_seconds", 0)
+    retries_before = upstream.retries
+
+    response = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=70000, expenses=0, country="FR")
+    )
+
+    assert response.success and response.content == "Retried"
+    assert upstream.retries == retries_before + 1
+
+
+@pytest.mark.asyncio
+async def test_each_attempt_is_admitted_and_backoff_holds_no_slot(mocker):
+    controller = AdmissionController(
+        max_concurrency=1,
+        max_concurrency_per_session=1,
+        requests_per_minute=10,
+        tokens_per_minute=0,
+        max_wait_seconds=1,
+    )
+    mocker.patch.object(ai_service, "admission_controller", controller)
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(
+        side_effect=[APIConnectionError(request=request), make_completion("Retried")]
+    )
+    mocker.patch.object(ai_service, "client", fake_client)
+    in_flight_during_backoff = []
+
+    async def backoff(seconds):
+        in_flight_during_backoff.append(controller.in_flight)
+
+    mocker.patch("app.services.resilience.asyncio.sleep", side_effect=backoff)
+
+    response = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=71000, expenses=0, country="FR"), session_id="jti-1"
+    )
+
+    assert response.success and response.content == "Retried"
+    assert in_flight_during_backoff == [0]
+    assert controller.admitted == 2  # One request from the RPM budget per attempt
+    assert controller.request_bucket.wait_time(9) > 0
+    assert controller.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_next_model_on_not_found(mocker):
+    router = ModelRouter(["model-a", "model-b"], latency_slo_seconds=5)
+    mocker.patch.object(ai_service, "model_router", router)
+    mocker.patch.object(
+        ai_service,
+        "upstreams",
+        {model: ai_service._build_upstream() for model in router.models},
+    )
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+    async def create(**params):
+        if params["model"] == "model-a":
+            raise NotFoundError(
+                "model not found",
+                response=httpx.Response(404, request=request),
+                body={"message": "model not found"},
+            )
+        return make_completion("Fallback advice")
+
+    fake_client = mocker.MagicMock()
+    fake_client.chat.completions.create = mocker.AsyncMock(side_effect=create)
+    mocker.patch.object(ai_service, "client", fake_client)
+
+    response = await ai_service.get_tax_advice_from_ai(
+        TaxInfoInput(income=80000, expenses=0, country="IT")
+    )
+
+    assert response.success and response.model == "model-b"
+    assert router.candidates() == ["model-b", "model-a"]  # model-a is cooling down
+    assert not router.routing_table()[0].healthy
+
+
+def test_model_router_prefers_fastest_model_within_slo():
+    router = ModelRouter(["primary", "fast", "slow"], latency_slo_seconds=2)
+    router.record_success("primary", 1.5)
+    router.record_success("fast", 0.4)
+    router.record_success("slow", 3.0)
+
+    assert router.candidates() == ["fast", "primary", "slow"]
+
+
+def test_openai_client_uses_configured_transport(mocker):
+    mocker.patch.object(ai_service.settings, "OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+    mocker.patch.object(ai_service.settings, "OPENAI_MAX_CONNECTIONS", 7)
+    limits = mocker.spy(ai_service.httpx, "Limits")
+
+    openai_client = ai_service.build_openai_client()
+
+    assert str(openai_client.base_url) == "http://127.0.0.1:9/v1/"
+    assert openai_client.max_retries == 0
+    assert limits.call_args.kwargs["max_connections"] == 7
+
+
+@pytest.mark.asyncio
+async def test_warm_up_tolerates_failures(mocker):
+    request = httpx.Request("GET", "https://api.openai.com/v1/models")
+    fake_client = mocker.MagicMock()
+    fake_client.models.list = mocker.AsyncMock(
+        side_effect=[[], APIConnectionError(request=request), []]
+    )
+
+    opened = await ai_service.warm_up_openai_client(fake_client, connections=3)
+
+    assert opened == 2
+    assert fake_client.models.list.await_count == 3
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+import time
+
+from httpx import ASGITransport, AsyncClient
+from jose import jwt
+import pytest
+
+from app.core.config import settings
+from app.main import app
+from app.utils.auth_utils import (
+    BloomFilter,
+    RevocationList,
+    SQLiteRevocationStore,
+    VerifiedTokenCache,
+    create_access_token,
+    decode_access_token,
+    verified_token_cache,
+)
+
+
+def test_decode_access_token_serves_repeat_tokens_from_cache(mocker):
+    token = create_access_token({"sub": "anonymous"})
+    decode = mocker.patch("app.utils.auth_utils.jwt.decode", wraps=jwt.decode)
+
+    first = decode_access_token(token)
+    first["sub"] = "modified"  # Callers get their own copy
+    second = decode_access_token(token)
+
+    assert decode.call_count == 1
+    assert second["sub"] == "anonymous"
+    assert second["jti"] == first["jti"]
+
+
+def test_decode_access_token_rejects_invalid_tokens():
+    token = create_access_token({"sub": "anonymous"})
+    assert decode_access_token(token[:-2] + "xx") is None
+    assert decode_access_token("not-a-jwt") is None
+
+
+def test_verified_token_cache_respects_exp_size_and_revocation():
+    cache = VerifiedTokenCache(max_entries=2)
+    now = time.time()
+    cache.set("expired", {"jti": "a", "exp": now - 1})
+    cache.set("no-exp", {"jti": "b"})
+    assert cache.get("expired") is None
+    assert cache.get("no-exp") is None
+
+    cache.set("t1", {"jti": "j1", "exp": now + 60})
+    cache.set("t2", {"jti": "j2", "exp": now + 60})
+    cache.get("t1")  # t1 is now the most recently used
+    cache.set("t3", {"jti": "j3", "exp": now + 60})
+    assert cache.get("t2") is None
+    assert cache.get("t1")["jti"] == "j1"
+    assert cache.evictions == 1
+
+    assert cache.revoke("j1") == 1
+    assert cache.get("t1") is None
+    assert len(cache) == 1
+
+
+def test_cached_token_is_not_served_from_its_exp_on(mocker):
+    token = create_access_token({"sub": "anonymous"}, timedelta(minutes=5))
+    payload = decode_access_token(token)
+
+    mocker.patch("app.utils.auth_utils.time.time", return_value=payload["exp"] - 0.5)
+    assert verified_token_cache.get(token) is not None
+    mocker.patch("app.utils.auth_utils.time.time", return_value=payload["exp"])
+    assert verified_token_cache.get(token) is None
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+
+    assert all(bloom.might_contain(f"jti-{i}") for i in range(1000))
+    false_positives = sum(bloom.might_contain(f"other-{i}") for i in range(10000))
+    assert false_positives < 300  # ~1% expected
+
+
+def test_revocation_list_prunes_after_exp_and_grows():
+    revocations = RevocationList(initial_capacity=4)
+    now = time.time()
+    for i in range(10):
+        revocations.revoke(f"jti-{i}", now + 60)
+    revocations.revoke("expired", now - 1)
+
+    assert all(revocations.is_revoked(f"jti-{i}") for i in range(10))
+    assert not revocations.is_revoked("expired")
+    assert not revocations.is_revoked("jti-unknown")
+    assert revocations.prune() == 1
+    assert len(revocations) == 10
+
+
+def test_sqlite_revocation_store_returns_only_new_rows(tmp_path):
+    path = str(tmp_path / "revocations.db")
+    writer, reader = SQLiteRevocationStore(path), SQLiteRevocationStore(path)
+    writer.add("jti-1", time.time() + 60)
+    writer.add("jti-old", time.time() - 1)
+
+    rows, seq = reader.load_since(0)
+    assert [jti for jti, _ in rows] == ["jti-1"]
+    writer.add("jti-2", time.time() + 60)
+    rows, _ = reader.load_since(seq)
+    assert [jti for jti, _ in rows] == ["jti-2"]
+
+
+@pytest.mark.asyncio
+async def test_revoke_endpoint_rejects_cached_token(mocker):
+    token = create_access_token({"sub": "anonymous"})
+    jti = decode_access_token(token)["jti"]  # Now in the verified-token cache
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testclient") as client:
+        response = await client.post("/api/v1/token/revoke", json={"jti": jti})
+        assert response.status_code == 404  # No ADMIN_API_KEY configured
+
+        mocker.patch.object(settings, "ADMIN_API_KEY", "admin-secret")
+        response = await client.post(
+            "/api/v1/token/revoke",
+            json={"jti": jti},
+            headers={"X-Admin-Key": "wrong"},
+        )
+        assert response.status_code == 401
+
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+        response = await client.post(
+            "/api/v1/token/revoke",
+            json={"jti": jti, "expires_at": expires_at.isoformat()},
+            headers={"X-Admin-Key": "admin-secret"},
+        )
+        assert response.status_code == 200
+        assert response.json()["jti"] == jti
+
+        response = await client.post(
+            "/api/v1/tax/submit-advice",
+            json={"income": 50000, "expenses": 1000, "country": "USA"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert response.status_code == 401
+    assert decode_access_token(token) is None
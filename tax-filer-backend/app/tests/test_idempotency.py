@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.core.shared_state import SharedState
+from app.services.idempotency import (
+    IdempotencyKeyInProgressError,
+    IdempotencyKeyReusedError,
+    IdempotencyStore,
+)
+
+
+@pytest.mark.asyncio
+async def test_idempotency_store_attaches_to_in_flight_request():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "advice"
+
+    results = await asyncio.gather(
+        store.run("jti", "key", "body", compute, should_store=bool),
+        store.run("jti", "key", "body", compute, should_store=bool),
+    )
+    assert calls == 1
+    assert results == [("advice", False), ("advice", True)]
+    assert await store.run("jti", "key", "body", compute, bool) == ("advice", True)
+    assert await store.run("other-jti", "key", "body", compute, bool) == (
+        "advice",
+        False,
+    )
+    with pytest.raises(IdempotencyKeyReusedError):
+        await store.run("jti", "key", "other-body", compute, bool)
+
+
+@pytest.mark.asyncio
+async def test_idempotency_keys_are_shared_between_workers(tmp_path):
+    shared_state = SharedState(str(tmp_path / "shared-state.db"))
+    first, second = (
+        IdempotencyStore(max_entries=10, ttl_seconds=60, shared_state=shared_state)
+        for _ in range(2)
+    )
+    release = asyncio.Event()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "advice"
+
+    def run(store, body="body"):
+        return store.run("jti", "key", body, compute, bool, encode=str, decode=str)
+
+    running = asyncio.create_task(run(first))
+    await asyncio.sleep(0.05)
+    assert await second.seen("jti", "key", "body")
+    assert not await second.seen("jti", "key", "other-body")
+    with pytest.raises(IdempotencyKeyInProgressError):
+        await run(second)
+
+    release.set()
+    assert await running == ("advice", False)
+    assert await run(second) == ("advice", True)
+    assert calls == 1
+    with pytest.raises(IdempotencyKeyReusedError):
+        await run(IdempotencyStore(10, 60, shared_state), body="other-body")
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from app.models import AIServiceError, AIServiceResponse, JobStatus, TaxInfoInput
+from app.services import ai_service
+from app.services.job_queue import AdviceJobQueue, QueueFullError
+from app.services.usage_ledger import UsageLedger
+
+TAX_INPUT = TaxInfoInput(income=50000, expenses=1000, country="GR")
+
+
+async def wait_for_job(queue: AdviceJobQueue, job_id: str, owner: str = "jti"):
+    for _ in range(100):
+        job = queue.get(job_id, owner=owner)
+        if job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+@pytest.mark.asyncio
+async def test_job_times_out_and_result_expires(mocker):
+    mocker.patch("app.services.fallback_advice.settings.AI_FALLBACK_ENABLED", False)
+
+    async def slow_handler(tax_input, session_id):
+        await asyncio.sleep(1)
+
+    queue = AdviceJobQueue(
+        slow_handler, workers=1, job_timeout_seconds=0.05, result_ttl_seconds=0.05
+    )
+    job = await queue.submit(TAX_INPUT, owner="jti")
+    finished = await wait_for_job(queue, job.job_id)
+
+    assert finished.status == JobStatus.FAILED
+    assert finished.result.error_type == AIServiceError.TIMEOUT
+    await asyncio.sleep(0.06)
+    assert queue.get(job.job_id, owner="jti") is None
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_job_gets_fallback_advice():
+    async def slow_handler(tax_input, session_id):
+        await asyncio.sleep(1)
+
+    queue = AdviceJobQueue(slow_handler, workers=1, job_timeout_seconds=0.05)
+    job = await queue.submit(TAX_INPUT, owner="jti")
+    finished = await wait_for_job(queue, job.job_id)
+
+    assert finished.status == JobStatus.SUCCEEDED
+    assert finished.result.degraded is True
+    assert finished.result.error_type == AIServiceError.TIMEOUT
+    assert "50,000.00" in finished.result.content
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_queue_rejects_jobs_beyond_max_depth_and_reports_age():
+    release = asyncio.Event()
+
+    async def blocked_handler(tax_input, session_id):
+        await release.wait()
+        return AIServiceResponse(success=True, content="Advice")
+
+    queue = AdviceJobQueue(blocked_handler, max_depth=1, workers=1)
+    running = await queue.submit(TAX_INPUT, owner="jti")
+    await asyncio.sleep(0.01)  # Let the worker pick up the first job
+    queued = await queue.submit(TAX_INPUT, owner="jti")
+    with pytest.raises(QueueFullError):
+        await queue.submit(TAX_INPUT, owner="jti")
+
+    stats = queue.stats()
+    assert stats.depth == 1 and stats.running == 1
+    assert stats.oldest_queued_age_seconds >= 0
+
+    release.set()
+    assert (await wait_for_job(queue, running.job_id)).status == JobStatus.SUCCEEDED
+    assert (await wait_for_job(queue, queued.job_id)).result.content == "Advice"
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_requeues_unfinished_jobs(tmp_path):
+    async def interrupted_handler(tax_input, session_id):
+        await asyncio.sleep(1)
+
+    db_path = str(tmp_path / "jobs.db")
+    first = AdviceJobQueue(interrupted_handler, workers=1, sqlite_path=db_path)
+    job = await first.submit(TAX_INPUT, owner="jti")
+    await asyncio.sleep(0.01)
+    await first.stop()  # Simulate a restart while the job is running
+
+    async def handler(tax_input, session_id):
+        return AIServiceResponse(success=True, content="Restored advice")
+
+    second = AdviceJobQueue(handler, workers=1, sqlite_path=db_path)
+    await second.start()
+    finished = await wait_for_job(second, job.job_id)
+
+    assert finished.result.content == "Restored advice"
+    await second.stop()
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_store_see_and_take_over_each_others_jobs(tmp_path):
+    async def stalled_handler(tax_input, session_id):
+        await asyncio.sleep(10)
+
+    async def handler(tax_input, session_id):
+        return AIServiceResponse(success=True, content="Advice from another worker")
+
+    db_path = str(tmp_path / "jobs.db")
+    first = AdviceJobQueue(
+        stalled_handler, workers=1, sqlite_path=db_path, lease_seconds=0.15
+    )
+    second = AdviceJobQueue(handler, workers=1, sqlite_path=db_path, lease_seconds=0.15)
+    await second.start()
+    job = await first.submit(TAX_INPUT, owner="jti")
+    await asyncio.sleep(0.01)
+
+    seen = await second.lookup(job.job_id, owner="jti")
+    assert seen.status == JobStatus.RUNNING
+    assert await second.lookup(job.job_id, owner="other-jti") is None
+
+    for task in [*first._workers, first._lease_task]:  # The first worker dies
+        task.cancel()
+    for _ in range(100):
+        finished = await second.lookup(job.job_id, owner="jti")
+        if finished.status == JobStatus.SUCCEEDED:
+            break
+        await asyncio.sleep(0.02)
+    assert finished.result.content == "Advice from another worker"
+    await second.stop()
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_recorded_in_the_usage_ledger_for_their_owner(mocker, tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.db"))
+    mocker.patch.object(ai_service, "usage_ledger", ledger)
+    mocker.patch.object(ai_service, "get_openai_client", return_value=None)
+
+    queue = AdviceJobQueue(ai_service.get_tax_advice_from_ai, workers=1)
+    job = await queue.submit(TAX_INPUT, owner="jti-1")
+    await wait_for_job(queue, job.job_id, owner="jti-1")
+    await ledger.flush()
+
+    (row,) = ledger.aggregate(("jti",))
+    assert row["jti"] == "jti-1"
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_their_owners_session(mocker):
+    handler = mocker.AsyncMock(
+        return_value=AIServiceResponse(success=True, content="Advice")
+    )
+    queue = AdviceJobQueue(handler, workers=1)
+
+    job = await queue.submit(TAX_INPUT, owner="jti-1")
+    await wait_for_job(queue, job.job_id, owner="jti-1")
+
+    handler.assert_awaited_once_with(TAX_INPUT, "jti-1")  # Per-session admission
+    await queue.stop()
@@ -0,0 +1,169 @@
+import json
+import logging
+import time
+
+from app.core.logging_config import (
+    CustomFormatter,
+    JSONLogFormatter,
+    LazyRotatingFileHandler,
+    LogPipeline,
+    LogSampler,
+    QueueLogHandler,
+)
+from app.middleware.request_id_middleware import jti_var, request_id_var, route_var
+from app.models import AIServiceError
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(CustomFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def make_logger(pipeline: LogPipeline, name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.handlers = [QueueLogHandler(pipeline)]
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_log_pipeline_writes_off_thread_with_request_id():
+    target = ListHandler()
+    pipeline = LogPipeline(target)
+    logger = make_logger(pipeline, "test_log_pipeline_request_id")
+    pipeline.start()
+
+    token = request_id_var.set("rid-42")
+    try:
+        logger.info("advice %s", "served")
+        try:
+            raise ValueError("Mocked failure")
+        except ValueError:
+            logger.error("advice failed", exc_info=True)
+    finally:
+        request_id_var.reset(token)
+    pipeline.stop()  # Flushes everything still queued
+
+    assert "[RID:rid-42]" in target.lines[0]
+    assert target.lines[0].endswith("advice served")
+    assert "[RID:rid-42]" in target.lines[1]
+    assert "ValueError: Mocked failure" in target.lines[1]  # Traceback kept
+
+
+def test_log_pipeline_drops_when_full():
+    target = ListHandler()
+    pipeline = LogPipeline(target, max_size=2, full_policy="drop")
+    logger = make_logger(pipeline, "test_log_pipeline_drop")
+    # Mark as running without a listener thread, so nothing drains the queue
+    pipeline._listener = object()
+
+    for i in range(5):
+        logger.info(f"line {i}")
+
+    assert pipeline.stats() == {"queued": 2, "max_size": 2, "dropped": 3}
+
+
+def test_log_pipeline_writes_synchronously_when_stopped():
+    target = ListHandler()
+    pipeline = LogPipeline(target)
+    logger = make_logger(pipeline, "test_log_pipeline_sync")
+
+    logger.warning("before startup")
+
+    assert len(target.lines) == 1
+    assert "[RID:N/A]" in target.lines[0]
+
+
+def test_log_pipeline_starts_over_after_fork():
+    target = ListHandler()
+    pipeline = LogPipeline(target)
+    logger = make_logger(pipeline, "test_log_pipeline_fork")
+    pipeline._listener = object()  # Thread of the parent process, not running here
+    logger.info("queued in the parent")
+
+    pipeline.after_fork()
+    logger.info("written by the worker")
+    pipeline.start()
+    logger.info("queued by the worker")
+    pipeline.stop()
+
+    assert [line.rsplit("] ", 1)[1] for line in target.lines] == [
+        "written by the worker",
+        "queued by the worker",
+    ]
+
+
+def test_json_log_formatter_includes_request_context():
+    target = ListHandler()
+    target.setFormatter(JSONLogFormatter())
+    logger = make_logger(LogPipeline(target), "test_log_pipeline_json")
+
+    tokens = [
+        (request_id_var, request_id_var.set("rid-7")),
+        (jti_var, jti_var.set("jti-7")),
+        (route_var, route_var.set("POST /api/v1/tax/submit-advice")),
+    ]
+    try:
+        logger.warning(
+            "upstream failed",
+            extra={"error_type": AIServiceError.API_ERROR, "latency_ms": 12.5},
+        )
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+    entry = json.loads(target.lines[0])
+    assert entry["level"] == "WARNING"
+    assert entry["message"] == "upstream failed"
+    assert entry["request_id"] == "rid-7"
+    assert entry["jti"] == "jti-7"
+    assert entry["route"] == "POST /api/v1/tax/submit-advice"
+    assert entry["error_type"] == "API_ERROR"
+    assert entry["latency_ms"] == 12.5
+    assert "elapsed_ms" not in entry  # Outside of a request
+
+
+def test_log_sampler_downsamples_info_but_keeps_warnings():
+    target = ListHandler()
+    logger = make_logger(LogPipeline(target), "test_log_pipeline_sampling")
+    sampler = LogSampler({"jwt_validated": 0.0})
+    logger.handlers[0].addFilter(sampler)
+
+    for _ in range(10):
+        logger.info("JWT validated", extra={"log_key": "jwt_validated"})
+    logger.info("Fetching application info.", extra={"log_key": "app_info"})
+    logger.warning("JWT invalid", extra={"log_key": "jwt_validated"})
+
+    assert len(target.lines) == 2
+    assert target.lines[0].endswith("Fetching application info.")
+    assert target.lines[1].endswith("JWT invalid")
+    assert sampler.sampled_out == 10
+
+
+def test_workers_sharing_a_log_file_rotate_it_once(tmp_path):
+    log_file = tmp_path / "app.log"
+    workers = [
+        LazyRotatingFileHandler(log_file, when="midnight", backupCount=7)
+        for _ in range(2)
+    ]
+
+    def emit(handler, message):
+        handler.emit(logging.makeLogRecord({"msg": message}))
+
+    emit(workers[0], "yesterday 1")
+    emit(workers[1], "yesterday 2")
+    for handler in workers:  # Midnight passes for both
+        handler.rolloverAt = int(time.time()) - 1
+    emit(workers[0], "today 1")
+    emit(workers[1], "today 2")
+    for handler in workers:
+        handler.close()
+
+    (rotated,) = tmp_path.glob("app.log.*[0-9]")
+    assert rotated.read_text().split() == ["yesterday", "1", "yesterday", "2"]
+    assert log_file.read_text().split() == ["today", "1", "today", "2"]
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+import pytest
+
+from app.core.metrics import CallbackMetric, refresh_callback_metrics, render
+from app.main import app
+
+# Records a 2xx request and a completion in flight, as a worker would
+WORKER = (
+    "import os\n"
+    "from app.core.metrics import OPENAI_COMPLETIONS_IN_FLIGHT, record_http_status\n"
+    "for _ in range({requests}): record_http_status(200)\n"
+    "OPENAI_COMPLETIONS_IN_FLIGHT.inc()\n"
+    "print(os.getpid())\n"
+)
+
+
+def run_worker(directory, requests: int) -> int:
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER.format(requests=requests)],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        env={
+            "OPENAI_API_KEY": "x",
+            "JWT_SECRET_KEY": "y",
+            **os.environ,
+            "PROMETHEUS_MULTIPROC_DIR": str(directory),
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(result.stdout)
+
+
+def aggregate(directory) -> str:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, str(directory))
+    return generate_latest(registry).decode()
+
+
+def test_callback_metrics_mirror_service_counters():
+    served = {("TIMEOUT",): 2}
+    CallbackMetric(
+        "test_served_total",
+        "Served.",
+        lambda: served,
+        ("reason",),
+        type_name="counter",
+    )
+    CallbackMetric("test_queue_depth", "Depth.", lambda: {(): 7})
+
+    refresh_callback_metrics()
+    served[("TIMEOUT",)] = 5
+    refresh_callback_metrics()
+    text = render().decode()
+
+    assert 'test_served_total{reason="TIMEOUT"} 5.0' in text
+    assert "test_queue_depth 7.0" in text
+
+
+def test_multiprocess_metrics_are_aggregated(tmp_path):
+    first = run_worker(tmp_path, requests=2)
+    run_worker(tmp_path, requests=3)
+
+    text = aggregate(tmp_path)
+    assert 'http_requests_total{status_class="2xx"} 5.0' in text
+    assert "openai_completions_in_flight 2.0" in text
+
+    multiprocess.mark_process_dead(first, str(tmp_path))  # gunicorn's child_exit
+
+    text = aggregate(tmp_path)
+    assert 'http_requests_total{status_class="2xx"} 5.0' in text  # Counts are kept
+    assert "openai_completions_in_flight 1.0" in text  # Live gauges are dropped
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_request_metrics():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testclient") as client:
+        await client.get("/api/v1/tax/health")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{status_class="2xx"}' in response.text
+    assert "http_request_duration_seconds_bucket" in response.text
+    assert "openai_completions_in_flight" in response.text
+    assert 'ai_advice_requests_total{outcome="API_LIMIT_EXCEEDED"}' in response.text
+    assert "ai_advice_cache_lookups_total" in response.text
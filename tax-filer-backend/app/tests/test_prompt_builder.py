@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app.models import TaxInfoInput
+from app.services.advice_cache import IncomeBands
+from app.services.prompt_builder import (
+    DEFAULT_TEMPLATES_FILE,
+    PromptBuilder,
+    TokenCounter,
+    estimate_tokens,
+)
+
+
+def make_builder(**options) -> PromptBuilder:
+    return PromptBuilder.from_file(
+        DEFAULT_TEMPLATES_FILE, TokenCounter("gpt-4-turbo"), **options
+    )
+
+
+def test_static_prefix_is_byte_identical_and_compact():
+    builder = make_builder()
+
+    first = builder.build(TaxInfoInput(income=50000, expenses=1000, country="USA"))
+    second = builder.build(TaxInfoInput(income=81234.5, expenses=0, country="GBR"))
+
+    assert first.messages[0] == second.messages[0]
+    assert first.messages[0]["role"] == "developer"
+    for message in first.messages:
+        assert all(
+            line == line.strip() and line for line in message["content"].split("\n")
+        )
+    user = first.messages[1]["content"]
+    assert "- Annual income: 50,000.00" in user
+    assert "Estimated tax (" in user  # Local estimate for a covered country
+    assert builder.version.startswith("3-")
+    assert first.total_tokens == first.prompt_tokens + first.max_completion_tokens
+
+
+def test_banded_prompt_only_has_ranges():
+    builder = make_builder()
+    bands = IncomeBands(base=1.25, floor=1000)
+
+    prompt = builder.build(
+        TaxInfoInput(income=50000, expenses=1000, country="USA"), bands
+    )
+
+    user = prompt.messages[1]["content"]
+    assert "50,000.00" not in user
+    assert "ranges only" in user
+    assert "Estimated tax" not in user
+
+
+def test_completion_budget_follows_complexity_and_latency_target():
+    builder = make_builder(min_tokens=100, max_tokens=300, latency_target_seconds=2)
+    simple = TaxInfoInput(income=50000, expenses=0, country="USA")
+    detailed = TaxInfoInput(income=50000, expenses=5000, deductions=800, country="XX")
+
+    assert builder.build(simple).max_completion_tokens == 150
+    assert builder.build(detailed).max_completion_tokens == 300  # No estimate for XX
+
+    for _ in range(5):  # 20 ms per token: 100 tokens fit into the 2 s target
+        builder.pace.observe(4.0, 200)
+    assert builder.build(detailed).max_completion_tokens == 100
+    assert "at most 60 words" in builder.build(detailed).messages[1]["content"]
+
+
+def test_token_estimate_and_message_overhead():
+    counter = TokenCounter("gpt-4-turbo")  # Not loaded: estimates
+
+    assert estimate_tokens("Income: 75,000.50") == 7
+    assert counter.count_messages([{"role": "user", "content": "Hi"}]) == 3 + 3 + 2
+
+
+def test_templates_with_unknown_fields_are_rejected(tmp_path):
+    templates = json.loads(DEFAULT_TEMPLATES_FILE.read_text())
+    templates["figures"].append("- Salary: {salary}")
+    path = tmp_path / "prompt_templates.json"
+    path.write_text(json.dumps(templates))
+
+    with pytest.raises(ValueError, match="salary"):
+        PromptBuilder.from_file(path, TokenCounter("gpt-4-turbo"))
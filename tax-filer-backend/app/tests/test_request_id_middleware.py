@@ -0,0 +1,96 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+import pytest
+
+from app.middleware.request_id_middleware import (
+    RequestIDMiddleware,
+    get_request_id,
+    request_id_var,
+)
+
+
+def make_app(server_timing: bool = False) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/echo")
+    async def echo():
+        return {"request_id": get_request_id()}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk-{i};"
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("Mocked failure")
+
+    app.add_middleware(RequestIDMiddleware, server_timing=server_timing)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_request_id_propagated_and_generated():
+    transport = ASGITransport(app=make_app())
+    async with AsyncClient(transport=transport, base_url="http://testclient") as client:
+        response = await client.get("/echo", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["x-request-id"] == "abc-123"
+        assert response.json()["request_id"] == "abc-123"
+        assert "server-timing" not in response.headers
+
+        response = await client.get("/echo")
+        generated = response.headers["x-request-id"]
+        assert len(generated) == 36
+        assert response.json()["request_id"] == generated
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_is_not_buffered():
+    messages = []
+    request_sent = asyncio.Event()
+
+    async def receive():
+        if request_sent.is_set():  # Never disconnect while the body streams
+            await asyncio.Event().wait()
+        request_sent.set()
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/stream",
+        "raw_path": b"/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"x-request-id", b"stream-1")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    await make_app(server_timing=True)(scope, receive, send)
+
+    start = messages[0]
+    assert (b"x-request-id", b"stream-1") in start["headers"]
+    assert any(name == b"server-timing" for name, _ in start["headers"])
+    bodies = [m["body"] for m in messages[1:] if m.get("body")]
+    assert bodies == [b"chunk-0;", b"chunk-1;", b"chunk-2;"]
+
+
+@pytest.mark.asyncio
+async def test_request_id_reset_when_app_raises():
+    transport = ASGITransport(app=make_app(), raise_app_exceptions=False)
+    async with AsyncClient(transport=transport, base_url="http://testclient") as client:
+        response = await client.get("/boom", headers={"X-Request-ID": "boom-1"})
+    assert response.status_code == 500
+    assert request_id_var.get() is None
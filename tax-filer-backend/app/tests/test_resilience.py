@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    ResilientCaller,
+    RetryPolicy,
+    hedged_call,
+)
+
+
+class TransientError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("transient")
+        self.retry_after = retry_after
+
+
+def make_caller(**overrides):
+    options = dict(
+        retry_policy=RetryPolicy(max_attempts=3, base_delay_seconds=0.001),
+        circuit_breaker=CircuitBreaker(failure_threshold=2, recovery_seconds=60),
+        is_retryable=lambda e: isinstance(e, TransientError),
+        is_upstream_failure=lambda e: isinstance(e, TransientError),
+        retry_after=lambda e: getattr(e, "retry_after", None),
+    )
+    options.update(overrides)
+    return ResilientCaller(**options)
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_honouring_retry_after(mocker):
+    sleep = mocker.patch("app.services.resilience.asyncio.sleep")
+    outcomes = [TransientError(retry_after=0.25), "ok"]
+
+    async def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    caller = make_caller()
+    assert await caller.call(flaky) == "ok"
+    sleep.assert_awaited_once_with(0.25)
+    assert caller.stats()["retries"] == 1
+    assert caller.circuit_breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_short_circuits():
+    calls = 0
+
+    async def down():
+        nonlocal calls
+        calls += 1
+        raise TransientError()
+
+    caller = make_caller(retry_policy=RetryPolicy(max_attempts=1))
+    for _ in range(2):
+        with pytest.raises(TransientError):
+            await caller.call(down)
+    with pytest.raises(CircuitOpenError):
+        await caller.call(down)
+
+    assert calls == 2
+    assert caller.stats()["circuit_state"] == "open"
+    assert caller.stats()["short_circuited"] == 1
+
+
+def test_half_open_probe_closes_circuit_on_success(mocker):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=10)
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    mocker.patch(
+        "app.services.resilience.time.monotonic", return_value=breaker._opened_at + 11
+    )
+    assert breaker.allow_request()  # The probe
+    assert not breaker.allow_request()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_returns_the_faster_answer():
+    delays = [0.5, 0.01]
+    hedges = []
+
+    async def call():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    result = await hedged_call(call, delay=0.02, on_hedge=lambda: hedges.append(1))
+    assert result == 0.01
+    assert hedges == [1]
+
+
+@pytest.mark.asyncio
+async def test_local_rejections_are_not_retried_and_leave_the_breaker_alone():
+    class Rejected(Exception):
+        pass
+
+    async def rejected():
+        raise Rejected()
+
+    caller = make_caller(is_rejected_locally=lambda e: isinstance(e, Rejected))
+    caller.circuit_breaker.record_failure()
+    with pytest.raises(Rejected):
+        await caller.call(rejected)
+
+    assert caller.stats()["retries"] == 0
+    assert caller.circuit_breaker.consecutive_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_a_cancelled_probe_lets_the_next_probe_through():
+    caller = make_caller(
+        circuit_breaker=CircuitBreaker(failure_threshold=1, recovery_seconds=0)
+    )
+    caller.circuit_breaker.record_failure()
+    started = asyncio.Event()
+
+    async def hanging():
+        started.set()
+        await asyncio.sleep(60)
+
+    probe = asyncio.create_task(caller.call(hanging))
+    await started.wait()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    async def ok():
+        return "ok"
+
+    assert caller.circuit_breaker.state == CircuitState.HALF_OPEN
+    assert await caller.call(ok) == "ok"
+    assert caller.circuit_breaker.state == CircuitState.CLOSED
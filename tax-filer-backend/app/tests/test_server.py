@@ -0,0 +1,34 @@
+from app.core.server import cgroup_cpu_limit, cgroup_memory_limit, recommended_workers
+
+
+def test_cgroup_v2_limits(tmp_path):
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    (tmp_path / "memory.max").write_text(f"{512 * 1024 * 1024}\n")
+
+    assert cgroup_cpu_limit(tmp_path) == 1.5
+    assert cgroup_memory_limit(tmp_path) == 512 * 1024 * 1024
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    (tmp_path / "memory.max").write_text("max\n")
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_limit(tmp_path) is None
+
+
+def test_cgroup_v1_limits(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "memory" / "memory.limit_in_bytes").write_text("9223372036854771712\n")
+
+    assert cgroup_cpu_limit(tmp_path) is None
+    assert cgroup_memory_limit(tmp_path) is None
+
+
+def test_recommended_workers_fit_cpu_and_memory():
+    limit_512m = 512 * 1024 * 1024
+
+    assert recommended_workers(4, limit_512m, worker_memory_mb=128, max_workers=8) == 3
+    assert recommended_workers(1.5, None, worker_memory_mb=128, max_workers=8) == 2
+    assert recommended_workers(16, None, worker_memory_mb=128, max_workers=8) == 8
+    assert recommended_workers(4, 64 * 1024 * 1024, 128, max_workers=8) == 1
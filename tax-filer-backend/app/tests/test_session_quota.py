@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.core.shared_state import SharedState
+from app.services.session_quota import QuotaExceededError, SessionQuota
+
+
+def test_session_quota_limits_requests_per_window(mocker):
+    clock = mocker.patch("app.services.session_quota.time.time", return_value=1000.0)
+    quota = SessionQuota(max_requests=2, window_seconds=60, max_tokens_per_day=0)
+
+    quota.check("jti-a")
+    quota.check("jti-a")
+    with pytest.raises(QuotaExceededError) as exc_info:
+        quota.check("jti-a")
+    assert exc_info.value.retry_after == 60
+    quota.check("jti-b")  # Other sessions are not affected
+
+    clock.return_value = 1060.0  # Next window
+    quota.check("jti-a")
+    assert quota.rejected == 1
+
+
+def test_batches_are_charged_per_item(mocker):
+    mocker.patch("app.services.session_quota.time.time", return_value=1000.0)
+    quota = SessionQuota(max_requests=5, window_seconds=60, max_tokens_per_day=0)
+
+    quota.check("jti-a", 3)
+    with pytest.raises(QuotaExceededError):
+        quota.check("jti-a", 3)  # Only 2 left; nothing is charged
+    quota.check("jti-a", 2)
+    with pytest.raises(QuotaExceededError):
+        quota.check("jti-b", 6)  # Never fits into one window
+    quota.check("jti-a", 0)  # Checks the token quota only, even on a full window
+
+
+def test_session_quota_limits_tokens_per_day(mocker):
+    clock = mocker.patch(
+        "app.services.session_quota.time.time", return_value=86400 * 3 + 3600.0
+    )
+    quota = SessionQuota(max_requests=0, window_seconds=60, max_tokens_per_day=1000)
+
+    quota.check("jti-a")
+    quota.record_tokens("jti-a", 600)
+    quota.check("jti-a")
+    quota.record_tokens("jti-a", 600)  # The request crossing the budget completes
+    with pytest.raises(QuotaExceededError) as exc_info:
+        quota.check("jti-a")
+    assert exc_info.value.retry_after == 86400 - 3600
+
+    clock.return_value = 86400 * 4  # Next UTC day
+    quota.check("jti-a")
+    assert quota.tokens_used_today("jti-a") == 0
+
+
+@pytest.mark.asyncio
+async def test_session_quota_is_shared_between_workers(tmp_path):
+    state = SharedState(str(tmp_path / "shared-state.db"))
+    worker_a, worker_b = [
+        SessionQuota(
+            max_requests=2,
+            window_seconds=60,
+            max_tokens_per_day=1000,
+            shared_state=state,
+        )
+        for _ in range(2)
+    ]
+
+    await worker_a.charge("jti-a")
+    await worker_b.charge("jti-a")
+    with pytest.raises(QuotaExceededError):
+        await worker_a.charge("jti-a")
+
+    # Charged inline off the event loop (in a worker thread on it)
+    await asyncio.to_thread(worker_b.record_tokens, "jti-b", 1200)
+    assert worker_a.tokens_used_today("jti-b") == 1200
+    with pytest.raises(QuotaExceededError):
+        await worker_a.charge("jti-b")
@@ -0,0 +1,52 @@
+import pytest
+
+from app.core.shared_state import SharedState, _reopen_databases_after_fork
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "shared-state.db")
+
+
+def test_counters_are_shared_between_instances(state_path, mocker):
+    clock = mocker.patch("app.core.shared_state.time.time", return_value=1000.0)
+    worker_a, worker_b = SharedState(state_path), SharedState(state_path)
+
+    assert worker_a.consume("rate", {"requests": (1, 2), "tokens": (500, 800)}, 60) == 0
+    assert worker_b.consume("rate", {"requests": (1, 2), "tokens": (200, 800)}, 60) == 0
+    # Within the request limit but over the token limit: nothing is charged
+    assert (
+        worker_a.consume("rate", {"requests": (1, 3), "tokens": (200, 800)}, 60) == 60
+    )
+    assert worker_b.counter("rate", "requests") == 2
+
+    clock.return_value = 1060.0  # The window ended
+    assert worker_b.consume("rate", {"requests": (1, 2), "tokens": (900, 800)}, 60) == 0
+    assert worker_a.counter("rate", "tokens") == 900
+    assert worker_a.add("rate", "tokens", 100, 60) == 1000
+
+
+def test_entries_expire_and_are_trimmed(state_path, mocker):
+    clock = mocker.patch("app.core.shared_state.time.time", return_value=1000.0)
+    state = SharedState(state_path)
+
+    state.set("cache", "a", "1", ttl_seconds=10)
+    state.set("cache", "b", "2", ttl_seconds=20, max_entries=1)
+    state.set("other", "a", "3", ttl_seconds=10)
+
+    assert state.get("cache", "a") is None  # Trimmed, closest to expiry
+    assert state.get("cache", "b") == "2"
+    clock.return_value = 1020.0
+    assert state.get("cache", "b") is None
+    assert state.get("other", "a") is None
+
+
+def test_connection_is_reopened_after_fork(state_path):
+    state = SharedState(state_path)
+    state.add("counters", "hits", 1, 60)
+    parent_connection = state.db.connection()
+
+    _reopen_databases_after_fork()  # What a forked worker runs first
+
+    assert state.db.connection() is not parent_connection
+    assert state.add("counters", "hits", 1, 60) == 2
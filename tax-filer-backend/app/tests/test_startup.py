@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+# Imported by the app on first use, never while importing it. The import time
+# budget itself is checked by `python -m benchmarks.import_time --budget-ms`.
+DEFERRED_MODULES = ("openai",)
+
+
+def test_app_import_does_not_load_deferred_modules():
+    check = (
+        "import sys, app.main; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        env={"OPENAI_API_KEY": "x", "JWT_SECRET_KEY": "y", **os.environ},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == ""
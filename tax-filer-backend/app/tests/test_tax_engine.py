@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app.models import TaxInfoInput
+from app.services.tax_engine import tax_engine
+
+
+def reference_tax(code: str, taxable: float) -> float:
+    table = tax_engine.tables[code]
+    tax = 0.0
+    for lower, width, rate in zip(table.lower, table.width, table.rates):
+        tax += min(max(taxable - lower, 0.0), width) * rate
+    return tax
+
+
+def test_estimate_known_values():
+    estimate = tax_engine.estimate(
+        TaxInfoInput(income=100000, expenses=5000, deductions=1000, country=" usa ")
+    )
+    assert estimate.country_code == "USA"
+    assert estimate.taxable_income == 94000
+    # 10% of 11,600 + 12% of 35,550 + 22% of 46,850
+    assert estimate.estimated_tax == pytest.approx(15733.0)
+    assert estimate.marginal_rate == 0.22
+    assert estimate.effective_rate == pytest.approx(0.1573)
+
+    estimate = tax_engine.estimate(
+        TaxInfoInput(income=10000, expenses=0, country="United Kingdom")
+    )
+    assert estimate.estimated_tax == 0  # Within the personal allowance
+    assert estimate.marginal_rate == 0
+
+
+def test_vectorized_compute_matches_reference():
+    rng = np.random.default_rng(7)
+    income = rng.uniform(1, 2_000_000, 5000)
+    expenses = rng.uniform(0, 50_000, 5000)
+    deductions = rng.uniform(0, 20_000, 5000)
+    for code in tax_engine.supported_countries():
+        result = tax_engine.compute(code, income, expenses, deductions)
+        taxable = np.maximum(income - expenses - deductions, 0)
+        expected = [reference_tax(code, value) for value in taxable]
+        assert np.allclose(result["estimated_tax"], expected)
+        assert np.all(result["effective_rate"] < 0.5)
+
+
+def test_estimate_many_keeps_order_and_skips_unknown_countries():
+    inputs = [
+        TaxInfoInput(income=50000, expenses=0, country="Canada"),
+        TaxInfoInput(income=50000, expenses=0, country="Narnia"),
+        TaxInfoInput(income=50000, expenses=0, country="AU"),
+        TaxInfoInput(income=60000, expenses=0, country="CA"),
+    ]
+    estimates = tax_engine.estimate_many(inputs)
+    assert [e.country_code if e else None for e in estimates] == [
+        "CAN",
+        None,
+        "AUS",
+        "CAN",
+    ]
+    assert estimates[3].estimated_tax > estimates[0].estimated_tax
+
+
+def test_single_estimate_matches_vectorized_path():
+    rng = np.random.default_rng(11)
+    inputs = [
+        TaxInfoInput(
+            income=float(income),
+            expenses=float(expenses),
+            deductions=float(deductions),
+            country=country,
+        )
+        for income, expenses, deductions, country in zip(
+            rng.uniform(1, 400_000, 200),
+            rng.uniform(0, 30_000, 200),
+            rng.uniform(0, 10_000, 200),
+            rng.choice(tax_engine.supported_countries(), 200),
+        )
+    ]
+    # Includes bracket boundaries and a zero taxable income
+    inputs += [
+        TaxInfoInput(income=11600, expenses=0, country="USA"),
+        TaxInfoInput(income=5000, expenses=6000, country="USA"),
+    ]
+    assert [tax_engine.estimate(i) for i in inputs] == tax_engine.estimate_many(inputs)
@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import status
 from httpx import ASGITransport, AsyncClient
 import pytest
@@ -6,6 +8,10 @@ import pytest_asyncio
 from app.core.config import settings
 from app.main import app  # Main FastAPI application instance
 from app.models import AIServiceError, AIServiceResponse
+from app.services.admission import AdmissionRejectedError
+from app.services.job_queue import advice_job_queue
+from app.services.session_quota import batch_item_quota
+from app.services.session_quota import session_quota as advice_session_quota
 
 
 @pytest_asyncio.fixture(scope="module")
@@ -42,6 +48,7 @@ async def test_health_check(async_client_noauth: AsyncClient):
     response = await async_client_noauth.get("/api/v1/tax/health")
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == {"status": "healthy", "message": "Backend is running!"}
+    assert "content-encoding" not in response.headers  # Too small to compress
 
 
 @pytest.mark.asyncio
@@ -62,6 +69,7 @@ async def test_get_application_info(async_client_noauth: AsyncClient):
     assert response_data["default_openai_model"] == settings.DEFAULT_OPENAI_MODEL
     assert response_data["configured_openai_model"] == settings.OPENAI_MODEL_NAME
     assert response_data["api"] == settings.API_V1_STR
+    assert response_data["model_routing"][0]["model"] == settings.OPENAI_MODEL_NAME
 
     # Ensure no sensitive data is exposed (e.g., API keys)
     assert "OPENAI_API_KEY" not in response_data
@@ -94,7 +102,29 @@ async def test_submit_tax_info_valid_jwt(async_client: AsyncClient, mocker):
     assert (
         response_data["advice"] == "Mocked AI advice with JWT: Based on your input..."
     )
-    assert response_data["raw_input"]["income"] == test_payload["income"]
+    assert "raw_input" not in response_data  # Only echoed on request
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_echoes_input_on_request(
+    async_client: AsyncClient, mocker
+):
+    mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(success=True, content="Long advice. " * 200),
+        new_callable=mocker.AsyncMock,
+    )
+    test_payload = {"income": 50000.0, "expenses": 10000.0, "country": "USA"}
+
+    response = await async_client.post(
+        "/api/v1/tax/submit-advice?include_input=true", json=test_payload
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["raw_input"]["income"] == test_payload["income"]
+    # Above RESPONSE_GZIP_MIN_BYTES; httpx asks for gzip and decodes it
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len("Long advice. " * 200)
 
 
 @pytest.mark.asyncio
@@ -140,7 +170,7 @@ async def test_submit_tax_info_invalid_input_negative_income(async_client: Async
     }
     response = await async_client.post("/api/v1/tax/submit-advice", json=test_payload)
     assert (
-        response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
     )  # Pydantic validation error
 
 
@@ -169,3 +199,406 @@ async def test_submit_tax_info_ai_service_failure(async_client: AsyncClient, moc
         in response_data["message"]
     )
     assert "Could not retrieve AI-powered advice" in response_data["advice"]
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_stream(async_client: AsyncClient, mocker):
+    async def fake_stream(tax_input, session_id=None):
+        yield {"event": "delta", "data": {"content": "Mocked "}}
+        yield {"event": "delta", "data": {"content": "streamed advice"}}
+        yield {
+            "event": "done",
+            "data": {
+                "id": "cmpl-1",
+                "usage": {"completion_tokens": 3},
+                "cached": False,
+            },
+        }
+
+    mocker.patch("app.routers.tax_info.stream_tax_advice_from_ai", new=fake_stream)
+    test_payload = {
+        "income": 50000.0,
+        "expenses": 10000.0,
+        "deductions": 2000.0,
+        "country": "Testland",
+    }
+    response = await async_client.post(
+        "/api/v1/tax/submit-advice/stream", json=test_payload
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in response.text.split("\n\n") if block]
+    assert events[0] == 'event: delta\ndata: {"content": "Mocked "}'
+    assert events[-1].startswith("event: done\n")
+    assert '"id": "cmpl-1"' in events[-1]
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_batch_partial_failure(async_client: AsyncClient, mocker):
+    concurrency = {"current": 0, "max": 0}
+
+    async def fake_advice(tax_input, session_id=None):
+        concurrency["current"] += 1
+        concurrency["max"] = max(concurrency["max"], concurrency["current"])
+        await asyncio.sleep(0.01)
+        concurrency["current"] -= 1
+        if tax_input.country == "Failland":
+            raise RuntimeError("Mocked failure")
+        return AIServiceResponse(success=True, content=f"Advice for {tax_input.income}")
+
+    mocker.patch("app.routers.tax_info.get_tax_advice_from_ai", new=fake_advice)
+    mocker.patch.object(settings, "AI_BATCH_CONCURRENCY", 2)
+    items = [
+        {"income": 1000.0 * (i + 1), "expenses": 0.0, "country": "Testland"}
+        for i in range(5)
+    ]
+    items[2]["country"] = "Failland"
+
+    response = await async_client.post(
+        "/api/v1/tax/submit-advice/batch", json={"items": items}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response_data = response.json()
+    assert response_data["succeeded"] == 4
+    assert response_data["failed"] == 1
+    assert [r["success"] for r in response_data["results"]] == [
+        True,
+        True,
+        False,
+        True,
+        True,
+    ]
+    assert response_data["results"][2]["error_type"] == AIServiceError.INTERNAL_ERR
+    assert response_data["results"][4]["content"] == "Advice for 5000.0"
+    assert concurrency["max"] <= 2
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_batch_too_large(async_client: AsyncClient, mocker):
+    mocker.patch.object(settings, "AI_BATCH_MAX_ITEMS", 1)
+    items = [{"income": 1000.0, "expenses": 0.0, "country": "Testland"}] * 2
+    response = await async_client.post(
+        "/api/v1/tax/submit-advice/batch", json={"items": items}
+    )
+    assert response.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_batch_is_charged_to_the_batch_budget(
+    async_client_noauth: AsyncClient, mocker
+):
+    mocker.patch.object(advice_session_quota, "max_requests", 1)
+    mocker.patch.object(batch_item_quota, "max_requests", 4)
+    advice = mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(success=True, content="Mocked AI advice"),
+        new_callable=mocker.AsyncMock,
+    )
+    token = (await async_client_noauth.get("/api/v1/token/request-token")).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    item = {"income": 1000.0, "expenses": 0.0, "country": "Testland"}
+
+    first = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice/batch", json={"items": [item] * 3}, headers=headers
+    )
+    second = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice/batch", json={"items": [item] * 3}, headers=headers
+    )
+    oversized = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice/batch", json={"items": [item] * 5}, headers=headers
+    )
+    single = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice", json=item, headers=headers
+    )
+
+    assert first.status_code == status.HTTP_200_OK
+    assert second.status_code == status.HTTP_429_TOO_MANY_REQUESTS  # 1 item left
+    assert oversized.status_code == status.HTTP_413_CONTENT_TOO_LARGE
+    assert "at most 4 items" in oversized.json()["detail"]
+    assert single.status_code == status.HTTP_200_OK  # Request quota untouched
+    assert advice.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_advice_job_submit_and_poll(
+    async_client: AsyncClient, async_client_noauth: AsyncClient, mocker
+):
+    mocker.patch.object(
+        advice_job_queue,
+        "handler",
+        mocker.AsyncMock(
+            return_value=AIServiceResponse(success=True, content="Queued advice")
+        ),
+    )
+    test_payload = {"income": 50000.0, "expenses": 10000.0, "country": "Testland"}
+    response = await async_client.post("/api/v1/tax/jobs", json=test_payload)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_id = response.json()["job_id"]
+    assert response.headers["location"].endswith(f"/tax/jobs/{job_id}")
+
+    for _ in range(50):
+        job = (await async_client.get(f"/api/v1/tax/jobs/{job_id}")).json()
+        if job["status"] == "succeeded":
+            break
+        await asyncio.sleep(0.01)
+    assert job["result"]["content"] == "Queued advice"
+
+    # A different session cannot read someone else's job
+    other_token = (await async_client_noauth.get("/api/v1/token/request-token")).json()
+    response = await async_client_noauth.get(
+        f"/api/v1/tax/jobs/{job_id}",
+        headers={"Authorization": f"Bearer {other_token['access_token']}"},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    stats = (await async_client_noauth.get("/api/v1/tax/jobs/stats")).json()
+    assert stats["depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_admission_rejected(async_client: AsyncClient, mocker):
+    mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        side_effect=AdmissionRejectedError("global concurrency limit reached", 2.3),
+        new_callable=mocker.AsyncMock,
+    )
+    test_payload = {"income": 50000.0, "expenses": 10000.0, "country": "Testland"}
+    response = await async_client.post("/api/v1/tax/submit-advice", json=test_payload)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["retry-after"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_idempotency_key_replays_response(
+    async_client: AsyncClient, mocker
+):
+    advice = mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(success=True, content="Idempotent advice"),
+        new_callable=mocker.AsyncMock,
+    )
+    payload = {"income": 61000.0, "expenses": 1000.0, "country": "Testland"}
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = await async_client.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+    retry = await async_client.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+    reused = await async_client.post(
+        "/api/v1/tax/submit-advice",
+        json={**payload, "income": 62000.0},
+        headers=headers,
+    )
+
+    assert advice.await_count == 1
+    assert first.status_code == retry.status_code == status.HTTP_200_OK
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert reused.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_degraded_response_is_not_replayed(
+    async_client: AsyncClient, mocker
+):
+    advice = mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(
+            success=True,
+            content="General advice",
+            error_type=AIServiceError.TIMEOUT,
+            degraded=True,
+        ),
+        new_callable=mocker.AsyncMock,
+    )
+    payload = {"income": 61000.0, "expenses": 1000.0, "country": "Testland"}
+    headers = {"Idempotency-Key": "degraded-1"}
+
+    first = await async_client.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+    retry = await async_client.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+
+    assert first.status_code == status.HTTP_200_OK
+    assert first.json()["degraded"] is True
+    assert first.json()["advice"] == "General advice"
+    assert "idempotent-replayed" not in retry.headers
+    assert advice.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_submit_tax_info_session_quota_exceeded(
+    async_client_noauth: AsyncClient, mocker
+):
+    mocker.patch.object(advice_session_quota, "max_requests", 1)
+    mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(success=True, content="Mocked AI advice"),
+        new_callable=mocker.AsyncMock,
+    )
+    token = (await async_client_noauth.get("/api/v1/token/request-token")).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    payload = {"income": 50000.0, "expenses": 1000.0, "country": "Testland"}
+
+    first = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+    second = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+
+    assert first.status_code == status.HTTP_200_OK
+    assert second.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(second.headers["retry-after"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_only_idempotent_retries_skip_the_session_quota(
+    async_client_noauth: AsyncClient, mocker
+):
+    mocker.patch.object(advice_session_quota, "max_requests", 1)
+    mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(success=True, content="Mocked AI advice"),
+        new_callable=mocker.AsyncMock,
+    )
+    token = (await async_client_noauth.get("/api/v1/token/request-token")).json()
+    headers = {
+        "Authorization": f"Bearer {token['access_token']}",
+        "Idempotency-Key": "quota-1",
+    }
+    payload = {"income": 50000.0, "expenses": 1000.0, "country": "Testland"}
+
+    first = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+    retry = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice", json=payload, headers=headers
+    )
+    other_body = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice",
+        json={**payload, "income": 51000.0},
+        headers=headers,
+    )
+    stream = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice/stream", json=payload, headers=headers
+    )
+    job = await async_client_noauth.post(
+        "/api/v1/tax/jobs", json=payload, headers=headers
+    )
+
+    assert first.status_code == retry.status_code == status.HTTP_200_OK
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert other_body.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert stream.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert job.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+
+@pytest.mark.asyncio
+async def test_estimate_endpoint(async_client: AsyncClient):
+    response = await async_client.post(
+        "/api/v1/tax/estimate",
+        json={"income": 80000, "expenses": 0, "country": "Australia"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["estimated_tax"] == pytest.approx(
+        14788.0
+    )  # 16% of 26,800 + 30% of 35,000
+
+    response = await async_client.post(
+        "/api/v1/tax/estimate",
+        json={"income": 80000, "expenses": 0, "country": "Testland"},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+@pytest.mark.asyncio
+async def test_usage_report_requires_admin_key(
+    async_client_noauth: AsyncClient, mocker, tmp_path
+):
+    from app.routers import tax_info
+    from app.services.usage_ledger import UsageLedger
+
+    ledger = UsageLedger(str(tmp_path / "usage.db"))
+    mocker.patch.object(tax_info, "usage_ledger", ledger)
+    ledger.record("gpt-4-turbo", "jti-1", 1000, 0, 100, latency_seconds=2)
+
+    response = await async_client_noauth.get("/api/v1/tax/ai/usage")
+    assert response.status_code == status.HTTP_404_NOT_FOUND  # No ADMIN_API_KEY
+
+    mocker.patch.object(settings, "ADMIN_API_KEY", "admin-secret")
+    headers = {"X-Admin-Key": "admin-secret"}
+    response = await async_client_noauth.get(
+        "/api/v1/tax/ai/usage", params={"group_by": "model"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    (row,) = response.json()["rows"]
+    assert row["model"] == "gpt-4-turbo" and row["day"] is None
+    assert row["requests"] == 1
+    assert row["cost_usd"] == pytest.approx(0.013)  # Default gpt-4-turbo prices
+
+    response = await async_client_noauth.get(
+        "/api/v1/tax/ai/usage", params={"group_by": "country"}, headers=headers
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_batch_items_are_recorded_for_the_session(
+    async_client_noauth: AsyncClient, mocker, tmp_path
+):
+    from jose import jwt
+
+    from app.services import ai_service
+    from app.services.usage_ledger import UsageLedger
+
+    ledger = UsageLedger(str(tmp_path / "usage.db"))
+    mocker.patch.object(ai_service, "usage_ledger", ledger)
+    mocker.patch.object(ai_service, "get_openai_client", return_value=None)
+    token = (await async_client_noauth.get("/api/v1/token/request-token")).json()
+    items = [
+        {"income": 1000.0 * (i + 1), "expenses": 0.0, "country": "USA"}
+        for i in range(3)
+    ]
+
+    response = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice/batch",
+        json={"items": items},
+        headers={"Authorization": f"Bearer {token['access_token']}"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    await ledger.flush()
+
+    (row,) = ledger.aggregate(("jti",))
+    assert row["jti"] == jwt.get_unverified_claims(token["access_token"])["jti"]
+    assert row["requests"] == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_items_are_admitted_per_session(
+    async_client_noauth: AsyncClient, mocker
+):
+    from jose import jwt
+
+    advice = mocker.patch(
+        "app.routers.tax_info.get_tax_advice_from_ai",
+        return_value=AIServiceResponse(success=True, content="Mocked AI advice"),
+        new_callable=mocker.AsyncMock,
+    )
+    token = (await async_client_noauth.get("/api/v1/token/request-token")).json()
+    item = {"income": 1000.0, "expenses": 0.0, "country": "Testland"}
+
+    response = await async_client_noauth.post(
+        "/api/v1/tax/submit-advice/batch",
+        json={"items": [item] * 2},
+        headers={"Authorization": f"Bearer {token['access_token']}"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    jti = jwt.get_unverified_claims(token["access_token"])["jti"]
+    assert [call.kwargs["session_id"] for call in advice.await_args_list] == [jti] * 2
@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.models import AIServiceError
+from app.services.usage_ledger import UsageLedger, parse_group_by
+
+PRICES = {"model-a": (10.0, 30.0, 5.0)}
+
+
+@pytest.mark.asyncio
+async def test_records_are_buffered_until_flushed(tmp_path):
+    path = tmp_path / "ledger.db"
+    ledger = UsageLedger(str(path))
+
+    ledger.record("model-a", "jti-1", 1000, 200, 100, latency_seconds=1.5)
+    ledger.record("model-a", "jti-2", cache_hit=True)
+    ledger.record(None, "jti-2", error_type=AIServiceError.API_LIMIT_EXCEEDED)
+
+    assert not path.exists()  # Nothing is written on the request path
+    assert await ledger.flush() == 3
+    assert ledger.stats()["buffered"] == 0
+    (count,) = (
+        sqlite3.connect(path).execute("SELECT COUNT(*) FROM usage_ledger").fetchone()
+    )
+    assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_aggregates_per_day_and_model_with_cost(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "ledger.db"))
+    ledger.record("model-a", "jti-1", 1000, 200, 100, latency_seconds=1.0)
+    ledger.record("model-a", "jti-2", 1000, 0, 300, latency_seconds=3.0)
+    ledger.record("model-a", "jti-2", cache_hit=True)
+    ledger.record("model-b", "jti-1", 500, 0, 50, latency_seconds=2.0)
+    ledger.record(None, "jti-3", error_type=AIServiceError.CONFIG_ERROR)
+    await ledger.flush()
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+
+    rows = {row["model"]: row for row in ledger.aggregate(prices=PRICES)}
+
+    assert rows["model-a"]["day"] == today
+    assert rows["model-a"]["requests"] == 3
+    assert rows["model-a"]["cache_hits"] == 1
+    assert rows["model-a"]["prompt_tokens"] == 2000
+    assert rows["model-a"]["avg_latency_ms"] == 2000.0  # Cache hits have no latency
+    # 1800 input, 200 cached input and 400 output tokens
+    assert rows["model-a"]["cost_usd"] == pytest.approx(0.018 + 0.001 + 0.012)
+    assert rows["model-b"]["cost_usd"] is None  # No price configured
+    assert rows[None]["errors"] == 1
+
+    by_jti = {row["jti"]: row for row in ledger.aggregate(("jti",), prices=PRICES)}
+    assert (
+        set(by_jti["jti-1"]) >= {"jti", "requests"} and "model" not in by_jti["jti-1"]
+    )
+    assert by_jti["jti-2"]["requests"] == 2
+    assert by_jti["jti-1"]["cost_usd"] is None  # Includes model-b
+    assert ledger.aggregate(since="2999-01-01") == []
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_records_and_batch_size_triggers_a_flush(tmp_path):
+    ledger = UsageLedger(
+        str(tmp_path / "ledger.db"),
+        batch_size=3,
+        flush_interval_seconds=60,
+        max_buffered=5,
+    )
+    for _ in range(7):
+        ledger.record("model-a")
+    assert ledger.stats()["dropped"] == 2
+
+    ledger.start()  # A full batch is waiting: written without waiting 60 s
+    await asyncio.sleep(0.2)
+    assert ledger.stats()["written"] == 5
+
+    ledger.record("model-a")
+    await ledger.stop()  # Writes what is still buffered
+    assert ledger.stats()["written"] == 6
+
+
+def test_group_by_is_validated():
+    assert parse_group_by(" model, day ,model") == ("model", "day")
+    with pytest.raises(ValueError):
+        parse_group_by("day,country")
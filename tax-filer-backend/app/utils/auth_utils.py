@@ -1,14 +1,30 @@
 # tax-filer-backend/app/utils/auth_utils.py
+import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+import hashlib
+import math
+import secrets
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import uuid
 
-from fastapi import Depends, HTTPException, Request, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
 from app.core.config import settings
 from app.core.logging_config import app_logger
+from app.core.metrics import (
+    JWT_DECODE_DURATION,
+    JWT_INVALID,
+    JWT_REVOKED,
+    JWT_VALID_CACHED,
+    JWT_VALID_VERIFIED,
+)
+from app.core.shared_state import SQLiteDatabase
+from app.middleware.request_id_middleware import jti_var
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="api/v1/token/request-token"
@@ -47,22 +63,333 @@ def create_access_token(
     return encoded_jwt
 
 
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of verified token payloads, keyed on the SHA-256 of the
+    token, so a token reused for its whole lifetime is verified only once.
+    An entry is served strictly before the token's `exp` (after that the token
+    goes through `jwt.decode` again, which rejects it). Tokens without `exp`
+    are never cached. `revoke(jti)` evicts every cached token with that `jti`.
+    Only used from the event loop thread, so it takes no lock.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self._keys_by_jti: Dict[str, set] = {}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, payload = entry
+        if time.time() >= expires_at:
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(payload)  # Callers may modify their copy
+
+    def set(self, token: str, payload: Dict[str, Any]) -> None:
+        expires_at = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token)
+        self._entries[key] = (float(expires_at), dict(payload))
+        self._entries.move_to_end(key)
+        jti = payload.get("jti")
+        if jti is not None:
+            self._keys_by_jti.setdefault(jti, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def revoke(self, jti: str) -> int:
+        """
+        Evicts the cached tokens carrying `jti`; returns how many were cached.
+        """
+        keys = self._keys_by_jti.pop(jti, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_jti.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+    def _remove(self, key: bytes) -> None:
+        _, payload = self._entries.pop(key)
+        jti = payload.get("jti")
+        keys = self._keys_by_jti.get(jti)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_jti[jti]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+verified_token_cache = VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES)
+
+
+# --- Revocation ---
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. `might_contain` is never wrong for
+    added keys and answers False for other keys with probability
+    1 - `error_rate` while at most `capacity` keys have been added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(
+            64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1  # Double hashing
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, key: str) -> bool:
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevocationList:
+    """
+    Revoked token IDs (`jti`) with the time their token expires anyway.
+    Lookups go through a Bloom filter first, so the common case (a token that
+    was not revoked) is answered without touching the exact set; the exact set
+    rules out the filter's false positives. Entries are pruned once their
+    `exp` has passed, and the filter is rebuilt (it cannot delete) on prune
+    or when it outgrows its capacity.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.initial_capacity = initial_capacity
+        self._revoked: Dict[str, float] = {}
+        self._filter = BloomFilter(initial_capacity)
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        self._revoked[jti] = max(expires_at, self._revoked.get(jti, 0.0))
+        if len(self._revoked) > self._filter.capacity:
+            self._rebuild()
+        else:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti or not self._revoked or not self._filter.might_contain(jti):
+            return False
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def prune(self) -> int:
+        """
+        Forgets revocations whose token has expired; returns how many.
+        """
+        now = time.time()
+        expired = [
+            jti for jti, expires_at in self._revoked.items() if expires_at <= now
+        ]
+        for jti in expired:
+            del self._revoked[jti]
+        if expired:
+            self._rebuild()
+        return len(expired)
+
+    def _rebuild(self) -> None:
+        capacity = self.initial_capacity
+        while capacity < len(self._revoked):
+            capacity *= 2
+        self._filter = BloomFilter(capacity)
+        for jti in self._revoked:
+            self._filter.add(jti)
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+class SQLiteRevocationStore:
+    """
+    Shares revocations between the workers on a host through a local SQLite
+    file. `load_since` returns the rows added after a given sequence number, so
+    each sync only reads new revocations. All calls are blocking and are meant
+    to be run off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS revoked_tokens ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, jti TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            ],
+        )
+
+    def add(self, jti: str, expires_at: float) -> None:
+        with self.db.lock:
+            self.db.connection().execute(
+                "INSERT INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+                (jti, expires_at),
+            )
+
+    def load_since(self, seq: int) -> Tuple[List[Tuple[str, float]], int]:
+        with self.db.lock:
+            rows = (
+                self.db.connection()
+                .execute(
+                    "SELECT seq, jti, expires_at FROM revoked_tokens "
+                    "WHERE seq > ? AND expires_at > ? ORDER BY seq",
+                    (seq, time.time()),
+                )
+                .fetchall()
+            )
+        last_seq = rows[-1][0] if rows else seq
+        return [(jti, expires_at) for _, jti, expires_at in rows], last_seq
+
+    def prune(self) -> None:
+        with self.db.lock:
+            self.db.connection().execute(
+                "DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),)
+            )
+
+
+revocation_list = RevocationList()
+revocation_store = (
+    SQLiteRevocationStore(settings.JWT_REVOCATION_SQLITE_PATH)
+    if settings.JWT_REVOCATION_SQLITE_PATH
+    else None
+)
+_revocation_seq = 0
+_revocation_sync_task: Optional[asyncio.Task] = None
+
+
+async def revoke_token_id(jti: str, expires_at: datetime) -> None:
+    """
+    Revokes `jti` in this worker immediately and, with a shared store, in the
+    other workers on their next sync.
+    """
+    revocation_list.revoke(jti, expires_at.timestamp())
+    verified_token_cache.revoke(jti)
+    if revocation_store is not None:
+        await asyncio.to_thread(revocation_store.add, jti, expires_at.timestamp())
+    app_logger.info(f"Revoked JWT jti: {jti} until {expires_at.isoformat()}")
+
+
+async def sync_revocations() -> int:
+    """
+    Pulls revocations added by other workers and prunes expired ones.
+    Returns the number of revocations pulled.
+    """
+    global _revocation_seq
+    pulled = 0
+    if revocation_store is not None:
+        rows, _revocation_seq = await asyncio.to_thread(
+            revocation_store.load_since, _revocation_seq
+        )
+        for jti, expires_at in rows:
+            revocation_list.revoke(jti, expires_at)
+            verified_token_cache.revoke(jti)
+        pulled = len(rows)
+    if revocation_list.prune() and revocation_store is not None:
+        await asyncio.to_thread(revocation_store.prune)
+    return pulled
+
+
+async def _sync_revocations_forever(interval_seconds: float) -> None:
+    while True:
+        try:
+            await sync_revocations()
+        except sqlite3.Error as e:
+            app_logger.warning(f"Could not sync JWT revocations: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_revocation_sync() -> None:
+    global _revocation_sync_task
+    if _revocation_sync_task is None:
+        _revocation_sync_task = asyncio.create_task(
+            _sync_revocations_forever(settings.JWT_REVOCATION_SYNC_INTERVAL_SECONDS)
+        )
+
+
+async def stop_revocation_sync() -> None:
+    global _revocation_sync_task
+    if _revocation_sync_task is None:
+        return
+    _revocation_sync_task.cancel()
+    await asyncio.gather(_revocation_sync_task, return_exceptions=True)
+    _revocation_sync_task = None
+
+
 def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
     """
-    Decodes and validates a JWT.
+    Decodes and validates a JWT, or returns the payload cached for it from an
+    earlier successful validation. Revoked tokens are rejected either way.
     Returns the token payload if valid, None otherwise.
     """
+    started_at = time.perf_counter()
     try:
-        payload = jwt.decode(
-            token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
-        )
+        payload = verified_token_cache.get(token)
+        cached = payload is not None
+        if not cached:
+            payload = jwt.decode(
+                token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
+            )
+        if revocation_list.is_revoked(payload.get("jti")):
+            JWT_REVOKED.inc()
+            app_logger.warning(f"Revoked JWT presented (jti: {payload.get('jti')})")
+            return None
+        if cached:
+            JWT_VALID_CACHED.inc()
+            return payload
+        verified_token_cache.set(token, payload)
+        JWT_VALID_VERIFIED.inc()
         app_logger.debug(f"Successfully decoded JWT with jti: {payload.get('jti')}")
         return payload
     except JWTError as e:
+        JWT_INVALID.inc()
         app_logger.warning(
             f"JWT decoding/validation error: {e} for token: {token[:20]}..."
         )  # Log only part of token
         return None
+    finally:
+        JWT_DECODE_DURATION.observe(time.perf_counter() - started_at)
 
 
 # --- FastAPI Dependency for JWT Validation ---
@@ -88,7 +415,22 @@ async def get_current_session_payload(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    app_logger.info(
-        f"JWT validated for session (jti: {payload.get('jti')}) from IP: {request.client.host if request.client else 'unknown'}"
-    )
+    jti_var.set(payload.get("jti"))  # Picked up by the log formatters
+    # Counted in jwt_validations_total rather than logged on every request
     return payload
+
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None)) -> None:
+    """
+    FastAPI dependency guarding the admin endpoints with the `X-Admin-Key`
+    header. The endpoints do not exist (404) while ADMIN_API_KEY is unset.
+    """
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_key or not secrets.compare_digest(
+        x_admin_key.encode("utf-8"), settings.ADMIN_API_KEY.encode("utf-8")
+    ):
+        app_logger.warning("Rejected admin request with a missing or wrong admin key")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin key"
+        )
@@ -0,0 +1,89 @@
+# tax-filer-backend/benchmarks/cache_banding.py
+"""
+Advice cache hit ratios for the "exact" and "banded" cache modes.
+
+Replays a synthetic workload (log-normal incomes around a per-country median,
+expenses and deductions as a random share of income, countries weighted by
+popularity) through the cache keys alone, with an unbounded cache, and reports
+the share of requests that would be served from the cache and the number of
+distinct entries for exact keys and for each band base:
+
+    python -m benchmarks.cache_banding --requests 100000 --bases 1.1,1.25,1.5
+"""
+
+import argparse
+import json
+from pathlib import Path
+import random
+import sys
+
+from app.models import TaxInfoInput
+from app.services.advice_cache import IncomeBands, make_cache_key
+
+# Country, median income, share of requests
+WORKLOAD = [
+    ("USA", 60000, 0.4),
+    ("GBR", 35000, 0.2),
+    ("CAN", 55000, 0.15),
+    ("AUS", 65000, 0.1),
+    ("IND", 600000, 0.1),
+    ("GR", 20000, 0.05),
+]
+
+
+def make_workload(requests: int, seed: int) -> list:
+    rng = random.Random(seed)
+    countries = [country for country, _, _ in WORKLOAD]
+    medians = {country: median for country, median, _ in WORKLOAD}
+    weights = [share for _, _, share in WORKLOAD]
+    inputs = []
+    for country in rng.choices(countries, weights, k=requests):
+        income = round(rng.lognormvariate(0, 0.6) * medians[country], 2)
+        expenses = round(income * rng.choice([0, 0, 0.05, 0.1, 0.2]), 2)
+        deductions = round(income * rng.choice([0, 0.02, 0.05]), 2)
+        inputs.append(
+            TaxInfoInput(
+                income=income, expenses=expenses, deductions=deductions, country=country
+            )
+        )
+    return inputs
+
+
+def hit_ratio(inputs: list, bands) -> dict:
+    seen = set()
+    hits = 0
+    for tax_input in inputs:
+        key = make_cache_key(tax_input, "model", "prompt", bands)
+        if key in seen:
+            hits += 1
+        else:
+            seen.add(key)
+    return {"hit_ratio": round(hits / len(inputs), 4), "entries": len(seen)}
+
+
+def run(requests: int, bases: list, floor: float, seed: int) -> dict:
+    inputs = make_workload(requests, seed)
+    report = {"requests": requests, "floor": floor, "exact": hit_ratio(inputs, None)}
+    for base in bases:
+        report[f"banded_{base}"] = hit_ratio(inputs, IncomeBands(base, floor))
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--bases", default="1.1,1.25,1.5")
+    parser.add_argument("--floor", type=float, default=1000.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    bases = [float(base) for base in args.bases.split(",")]
+    report = run(args.requests, bases, args.floor, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
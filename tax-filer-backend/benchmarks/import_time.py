@@ -0,0 +1,109 @@
+# tax-filer-backend/benchmarks/import_time.py
+"""
+Import time of the application, i.e. the cold-start cost paid by container
+start, worker respawn and test collection before any request is served.
+
+Imports `app.main` in fresh interpreters with `python -X importtime`, and
+reports the fastest run's cumulative import time, the modules that took the
+most time on their own, and whether modules that are meant to be imported on
+first use only (`DEFERRED_MODULES`) were loaded anyway. With `--budget-ms`,
+exits with 1 if the import took longer or a deferred module was loaded:
+
+    python -m benchmarks.import_time --runs 5 --budget-ms 1800
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Imported by the app on first use, never while importing it
+DEFERRED_MODULES = ("openai",)
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """
+    `(module, self_us, cumulative_us)` for each line of `-X importtime` output.
+    """
+    modules = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            modules.append((match[4], int(match[1]), int(match[2])))
+    return modules
+
+
+def import_once(module: str) -> Tuple[List[Tuple[str, int, int]], List[str]]:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    # Required settings; dummy values are enough to import the app
+    env.setdefault("OPENAI_API_KEY", "import-time-check")
+    env.setdefault("JWT_SECRET_KEY", "import-time-check")
+    check = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return parse_importtime(result.stderr), loaded
+
+
+def measure(module: str = "app.main", runs: int = 3, top: int = 10) -> Dict:
+    fastest = None
+    deferred_loaded: List[str] = []
+    for _ in range(max(1, runs)):
+        modules, loaded = import_once(module)
+        deferred_loaded = sorted(set(deferred_loaded) | set(loaded))
+        total_us = next(cum for name, _, cum in reversed(modules) if name == module)
+        if fastest is None or total_us < fastest[0]:
+            fastest = (total_us, modules)
+    total_us, modules = fastest
+    slowest = sorted(modules, key=lambda entry: entry[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": round(total_us / 1000, 1),
+        "deferred_modules_loaded": deferred_loaded,
+        "slowest_modules_self_ms": {
+            name: round(self_us / 1000, 1) for name, self_us, _ in slowest
+        },
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, help="Fail above this import time")
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    report = measure(args.module, args.runs, args.top)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    if args.budget_ms is None:
+        return 0
+    if report["deferred_modules_loaded"]:
+        print(f"Deferred modules imported: {report['deferred_modules_loaded']}")
+        return 1
+    if report["import_ms"] > args.budget_ms:
+        print(f"Import took {report['import_ms']} ms, budget is {args.budget_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
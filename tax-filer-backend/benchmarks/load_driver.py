@@ -0,0 +1,476 @@
+# tax-filer-backend/benchmarks/load_driver.py
+"""
+Load driver for the backend.
+
+Hammers `/token/request-token` and/or `/tax/submit-advice` at a fixed
+concurrency and reports throughput, latency percentiles and memory. Results can
+be saved as a baseline and later compared against, so regressions in the
+middleware, auth, logging or AI paths show up as diffs:
+
+    python -m benchmarks.load_driver --scenario advice --concurrency 32 \\
+        --requests 2000 --compare benchmarks/baselines/advice-spawn-c32.json
+
+Modes:
+- `spawn` (default): starts the OpenAI stub and the app under uvicorn as
+  subprocesses on free ports and drives them over real HTTP.
+- `in-process`: serves the app through `httpx.ASGITransport` in this process
+  (stub on a local port), and additionally measures event-loop lag.
+- `--target URL`: drives an already running backend.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from pathlib import Path
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+API_PREFIX = "/api/v1"
+SCENARIOS = ("token", "advice", "mixed")
+
+# Admission limits are sized for the real OpenAI account; the stub has none.
+BENCHMARK_ENV = {
+    "OPENAI_API_KEY": "sk-benchmark",
+    "JWT_SECRET_KEY": "benchmark-secret",
+    "OPENAI_RPM_LIMIT": "0",
+    "OPENAI_TPM_LIMIT": "0",
+    "OPENAI_MAX_CONCURRENT_REQUESTS": "256",
+    "OPENAI_MAX_CONCURRENT_REQUESTS_PER_SESSION": "0",
+    "OPENAI_WARMUP_CONNECTIONS": "0",
+    "SESSION_QUOTA_REQUESTS": "0",
+    "SESSION_QUOTA_TOKENS_PER_DAY": "0",
+}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_memory_mb(pid: Optional[int] = None) -> Dict[str, float]:
+    """
+    Current and peak resident set size of a process, read from /proc (Linux).
+    Falls back to getrusage() for the current process elsewhere.
+    """
+    status_file = Path(f"/proc/{pid or 'self'}/status")
+    if status_file.exists():
+        fields = {}
+        for line in status_file.read_text().splitlines():
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                fields[key] = int(value.split()[0]) / 1024
+        return {
+            "rss": round(fields.get("VmRSS", 0.0), 1),
+            "peak_rss": round(fields.get("VmHWM", 0.0), 1),
+        }
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return {"rss": round(peak_mb, 1), "peak_rss": round(peak_mb, 1)}
+
+
+class EventLoopLagMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the loop was blocked."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._expected: Optional[float] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - self._expected))
+
+    def start(self) -> None:
+        self._expected = asyncio.get_running_loop().time() + self.interval
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        # A load that never yields to the loop still shows up as one long stall
+        overdue = asyncio.get_running_loop().time() - self._expected
+        if overdue > 0:
+            self.samples.append(overdue)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return {
+            "p50": round(percentile(self.samples, 50) * 1000, 2),
+            "p99": round(percentile(self.samples, 99) * 1000, 2),
+            "max": round(max(self.samples, default=0.0) * 1000, 2),
+        }
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.status_codes: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, started_at: float, status_code: Optional[int]) -> None:
+        self.latencies.append(time.perf_counter() - started_at)
+        key = str(status_code) if status_code is not None else "transport_error"
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if status_code is None or status_code >= 400:
+            self.errors += 1
+
+
+def advice_payload(i: int, distinct_inputs: bool) -> dict:
+    # Distinct incomes defeat the response cache so every request reaches the stub
+    income = 50000.0 + (i if distinct_inputs else 0)
+    return {
+        "income": income,
+        "expenses": 12000.0,
+        "deductions": 1500.0,
+        "country": "Testland",
+    }
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    scenario: str,
+    concurrency: int,
+    total_requests: int,
+    distinct_inputs: bool,
+) -> Tuple[LoadResult, float]:
+    result = LoadResult()
+    counter = iter(range(total_requests))
+
+    async def request_token() -> Optional[str]:
+        started_at = time.perf_counter()
+        try:
+            response = await client.get(f"{API_PREFIX}/token/request-token")
+        except httpx.HTTPError:
+            result.record(started_at, None)
+            return None
+        result.record(started_at, response.status_code)
+        if response.status_code != 200:
+            return None
+        return response.json()["access_token"]
+
+    async def submit_advice(i: int, token: str) -> None:
+        started_at = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{API_PREFIX}/tax/submit-advice",
+                json=advice_payload(i, distinct_inputs),
+                headers={"Authorization": f"Bearer {token}"},
+            )
+        except httpx.HTTPError:
+            result.record(started_at, None)
+            return
+        ok = response.status_code == 200 and "error_type" not in response.text
+        result.record(started_at, response.status_code if ok else 502)
+
+    async def worker() -> None:
+        token = None
+        if scenario == "advice":  # One session per worker, like a browser tab
+            response = await client.get(f"{API_PREFIX}/token/request-token")
+            token = response.json()["access_token"]
+        for i in counter:
+            if scenario == "token":
+                await request_token()
+            elif scenario == "advice":
+                await submit_advice(i, token)
+            else:
+                token = await request_token()
+                if token is not None:
+                    await submit_advice(i, token)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return result, time.perf_counter() - started_at
+
+
+def build_report(
+    args: argparse.Namespace,
+    result: LoadResult,
+    elapsed: float,
+    memory: Dict[str, float],
+    loop_lag: Optional[Dict[str, float]] = None,
+) -> dict:
+    latencies = result.latencies
+    report = {
+        "scenario": args.scenario,
+        "mode": "target" if args.target else args.mode,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "duration_seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "status_codes": result.status_codes,
+        "errors": result.errors,
+        "server_memory_mb": memory,
+        "stub": {
+            "latency_ms": args.stub_latency_ms,
+            "latency_sigma": args.stub_latency_sigma,
+            "error_rate": args.stub_error_rate,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+    }
+    if loop_lag is not None:
+        report["event_loop_lag_ms"] = loop_lag
+    return report
+
+
+def stub_command(args: argparse.Namespace, port: int) -> List[str]:
+    return [
+        sys.executable,
+        "-m",
+        "benchmarks.openai_stub",
+        "--port",
+        str(port),
+        "--latency-ms",
+        str(args.stub_latency_ms),
+        "--latency-sigma",
+        str(args.stub_latency_sigma),
+        "--error-rate",
+        str(args.stub_error_rate),
+        "--seed",
+        "42",
+    ]
+
+
+async def wait_until_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not become ready in {timeout}s")
+            await asyncio.sleep(0.1)
+
+
+async def run_spawned(args: argparse.Namespace) -> dict:
+    stub_port, app_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        **BENCHMARK_ENV,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+    }
+    processes = [
+        subprocess.Popen(stub_command(args, stub_port), cwd=BACKEND_DIR, env=env),
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                "--port",
+                str(app_port),
+                "--log-level",
+                "warning",
+                "--no-access-log",
+            ],
+            cwd=BACKEND_DIR,
+            env=env,
+        ),
+    ]
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{stub_port}/v1/models")
+        await wait_until_ready(f"http://127.0.0.1:{app_port}{API_PREFIX}/tax/health")
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{app_port}", limits=limits, timeout=60
+        ) as client:
+            await run_load(client, args.scenario, args.concurrency, args.warmup, True)
+            result, elapsed = await run_load(
+                client,
+                args.scenario,
+                args.concurrency,
+                args.requests,
+                not args.repeat_inputs,
+            )
+        memory = process_memory_mb(processes[1].pid)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+    return build_report(args, result, elapsed, memory)
+
+
+async def run_in_process(args: argparse.Namespace) -> dict:
+    import uvicorn
+
+    from benchmarks.openai_stub import config_from_args, create_stub_app
+    from benchmarks.openai_stub import parse_args as parse_stub_args
+
+    stub_port = free_port()
+    stub_args = parse_stub_args(stub_command(args, stub_port)[3:])
+    stub = uvicorn.Server(
+        uvicorn.Config(
+            create_stub_app(config_from_args(stub_args)),
+            port=stub_port,
+            log_level="warning",
+        )
+    )
+    stub_task = asyncio.create_task(stub.serve())
+    os.environ.update(BENCHMARK_ENV)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1"
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app.main import app
+
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{stub_port}/v1/models")
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://benchmark", timeout=60
+            ) as client:
+                await run_load(
+                    client, args.scenario, args.concurrency, args.warmup, True
+                )
+                monitor = EventLoopLagMonitor()
+                monitor.start()
+                result, elapsed = await run_load(
+                    client,
+                    args.scenario,
+                    args.concurrency,
+                    args.requests,
+                    not args.repeat_inputs,
+                )
+                loop_lag = await monitor.stop()
+        memory = process_memory_mb()
+    finally:
+        stub.should_exit = True
+        await stub_task
+    return build_report(args, result, elapsed, memory, loop_lag)
+
+
+async def run_against_target(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(
+        base_url=args.target, limits=limits, timeout=60
+    ) as client:
+        await run_load(client, args.scenario, args.concurrency, args.warmup, True)
+        result, elapsed = await run_load(
+            client, args.scenario, args.concurrency, args.requests, True
+        )
+    return build_report(args, result, elapsed, {})
+
+
+# Relative change beyond `tolerance` in the "worse" direction is a regression
+COMPARED_METRICS = (
+    ("rps", ("rps",), "higher"),
+    ("p50 ms", ("latency_ms", "p50"), "lower"),
+    ("p95 ms", ("latency_ms", "p95"), "lower"),
+    ("p99 ms", ("latency_ms", "p99"), "lower"),
+    ("peak RSS MB", ("server_memory_mb", "peak_rss"), "lower"),
+    ("loop lag p99 ms", ("event_loop_lag_ms", "p99"), "lower"),
+)
+
+
+def _lookup(report: dict, path) -> Optional[float]:
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def compare_reports(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Prints a side-by-side diff and returns the names of regressed metrics."""
+    regressions = []
+    print(f"{'metric':<18}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, path, better in COMPARED_METRICS:
+        before, after = _lookup(baseline, path), _lookup(current, path)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        worse = change < -tolerance if better == "higher" else change > tolerance
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:<18}{before:>12}{after:>12}{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--scenario", choices=SCENARIOS, default="advice")
+    parser.add_argument("--mode", choices=("spawn", "in-process"), default="spawn")
+    parser.add_argument("--target", help="Base URL of an already running backend")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument(
+        "--repeat-inputs",
+        action="store_true",
+        help="Send the same advice input every time (measures the cache-hit path)",
+    )
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stub-latency-sigma", type=float, default=0.35)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    parser.add_argument("--compare", type=Path, help="Baseline report to diff with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Relative change tolerated before a metric counts as a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Read the baseline first: --compare and --save may name the same file
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    if args.target:
+        runner = run_against_target
+    elif args.mode == "in-process":
+        runner = run_in_process
+    else:
+        runner = run_spawned
+    report = asyncio.run(runner(args))
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    if baseline is not None:
+        regressions = compare_reports(baseline, report, args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
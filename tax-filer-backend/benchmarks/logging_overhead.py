@@ -0,0 +1,144 @@
+# tax-filer-backend/benchmarks/logging_overhead.py
+"""
+Cost of an `app_logger.info` call on the calling (event loop) thread.
+
+Logs the same INFO line many times through three handler set-ups writing to a
+temporary file, and reports the per-call time on the caller's thread.
+`--write-latency-us` adds a delay to every file flush to emulate a slow or
+contended disk, which is where the queue pays off:
+- `sync_per_record_formatter`: the previous set-up (a new Formatter per record,
+  file write inline),
+- `sync_cached_formatter`: CustomFormatter with its precompiled formatters,
+  file write inline,
+- `queue_pipeline`: the current set-up (QueueLogHandler + LogPipeline).
+
+    python -m benchmarks.logging_overhead --records 50000 --write-latency-us 200
+"""
+
+import argparse
+import json
+import logging
+import logging.handlers
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from app.core.logging_config import CustomFormatter, LogPipeline, QueueLogHandler
+from app.middleware.request_id_middleware import get_request_id, request_id_var
+from benchmarks.load_driver import percentile
+
+
+class PerRecordFormatter(CustomFormatter):
+    """The formatting code CustomFormatter replaced, kept as a reference point."""
+
+    def format(self, record):
+        request_id = get_request_id()
+        record.request_id = request_id if request_id else "N/A"
+        log_fmt = self.FORMATS_FILE.get(record.levelno)
+        formatter = logging.Formatter(log_fmt, datefmt=self.datefmt)
+        return formatter.format(record)
+
+
+class SlowDiskFileHandler(logging.handlers.TimedRotatingFileHandler):
+    def __init__(self, *args, write_latency_seconds: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_latency_seconds = write_latency_seconds
+
+    def flush(self):
+        super().flush()
+        if self.write_latency_seconds:
+            time.sleep(self.write_latency_seconds)
+
+
+def file_handler(
+    path: Path, formatter: logging.Formatter, write_latency_seconds: float
+) -> logging.Handler:
+    handler = SlowDiskFileHandler(
+        path,
+        when="midnight",
+        backupCount=1,
+        encoding="utf-8",
+        write_latency_seconds=write_latency_seconds,
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+
+def time_calls(logger: logging.Logger, records: int) -> dict:
+    samples = []
+    token = request_id_var.set("3f2b8a4e-5a7c-4f0e-9d6b-1c2d3e4f5a6b")
+    try:
+        for i in range(records):
+            started_at = time.perf_counter()
+            logger.info(f"JWT validated for session (jti: {i}) from IP: 127.0.0.1")
+            samples.append(time.perf_counter() - started_at)
+    finally:
+        request_id_var.reset(token)
+    return {
+        "mean_us": round(sum(samples) / len(samples) * 1_000_000, 2),
+        "p50_us": round(percentile(samples, 50) * 1_000_000, 2),
+        "p99_us": round(percentile(samples, 99) * 1_000_000, 2),
+        "max_us": round(max(samples) * 1_000_000, 2),
+    }
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"benchmark.{name}")
+    logger.propagate = False
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def run(records: int, directory: Path, write_latency_us: float) -> dict:
+    write_latency_seconds = write_latency_us / 1_000_000
+    results = {}
+    for name, formatter in (
+        ("sync_per_record_formatter", PerRecordFormatter()),
+        ("sync_cached_formatter", CustomFormatter()),
+    ):
+        handler = file_handler(
+            directory / f"{name}.log", formatter, write_latency_seconds
+        )
+        results[name] = time_calls(make_logger(name, handler), records)
+        handler.close()
+
+    pipeline = LogPipeline(
+        file_handler(
+            directory / "queue_pipeline.log", CustomFormatter(), write_latency_seconds
+        ),
+        max_size=records,
+    )
+    pipeline.start()
+    logger = make_logger("queue_pipeline", QueueLogHandler(pipeline))
+    results["queue_pipeline"] = time_calls(logger, records)
+    started_at = time.perf_counter()
+    pipeline.stop()
+    results["queue_pipeline"]["drain_seconds"] = round(
+        time.perf_counter() - started_at, 3
+    )
+    results["queue_pipeline"]["dropped"] = pipeline.dropped
+    return {
+        "records": records,
+        "write_latency_us": write_latency_us,
+        "per_call": results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--write-latency-us", type=float, default=0.0)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        report = run(args.records, Path(directory), args.write_latency_us)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# tax-filer-backend/benchmarks/middleware_overhead.py
+"""
+Per-request overhead of the request ID middleware.
+
+Calls a trivial FastAPI endpoint directly through the ASGI interface (no
+network, no HTTP client) with and without the middleware, and reports the mean
+time per request in microseconds. The previous `BaseHTTPMiddleware`-based
+implementation is included for comparison:
+
+    python -m benchmarks.middleware_overhead --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import sys
+import time
+import uuid
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.request_id_middleware import (
+    RequestIDMiddleware,
+    request_id_var,
+)
+
+
+class LegacyRequestIDMiddleware(BaseHTTPMiddleware):
+    """The implementation RequestIDMiddleware replaced, kept as a reference point."""
+
+    async def dispatch(self, request, call_next):
+        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        token = request_id_var.set(request_id)
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        request_id_var.reset(token)
+        return response
+
+
+def make_app(middleware=None, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware, **options)
+    return app
+
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/ping",
+    "raw_path": b"/ping",
+    "query_string": b"",
+    "root_path": "",
+    "headers": [(b"host", b"benchmark")],
+    "client": ("127.0.0.1", 1234),
+    "server": ("benchmark", 80),
+}
+
+
+async def time_requests(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(500, requests)):  # Warm-up: build the middleware stack
+        await app(dict(SCOPE), receive, send)
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - started_at) / requests * 1_000_000
+
+
+async def run(requests: int) -> dict:
+    variants = {
+        "no_middleware": make_app(),
+        "base_http_middleware": make_app(LegacyRequestIDMiddleware),
+        "asgi_middleware": make_app(RequestIDMiddleware),
+        "asgi_middleware_server_timing": make_app(
+            RequestIDMiddleware, server_timing=True
+        ),
+    }
+    per_request_us = {
+        name: round(await time_requests(app, requests), 1)
+        for name, app in variants.items()
+    }
+    baseline = per_request_us["no_middleware"]
+    return {
+        "requests": requests,
+        "per_request_us": per_request_us,
+        "overhead_us": {
+            name: round(value - baseline, 1)
+            for name, value in per_request_us.items()
+            if name != "no_middleware"
+        },
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    report = asyncio.run(run(args.requests))
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# tax-filer-backend/benchmarks/openai_stub.py
+"""
+Minimal OpenAI-compatible server for load tests.
+
+Implements `GET /v1/models` and `POST /v1/chat/completions` (plain and streamed)
+with a configurable latency distribution and error rates, so the backend can be
+benchmarked without network access or API costs:
+
+    python -m benchmarks.openai_stub --port 9100 --latency-ms 300 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn app.main:app --port 8000
+"""
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+ADVICE_TEXT = (
+    "Based on the figures provided, consider keeping receipts for every deductible "
+    "expense, check whether retirement contributions lower your taxable income, and "
+    "confirm the filing deadline with your local tax authority. This is general "
+    "information only; consult a qualified tax professional for advice."
+)
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 300.0  # Median time to the full completion
+    latency_sigma: float = 0.35  # Log-normal spread; 0 gives a fixed latency
+    error_rate: float = 0.0  # Share of requests answered with 500
+    rate_limit_rate: float = 0.0  # Share of requests answered with 429
+    stream_chunks: int = 20
+    completion_tokens: int = 120
+    seed: int = 0
+
+    def sample_latency(self, rng: random.Random) -> float:
+        median = self.latency_ms / 1000.0
+        if self.latency_sigma <= 0:
+            return median
+        return rng.lognormvariate(0, self.latency_sigma) * median
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="OpenAI stub")
+    rng = random.Random(config.seed or None)
+    app.state.config = config
+    app.state.counters = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def _error(status_code: int, message: str, headers=None) -> JSONResponse:
+        return JSONResponse(
+            status_code=status_code,
+            content={"error": {"message": message, "type": "stub_error"}},
+            headers=headers,
+        )
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {
+            "object": "list",
+            "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}],
+        }
+
+    @app.get("/v1/stub/stats")
+    async def stub_stats():
+        return app.state.counters
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters = app.state.counters
+        counters["requests"] += 1
+        latency = config.sample_latency(rng)
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            counters["rate_limited"] += 1
+            return _error(429, "Rate limit reached (stub)", {"retry-after-ms": "200"})
+        if roll < config.rate_limit_rate + config.error_rate:
+            counters["errors"] += 1
+            await asyncio.sleep(latency / 4)
+            return _error(500, "Internal server error (stub)")
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "stub-model")
+        created = int(time.time())
+        prompt_tokens = sum(
+            len(str(m.get("content", ""))) // 4 for m in body.get("messages", [])
+        )
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": config.completion_tokens,
+            "total_tokens": prompt_tokens + config.completion_tokens,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": ADVICE_TEXT},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        async def events():
+            words = ADVICE_TEXT.split(" ")
+            chunks = max(1, min(config.stream_chunks, len(words)))
+            size = -(-len(words) // chunks)
+            for i in range(0, len(words), size):
+                await asyncio.sleep(latency / chunks)
+                text = " ".join(words[i : i + size])
+                if i + size < len(words):
+                    text += " "
+                yield _sse_chunk(completion_id, created, model, {"content": text})
+            yield _sse_chunk(completion_id, created, model, {}, "stop", usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def _sse_chunk(completion_id, created, model, delta, finish_reason=None, usage=None):
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage is not None:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = StubConfig()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=defaults.rate_limit_rate
+    )
+    parser.add_argument("--stream-chunks", type=int, default=defaults.stream_chunks)
+    parser.add_argument(
+        "--completion-tokens", type=int, default=defaults.completion_tokens
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        stream_chunks=args.stream_chunks,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(
+        create_stub_app(config_from_args(args)),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,125 @@
+# tax-filer-backend/benchmarks/prompt_budget.py
+"""
+Prompt tokens and completion budgets of the previous and current prompts.
+
+Builds the advice prompt for a synthetic workload (the one of
+`cache_banding.py`) with the previous indented f-string prompt and its fixed
+`max_completion_tokens` of 350, and with `PromptBuilder`, and reports the mean
+prompt tokens, the mean completion budget, the mean tokens charged to the TPM
+budget per request, and how many prompt tokens are a static prefix the
+provider can cache. Token counts come from tiktoken when it is installed, and
+are estimated otherwise (`exact_token_counts`):
+
+    python -m benchmarks.prompt_budget --requests 10000
+"""
+
+import argparse
+import json
+from pathlib import Path
+import statistics
+import sys
+
+from app.models import TaxInfoInput
+from app.services.prompt_builder import (
+    DEFAULT_TEMPLATES_FILE,
+    PromptBuilder,
+    TokenCounter,
+)
+from app.services.tax_engine import tax_engine
+from benchmarks.cache_banding import make_workload
+
+LEGACY_MAX_COMPLETION_TOKENS = 350
+
+
+def legacy_messages(tax_data: TaxInfoInput) -> list:
+    """
+    The previous prompt, verbatim including its indentation.
+    """
+    estimate = tax_engine.estimate(tax_data)
+    estimate_section = ""
+    if estimate is not None:
+        estimate_section = f"""
+    Local estimate, already shown to the user next to your answer:
+    - Taxable Income: {estimate.taxable_income:,.2f} {estimate.currency}
+    - Estimated Tax ({estimate.tax_year}): {estimate.estimated_tax:,.2f} {estimate.currency} (effective rate {estimate.effective_rate:.1%}, marginal rate {estimate.marginal_rate:.1%})
+    - Scope: {estimate.basis}
+    Do not restate or recompute these figures; keep the answer brief and focus on what could change them.
+"""
+    prompt = f"""
+    You are a helpful AI Tax Assistant providing general tax information.
+    This advice is for informational and educational purposes only and NOT a substitute for professional tax advice.
+    Do not ask follow-up questions, provide a concise summary based on the input.
+    {f'''
+    User's Tax Information:
+    - Country for Tax Purposes: {tax_data.country}
+    - Annual Income: {tax_data.income:,.2f}
+    - Work-Related/Business Expenses: {tax_data.expenses:,.2f}
+    - Other Claimed Deductions: {tax_data.deductions:,.2f}
+    {estimate_section}'''}
+    Based on this information for {tax_data.country}, provide some general tax considerations, potential deductions they might explore further,
+    or common tax obligations they should be aware of. Keep the advice general and high-level.
+    Mention that tax laws vary greatly and change, so consulting a local tax professional is crucial.
+    """
+    return [
+        {
+            "role": "developer",
+            "content": "You are an AI assistant providing general tax information.",
+        },
+        {"role": "user", "content": prompt, "name": "customer"},
+    ]
+
+
+def summarize(prompt_tokens: list, completion_budgets: list, prefix_tokens: int):
+    return {
+        "prompt_tokens_mean": round(statistics.fmean(prompt_tokens), 1),
+        "max_completion_tokens_mean": round(statistics.fmean(completion_budgets), 1),
+        "charged_tokens_mean": round(
+            statistics.fmean(p + c for p, c in zip(prompt_tokens, completion_budgets)),
+            1,
+        ),
+        "static_prefix_tokens": prefix_tokens,
+    }
+
+
+def run(requests: int, seed: int, model: str) -> dict:
+    counter = TokenCounter(model)
+    counter.load()
+    builder = PromptBuilder.from_file(DEFAULT_TEMPLATES_FILE, counter)
+    inputs = make_workload(requests, seed)
+
+    legacy_tokens = [counter.count_messages(legacy_messages(i)) for i in inputs]
+    prompts = [builder.build(tax_input) for tax_input in inputs]
+    return {
+        "requests": requests,
+        "exact_token_counts": counter.exact,
+        "prompt_version": builder.version,
+        # Only the short developer message repeats verbatim
+        "legacy": summarize(
+            legacy_tokens,
+            [LEGACY_MAX_COMPLETION_TOKENS] * len(inputs),
+            counter.count(legacy_messages(inputs[0])[0]["content"]),
+        ),
+        "current": summarize(
+            [prompt.prompt_tokens for prompt in prompts],
+            [prompt.max_completion_tokens for prompt in prompts],
+            counter.count(builder.prefix["content"]),
+        ),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--model", default="gpt-4-turbo")
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    report = run(args.requests, args.seed, args.model)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
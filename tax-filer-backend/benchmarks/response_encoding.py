@@ -0,0 +1,115 @@
+# tax-filer-backend/benchmarks/response_encoding.py
+"""
+Encode time and bytes on the wire per advice response.
+
+Encodes a typical `/tax/submit-advice` response (templated advice text, local
+estimate) the ways the backend has served it, and reports the mean encode time
+in microseconds and the body size in bytes for each:
+
+- `jsonable_encoder`: FastAPI's generic path, `jsonable_encoder` + stdlib
+  `json`, with the echoed `raw_input`,
+- `pydantic_with_input`: the model encoded to bytes by Pydantic, still with
+  `raw_input` (the previous response),
+- `pydantic`: the same without `raw_input` (now only sent on request),
+- `pydantic_gzip`: plus gzip at RESPONSE_GZIP_LEVEL, as sent to clients
+  accepting it.
+
+The plain-dict routes and error handlers are compared separately, stdlib
+`JSONResponse` against `FastJSONResponse`:
+
+    python -m benchmarks.response_encoding --requests 20000
+"""
+
+import argparse
+import gzip
+import json
+from pathlib import Path
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.responses import FastJSONResponse
+from app.models import TaxAdviceResponse, TaxInfoInput
+from app.services.ai_service import get_ai_service_stats
+from app.services.fallback_advice import fallback_advisor
+from app.services.tax_engine import tax_engine
+
+TAX_INPUT = TaxInfoInput(
+    income=75000.5, expenses=12000, deductions=5000.75, country="USA"
+)
+
+
+def make_response(include_input: bool) -> TaxAdviceResponse:
+    return TaxAdviceResponse(
+        message="Tax information processed and AI advice retrieved successfully.",
+        advice=fallback_advisor.render(TAX_INPUT),
+        estimate=tax_engine.estimate(TAX_INPUT),
+        raw_input=TAX_INPUT if include_input else None,
+    )
+
+
+def time_encoder(encode, requests: int) -> dict:
+    body = encode()
+    for _ in range(min(500, requests)):  # Warm-up
+        encode()
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        encode()
+    elapsed = time.perf_counter() - started_at
+    return {"encode_us": round(elapsed / requests * 1e6, 2), "bytes": len(body)}
+
+
+def run(requests: int) -> dict:
+    # What FastAPI does for a route with a response_model
+    adapter = TypeAdapter(TaxAdviceResponse)
+    with_input = make_response(include_input=True)
+    without_input = make_response(include_input=False)
+    level = settings.RESPONSE_GZIP_LEVEL
+
+    advice = {
+        "jsonable_encoder": time_encoder(
+            lambda: JSONResponse(jsonable_encoder(with_input)).body, requests
+        ),
+        "pydantic_with_input": time_encoder(
+            lambda: adapter.dump_json(with_input), requests
+        ),
+        "pydantic": time_encoder(lambda: adapter.dump_json(without_input), requests),
+        "pydantic_gzip": time_encoder(
+            lambda: gzip.compress(adapter.dump_json(without_input), level), requests
+        ),
+    }
+    stats = get_ai_service_stats()
+    plain = {
+        "stdlib_json": time_encoder(lambda: JSONResponse(stats).body, requests),
+        "orjson": time_encoder(lambda: FastJSONResponse(stats).body, requests),
+    }
+    before = advice["jsonable_encoder"]
+    return {
+        "requests": requests,
+        "gzip_level": level,
+        "advice_response": advice,
+        "plain_dict_response": plain,
+        "advice_bytes_saved_share": round(
+            1 - advice["pydantic_gzip"]["bytes"] / before["bytes"], 3
+        ),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    report = run(args.requests)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
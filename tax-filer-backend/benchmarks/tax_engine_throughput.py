@@ -0,0 +1,112 @@
+# tax-filer-backend/benchmarks/tax_engine_throughput.py
+"""
+Throughput of the local tax estimation engine.
+
+Scores random inputs for every supported country and reports inputs scored
+per millisecond for the vectorized array kernel (`TaxEngine.compute`), for
+`estimate_many` (which also builds a `TaxEstimate` model per input), and for a
+plain per-input Python loop over the same brackets as a reference point:
+
+    python -m benchmarks.tax_engine_throughput --inputs 100000
+"""
+
+import argparse
+import json
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+
+from app.models import TaxInfoInput
+from app.services.tax_engine import tax_engine
+
+
+def per_ms(count: int, seconds: float) -> float:
+    return round(count / (seconds * 1000), 1)
+
+
+def python_loop_tax(code: str, taxable: list) -> list:
+    table = tax_engine.tables[code]
+    brackets = list(
+        zip(table.lower.tolist(), table.width.tolist(), table.rates.tolist())
+    )
+    results = []
+    for value in taxable:
+        tax = 0.0
+        for lower, width, rate in brackets:
+            if value <= lower:
+                break
+            tax += min(value - lower, width) * rate
+        results.append(tax)
+    return results
+
+
+def run(inputs: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    income = rng.uniform(1, 500_000, inputs)
+    expenses = rng.uniform(0, 30_000, inputs)
+    deductions = rng.uniform(0, 10_000, inputs)
+    codes = tax_engine.supported_countries()
+    per_country = inputs // len(codes)
+
+    started_at = time.perf_counter()
+    for i, code in enumerate(codes):
+        part = slice(i * per_country, (i + 1) * per_country)
+        tax_engine.compute(code, income[part], expenses[part], deductions[part])
+    vectorized = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for i, code in enumerate(codes):
+        part = slice(i * per_country, (i + 1) * per_country)
+        python_loop_tax(
+            code,
+            np.maximum(income[part] - expenses[part] - deductions[part], 0).tolist(),
+        )
+    python_loop = time.perf_counter() - started_at
+
+    model_inputs = [
+        TaxInfoInput(
+            income=float(income[i]),
+            expenses=float(expenses[i]),
+            deductions=float(deductions[i]),
+            country=codes[i % len(codes)],
+        )
+        for i in range(min(inputs, 20000))
+    ]
+    started_at = time.perf_counter()
+    tax_engine.estimate_many(model_inputs)
+    with_models = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for tax_input in model_inputs[:2000]:
+        tax_engine.estimate(tax_input)
+    single = time.perf_counter() - started_at
+
+    return {
+        "inputs": per_country * len(codes),
+        "countries": len(codes),
+        "inputs_per_ms": {
+            "vectorized_compute": per_ms(per_country * len(codes), vectorized),
+            "python_loop": per_ms(per_country * len(codes), python_loop),
+            "estimate_many_with_models": per_ms(len(model_inputs), with_models),
+        },
+        "single_estimate_us": round(single / min(2000, len(model_inputs)) * 1e6, 1),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--inputs", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    report = run(args.inputs, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# tax-filer-backend/benchmarks/usage_ledger_overhead.py
+"""
+Cost of recording one advice request in the usage ledger on the event loop.
+
+Records the same usage row many times and reports the per-call time on the
+caller's thread for:
+- `sync_insert_per_request`: an INSERT and COMMIT per request, as an inline
+  write to the same kind of SQLite file would cost,
+- `buffered_ledger`: `UsageLedger.record` (the current set-up), plus the time
+  and number of batches it took to write the buffer with `flush`.
+
+    python -m benchmarks.usage_ledger_overhead --records 20000
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from app.core.shared_state import SQLiteDatabase
+from app.services.usage_ledger import LEDGER_SCHEMA, UsageLedger
+from benchmarks.load_driver import percentile
+
+ROW = dict(
+    model="gpt-4-turbo",
+    jti="0f4e6f4c-3a5e-4c1b-8a51-9f2f3b6c7d8e",
+    prompt_tokens=310,
+    cached_prompt_tokens=0,
+    completion_tokens=240,
+    latency_seconds=2.35,
+)
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "mean_us": round(sum(samples) / len(samples) * 1_000_000, 2),
+        "p50_us": round(percentile(samples, 50) * 1_000_000, 2),
+        "p99_us": round(percentile(samples, 99) * 1_000_000, 2),
+        "max_us": round(max(samples) * 1_000_000, 2),
+    }
+
+
+def time_sync_inserts(path: Path, records: int) -> dict:
+    db = SQLiteDatabase(str(path), LEDGER_SCHEMA)
+    conn = db.connection()
+    samples = []
+    for _ in range(records):
+        started_at = time.perf_counter()
+        now = time.time()
+        with db.lock:
+            conn.execute(
+                "INSERT INTO usage_ledger VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    now,
+                    time.strftime("%Y-%m-%d", time.gmtime(now)),
+                    ROW["model"],
+                    ROW["jti"],
+                    ROW["prompt_tokens"],
+                    ROW["cached_prompt_tokens"],
+                    ROW["completion_tokens"],
+                    ROW["latency_seconds"] * 1000,
+                    0,
+                    None,
+                ),
+            )
+        samples.append(time.perf_counter() - started_at)
+    db.close()
+    return summarize(samples)
+
+
+async def time_buffered_ledger(path: Path, records: int, batch_size: int) -> dict:
+    ledger = UsageLedger(str(path), batch_size=batch_size, max_buffered=records)
+    samples = []
+    flush_seconds = 0.0
+    for _ in range(records):
+        started_at = time.perf_counter()
+        ledger.record(**ROW)
+        samples.append(time.perf_counter() - started_at)
+        if ledger.buffered >= batch_size:  # What the background writer does
+            started_at = time.perf_counter()
+            await ledger.flush()
+            flush_seconds += time.perf_counter() - started_at
+    await ledger.flush()
+    return {
+        **summarize(samples),
+        "batches": ledger.flushes,
+        "write_seconds_off_loop": round(flush_seconds, 3),
+        "written": ledger.written,
+    }
+
+
+def run(records: int, batch_size: int, directory: Path) -> dict:
+    return {
+        "records": records,
+        "batch_size": batch_size,
+        "per_call": {
+            "sync_insert_per_request": time_sync_inserts(
+                directory / "sync.db", records
+            ),
+            "buffered_ledger": asyncio.run(
+                time_buffered_ledger(directory / "buffered.db", records, batch_size)
+            ),
+        },
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--save", type=Path, help="Write the report to this file")
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        report = run(args.records, args.batch_size, Path(directory))
+    print(json.dumps(report, indent=2))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# tax-filer-backend/gunicorn.conf.py
+"""
+Production launcher: gunicorn managing uvicorn workers.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+The worker count comes from WEB_CONCURRENCY or, when that is unset or 0, from
+the container's CPU and memory limits (see app/core/server.py). The app is
+imported once in the master and forked into the workers (`preload_app`).
+With more than one worker, the workers share the advice cache, the OpenAI rate
+budget, session quotas, idempotency keys, advice jobs, token revocations and
+metrics through files under SHARED_STATE_DIR.
+
+`kill -HUP <master pid>` replaces the workers gracefully (in-flight requests
+get GRACEFUL_TIMEOUT seconds to finish); code changes need a full restart,
+since the code is preloaded. Workers are also recycled after MAX_REQUESTS.
+"""
+
+import os
+
+from app.core.server import available_cpus, cgroup_memory_limit, recommended_workers
+
+requested_workers = int(os.environ.get("WEB_CONCURRENCY") or 0)
+workers = requested_workers or recommended_workers(
+    available_cpus(),
+    cgroup_memory_limit(),
+    worker_memory_mb=int(os.environ.get("WORKER_MEMORY_MB", "128")),
+    max_workers=int(os.environ.get("MAX_WORKERS", "8")),
+)
+# Read by the app's settings, e.g. to split OPENAI_MAX_CONCURRENT_REQUESTS
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+if workers > 1:
+    shared_dir = os.environ.setdefault("SHARED_STATE_DIR", "/tmp/tax-filer-state")
+    # prometheus_client's multiprocess mode; read when the app is imported
+    os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", os.path.join(shared_dir, "metrics")
+    )
+    os.environ.setdefault(
+        "JWT_REVOCATION_SQLITE_PATH", os.path.join(shared_dir, "revocations.db")
+    )
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = 5
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "warning")
+accesslog = None
+
+
+def on_starting(server):
+    # The app imports the openai SDK on first use only; import it once in the
+    # master, so forked workers share it instead of each importing it on startup
+    import openai  # noqa: F401
+
+    # Metric files of a previous run would be added to this one's (the
+    # preloaded app already created the master's own)
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        for name in os.listdir(directory):
+            if name.endswith(".db") and not name.endswith(f"_{os.getpid()}.db"):
+                os.remove(os.path.join(directory, name))
+
+
+def when_ready(server):
+    server.log.warning(f"Serving with {workers} worker(s)")
+
+
+def child_exit(server, worker):
+    # Drops the live gauges (e.g. completions in flight) of the exited worker;
+    # its counters and histograms stay in the totals
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
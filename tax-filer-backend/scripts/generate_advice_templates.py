@@ -0,0 +1,80 @@
+# tax-filer-backend/scripts/generate_advice_templates.py
+"""
+Regenerates the fallback advice templates (app/data/advice_templates.json).
+
+Asks the configured OpenAI model once per country covered by the tax engine
+(plus the generic "DEFAULT" entry) for a short advice template that uses only
+the placeholders the fallback advisor fills in, validates the result and
+writes the file. Run offline and review the output before committing it:
+
+    python -m scripts.generate_advice_templates --output app/data/advice_templates.json
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import sys
+from typing import Dict
+
+from app.core.config import settings
+from app.services.ai_service import build_openai_client
+from app.services.fallback_advice import (
+    DEFAULT_TEMPLATE_KEY,
+    DEFAULT_TEMPLATES_FILE,
+    ESTIMATE_FIELDS,
+    INPUT_FIELDS,
+    FallbackAdvisor,
+)
+from app.services.tax_engine import tax_engine
+
+TEMPLATE_PROMPT = """
+Write general personal income tax guidance for {country_name} as a single paragraph
+of at most 150 words. It is shown when personalized AI advice is unavailable, so open
+by saying that, and close by recommending a qualified tax professional.
+Refer to the user's figures only through these placeholders, written exactly with
+curly braces: {placeholders}. Do not use any other curly braces.
+Reply with the template text only.
+""".strip()
+
+
+async def generate(model: str) -> Dict[str, str]:
+    openai_client = build_openai_client()
+    if openai_client is None:
+        raise RuntimeError("OpenAI client is not configured")
+    targets = {DEFAULT_TEMPLATE_KEY: ("any country", INPUT_FIELDS)}
+    for code in tax_engine.supported_countries():
+        targets[code] = (
+            f"{tax_engine.tables[code].name} (tax year {tax_engine.tables[code].tax_year})",
+            INPUT_FIELDS | ESTIMATE_FIELDS,
+        )
+    templates = {}
+    for key, (country_name, fields) in targets.items():
+        prompt = TEMPLATE_PROMPT.format(
+            country_name=country_name,
+            placeholders=", ".join(f"{{{field}}}" for field in sorted(fields)),
+        )
+        completion = await openai_client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+        )
+        templates[key] = completion.choices[0].message.content.strip()
+        print(f"Generated template for {key}", file=sys.stderr)
+    FallbackAdvisor(templates)  # Raises on unknown placeholders
+    return templates
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", type=Path, default=DEFAULT_TEMPLATES_FILE)
+    parser.add_argument("--model", default=settings.OPENAI_MODEL_NAME)
+    args = parser.parse_args(argv)
+    templates = asyncio.run(generate(args.model))
+    args.output.write_text(json.dumps(templates, indent=2, ensure_ascii=False) + "\n")
+    print(f"Wrote {len(templates)} templates to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# tax-filer-backend/scripts/prewarm_advice_cache.py
+"""
+Pre-warms the shared advice cache for the most requested country/band combinations.
+
+Reads past requests (one `TaxInfoInput` JSON object per line), groups them by
+country and income/expense/deduction band (AI_CACHE_MODE=banded and the
+AI_CACHE_BAND_* settings), and fetches advice for the top N groups that are
+not cached yet. Needs AI_CACHE_SQLITE_PATH, so the workers can read the
+entries it writes:
+
+    AI_CACHE_MODE=banded AI_CACHE_SQLITE_PATH=/data/advice-cache.db \\
+        python -m scripts.prewarm_advice_cache --inputs requests.jsonl --top 200
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from pathlib import Path
+import sys
+
+from app.core.config import settings
+from app.models import TaxInfoInput
+from app.services.advice_cache import band_input, canonicalize_tax_input_banded
+from app.services.ai_service import cache_bands, get_tax_advice_from_ai
+
+
+def top_band_inputs(path: Path, top: int) -> list:
+    bands = cache_bands()
+    counts: Counter = Counter()
+    examples = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            tax_input = TaxInfoInput.model_validate_json(line)
+            group = tuple(canonicalize_tax_input_banded(tax_input, bands).values())
+            counts[group] += 1
+            examples.setdefault(group, tax_input)
+    return [band_input(examples[group], bands) for group, _ in counts.most_common(top)]
+
+
+async def prewarm(inputs: list, concurrency: int) -> Counter:
+    semaphore = asyncio.Semaphore(concurrency)
+    results: Counter = Counter()
+
+    async def warm(tax_input: TaxInfoInput) -> None:
+        async with semaphore:
+            response = await get_tax_advice_from_ai(tax_input, session_id="prewarm")
+        if response.cached:
+            results["already_cached"] += 1
+        elif response.success and not response.degraded:
+            results["fetched"] += 1
+        else:
+            results["failed"] += 1
+            print(
+                f"No advice for {tax_input.country} ({response.error_type})",
+                file=sys.stderr,
+            )
+
+    await asyncio.gather(*(warm(tax_input) for tax_input in inputs))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--inputs", type=Path, required=True)
+    parser.add_argument("--top", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+    if settings.AI_CACHE_MODE != "banded" or not settings.AI_CACHE_SQLITE_PATH:
+        parser.error("Set AI_CACHE_MODE=banded and AI_CACHE_SQLITE_PATH")
+    inputs = top_band_inputs(args.inputs, args.top)
+    results = asyncio.run(prewarm(inputs, args.concurrency))
+    print(
+        f"Pre-warmed {len(inputs)} country/band combinations: "
+        f"{results['fetched']} fetched, {results['already_cached']} already cached, "
+        f"{results['failed']} failed",
+        file=sys.stderr,
+    )
+    return 0 if not results["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
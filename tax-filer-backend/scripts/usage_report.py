@@ -0,0 +1,93 @@
+# tax-filer-backend/scripts/usage_report.py
+"""
+Prints per-day and per-model usage and cost aggregates from the usage ledger.
+
+Reads the ledger file the workers write to (USAGE_LEDGER_SQLITE_PATH, by
+default logs/usage-ledger.db), so it works while the service runs or after it
+stopped. Records still buffered in a running worker show up within
+USAGE_LEDGER_FLUSH_INTERVAL_SECONDS. Costs use the AI_MODEL_PRICES setting:
+
+    python -m scripts.usage_report --by day,model --since 2026-10-01
+    python -m scripts.usage_report --by model --format csv > usage.csv
+"""
+
+import argparse
+import csv
+import json
+from pathlib import Path
+import sys
+
+from app.core.config import settings
+from app.services.usage_ledger import (
+    DEFAULT_LEDGER_FILE,
+    GROUP_COLUMNS,
+    UsageLedger,
+    parse_group_by,
+)
+
+VALUE_COLUMNS = (
+    "requests",
+    "cache_hits",
+    "errors",
+    "prompt_tokens",
+    "cached_prompt_tokens",
+    "completion_tokens",
+    "avg_latency_ms",
+    "cost_usd",
+)
+
+
+def format_table(rows: list, columns: list) -> str:
+    cells = [[("" if row[c] is None else str(row[c])) for c in columns] for row in rows]
+    widths = [
+        max([len(column)] + [len(line[i]) for line in cells])
+        for i, column in enumerate(columns)
+    ]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    for line in cells:
+        lines.append("  ".join(cell.rjust(w) for cell, w in zip(line, widths)))
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--ledger",
+        type=Path,
+        default=Path(settings.USAGE_LEDGER_SQLITE_PATH or DEFAULT_LEDGER_FILE),
+    )
+    parser.add_argument(
+        "--by", default="day,model", help=f"Any of {', '.join(GROUP_COLUMNS)}"
+    )
+    parser.add_argument("--since", help="First UTC day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--until", help="Last UTC day (YYYY-MM-DD), inclusive")
+    parser.add_argument("--model")
+    parser.add_argument("--format", choices=("table", "json", "csv"), default="table")
+    args = parser.parse_args(argv)
+    try:
+        group_by = parse_group_by(args.by)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.ledger.exists():
+        parser.error(f"No usage ledger at {args.ledger}")
+
+    rows = UsageLedger(str(args.ledger)).aggregate(
+        group_by, args.since, args.until, args.model, settings.ai_model_prices
+    )
+    columns = [*group_by, *VALUE_COLUMNS]
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+    elif args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    elif rows:
+        print(format_table(rows, columns))
+    else:
+        print("No usage recorded for these filters.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())